@@ -9,7 +9,12 @@ from rich.panel import Panel
 from rich.progress import Progress, SpinnerColumn, TextColumn
 from datetime import datetime
 
-from modulos.gestion_archivos import cargar_datos, guardar_datos
+from modulos.gestion_archivos import cargar_datos, guardar_datos, establecer_configuracion, recargar_si_cambio
+from modulos.escritor import vaciar_pendientes
+from modulos.respaldos import esperar_respaldos
+from modulos import busqueda_productos
+from modulos import indice_pedidos
+from modulos import tabla_productos
 from modulos.gestion_productos import gestionar_productos
 from modulos.gestion_pedidos import gestionar_pedidos
 from modulos.reportes import gestionar_reportes
@@ -69,13 +74,18 @@ def mostrar_dashboard_rapido(datos, config):
     
     # Estadísticas de productos
     total_productos = len(datos["productos"])
-    productos_stock_bajo = [p for p in datos["productos"] if p["cantidad_en_stock"] < config["inventario"]["stock_minimo"]]
-    valor_inventario = sum(p["cantidad_en_stock"] * p["precio_venta"] for p in datos["productos"])
+    # Los de menor stock primero: las alertas salen del comienzo del orden por stock
+    productos_criticos, productos_bajos = tabla_productos.alertas_stock(
+        datos["productos"], config["inventario"]["stock_minimo"], config["inventario"]["stock_critico"])
+    productos_stock_bajo = productos_criticos + productos_bajos
+    valor_inventario = tabla_productos.valor_inventario(datos["productos"])
     
     # Estadísticas de ventas
     datos_pedidos = cargar_pedidos()
     total_pedidos = len(datos_pedidos["pedidos"])
     total_ventas = sum(pedido["total"] for pedido in datos_pedidos["pedidos"])
+    # Cola de pedidos por atender, en orden de llegada, tomada del índice por estado
+    pedidos_pendientes = indice_pedidos.por_valor(datos_pedidos["pedidos"], "estado", "pendiente")
     
     # Crear tabla de resumen
     from rich.table import Table
@@ -86,19 +96,28 @@ def mostrar_dashboard_rapido(datos, config):
     
     tabla_resumen.add_row("Total Productos", str(total_productos), "✅")
     tabla_resumen.add_row("Productos Stock Bajo", str(len(productos_stock_bajo)), "⚠️" if productos_stock_bajo else "✅")
+    tabla_resumen.add_row("Productos Stock Crítico", str(len(productos_criticos)), "🚨" if productos_criticos else "✅")
     tabla_resumen.add_row("Valor Inventario", f"${valor_inventario:.2f}", "💰")
     tabla_resumen.add_row("Total Pedidos", str(total_pedidos), "📋")
     tabla_resumen.add_row("Total Ventas", f"${total_ventas:.2f}", "💵")
+    tabla_resumen.add_row("Pedidos Pendientes", str(len(pedidos_pendientes)), "⏳" if pedidos_pendientes else "✅")
     
     console.print(tabla_resumen)
     
     # Alertas importantes
     if productos_stock_bajo:
         console.print("\n[bold red]⚠️ ALERTAS IMPORTANTES:[/bold red]")
-        for producto in productos_stock_bajo[:3]:  # Mostrar solo los primeros 3
+        for producto in productos_stock_bajo[:3]:  # Mostrar solo los 3 más urgentes
             console.print(f"   • {producto['nombre']} - Stock: {producto['cantidad_en_stock']}")
         if len(productos_stock_bajo) > 3:
             console.print(f"   • ... y {len(productos_stock_bajo) - 3} productos más")
+    
+    if pedidos_pendientes:
+        console.print("\n[bold yellow]⏳ PEDIDOS POR ATENDER:[/bold yellow]")
+        for pedido in pedidos_pendientes[:3]:  # Los más antiguos primero
+            console.print(f"   • {pedido['codigo_pedido']} - Cliente: {pedido['codigo_cliente']} - {pedido['fecha_pedido']}")
+        if len(pedidos_pendientes) > 3:
+            console.print(f"   • ... y {len(pedidos_pendientes) - 3} pedidos más")
 
 def crear_respaldo_manual():
     """Crea un respaldo manual de los datos"""
@@ -128,6 +147,7 @@ def main():
     
     # Cargar configuración
     config = cargar_configuracion()
+    establecer_configuracion(config)
     
     # Mostrar información de inicio
     console.print(f"\n[bold blue]🏢 {config['sistema']['nombre_empresa']} - v{config['sistema']['version']}[/bold blue]")
@@ -136,11 +156,16 @@ def main():
     # Cargar datos desde el archivo JSON
     console.print("\n[dim]Cargando datos del sistema...[/dim]")
     datos = cargar_datos()
+    # El índice de búsqueda se arma al cargar para que la primera búsqueda no espere
+    busqueda_productos.obtener(datos["productos"])
     
     # Menú principal
     while True:
         opcion = mostrar_menu_principal()
         
+        # Otra terminal pudo guardar cambios mientras se esperaba la opción
+        recargar_si_cambio(datos)
+        
         if opcion == "1":
             gestionar_productos(datos)
             # Guardamos los cambios después de gestionar productos
@@ -153,6 +178,7 @@ def main():
             gestionar_reportes(datos)
         elif opcion == "4":
             config = gestionar_configuracion()
+            establecer_configuracion(config)
         elif opcion == "5":
             crear_respaldo_manual()
         elif opcion == "6":
@@ -165,6 +191,10 @@ def main():
         if opcion not in ["7"]:
             input("\n⏸️ Presione Enter para continuar...")
     
+    # Confirmamos en disco cualquier escritura agrupada pendiente y sus respaldos
+    vaciar_pendientes()
+    esperar_respaldos()
+    
     # Mensaje de despedida
     console.print("\n[bold green]¡Gracias por usar el sistema de Maison du Pain![/bold green]")
     console.print("[dim]Sistema de Gestión Avanzado v2.0.0[/dim]")
@@ -0,0 +1,309 @@
+"""
+Módulo de almacenamiento SQLite
+Motor opcional con tablas e índices para productos, pedidos y líneas de pedido.
+Devuelve los datos con la misma forma que los archivos JSON, de modo que el
+resto del sistema no distingue entre motores
+
+Uso para importar los archivos JSON existentes:
+    python -m modulos.almacen_sqlite migrar [--forzar]
+"""
+import itertools
+import json
+import os
+import sqlite3
+import sys
+import logging
+
+logger = logging.getLogger(__name__)
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS productos (
+    codigo_producto TEXT PRIMARY KEY,
+    nombre TEXT NOT NULL,
+    categoria TEXT NOT NULL,
+    descripcion TEXT NOT NULL,
+    proveedor TEXT NOT NULL,
+    cantidad_en_stock INTEGER NOT NULL,
+    precio_venta REAL NOT NULL,
+    precio_proveedor REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_productos_categoria ON productos (categoria);
+CREATE INDEX IF NOT EXISTS idx_productos_nombre ON productos (nombre);
+
+CREATE TABLE IF NOT EXISTS pedidos (
+    codigo_pedido TEXT PRIMARY KEY,
+    codigo_cliente TEXT NOT NULL,
+    fecha_pedido TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    total REAL NOT NULL,
+    marca_tiempo INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_pedidos_cliente ON pedidos (codigo_cliente);
+CREATE INDEX IF NOT EXISTS idx_pedidos_fecha ON pedidos (fecha_pedido);
+CREATE INDEX IF NOT EXISTS idx_pedidos_estado ON pedidos (estado);
+
+CREATE TABLE IF NOT EXISTS detalles_pedidos (
+    codigo_pedido TEXT NOT NULL,
+    numero_linea INTEGER NOT NULL,
+    codigo_producto TEXT NOT NULL,
+    cantidad INTEGER NOT NULL,
+    precio_unidad REAL NOT NULL,
+    subtotal REAL NOT NULL,
+    PRIMARY KEY (codigo_pedido, numero_linea)
+);
+CREATE INDEX IF NOT EXISTS idx_detalles_producto ON detalles_pedidos (codigo_producto);
+
+CREATE TABLE IF NOT EXISTS extras (
+    clave TEXT PRIMARY KEY,
+    valor TEXT NOT NULL
+);
+"""
+
+CAMPOS_PRODUCTO = ["codigo_producto", "nombre", "categoria", "descripcion",
+                   "proveedor", "cantidad_en_stock", "precio_venta", "precio_proveedor"]
+CAMPOS_PEDIDO = ["codigo_pedido", "codigo_cliente", "fecha_pedido", "estado", "total", "marca_tiempo"]
+CAMPOS_DETALLE = ["numero_linea", "codigo_producto", "cantidad", "precio_unidad", "subtotal"]
+
+# Conexiones abiertas por ruta de base de datos
+_conexiones = {}
+
+# Últimas claves extra leídas o escritas por ruta, para no reescribirlas sin cambios
+_extras = {}
+
+def conectar(ruta_db):
+    """Abre (una sola vez) la base de datos y crea el esquema si no existe"""
+    if ruta_db in _conexiones:
+        return _conexiones[ruta_db]
+
+    os.makedirs(os.path.dirname(ruta_db), exist_ok=True)
+    conexion = sqlite3.connect(ruta_db, check_same_thread=False)
+    conexion.row_factory = sqlite3.Row
+    conexion.execute("PRAGMA journal_mode=WAL")
+    conexion.execute("PRAGMA synchronous=NORMAL")
+    conexion.executescript(ESQUEMA)
+    _actualizar_esquema(conexion)
+    _conexiones[ruta_db] = conexion
+    return conexion
+
+def abierta(ruta_db):
+    """Indica si este proceso ya abrió la base de datos"""
+    return ruta_db in _conexiones
+
+def cerrar(ruta_db):
+    """Cierra la conexión a la base de datos, si estaba abierta (al cerrarla se vuelca el WAL)"""
+    conexion = _conexiones.pop(ruta_db, None)
+    _extras.pop(ruta_db, None)
+    if conexion is not None:
+        conexion.close()
+
+def version_datos(ruta_db):
+    """Número que cambia cada vez que otra conexión confirma cambios (los de esta conexión no lo cambian)"""
+    return conectar(ruta_db).execute("PRAGMA data_version").fetchone()[0]
+
+def _completar_marcas(conexion):
+    """Calcula la marca de tiempo de los pedidos que no la tienen (la fecha se toma como UTC)"""
+    conexion.execute("UPDATE pedidos SET marca_tiempo = CAST(strftime('%s', fecha_pedido) AS INTEGER) "
+                     "WHERE marca_tiempo IS NULL")
+
+def _actualizar_esquema(conexion):
+    """Agrega a una base creada con una versión anterior las columnas e índices nuevos"""
+    columnas = {fila["name"] for fila in conexion.execute("PRAGMA table_info(pedidos)")}
+    if "marca_tiempo" not in columnas:
+        with conexion:
+            conexion.execute("ALTER TABLE pedidos ADD COLUMN marca_tiempo INTEGER")
+            _completar_marcas(conexion)
+    conexion.execute("CREATE INDEX IF NOT EXISTS idx_pedidos_marca ON pedidos (marca_tiempo)")
+
+def esta_vacia(ruta_db):
+    """Indica si la base de datos aún no tiene productos ni pedidos"""
+    conexion = conectar(ruta_db)
+    productos = conexion.execute("SELECT COUNT(*) FROM productos").fetchone()[0]
+    pedidos = conexion.execute("SELECT COUNT(*) FROM pedidos").fetchone()[0]
+    return productos == 0 and pedidos == 0
+
+def _upsert(tabla, campos, clave, relativo=None):
+    """Construye la sentencia de inserción o actualización de una fila; la columna relativo, si se indica,
+    se actualiza sumando un parámetro más al valor guardado"""
+    columnas = ", ".join(campos)
+    marcadores = ", ".join("?" for _ in campos)
+    asignaciones = ", ".join(f"{c} = {c} + ?" if c == relativo else f"{c} = excluded.{c}"
+                             for c in campos if c != clave)
+    return (f"INSERT INTO {tabla} ({columnas}) VALUES ({marcadores}) "
+            f"ON CONFLICT ({clave}) DO UPDATE SET {asignaciones}")
+
+SQL_PRODUCTO = _upsert("productos", CAMPOS_PRODUCTO, "codigo_producto")
+SQL_PRODUCTO_DIFERENCIA = _upsert("productos", CAMPOS_PRODUCTO, "codigo_producto", "cantidad_en_stock")
+SQL_PEDIDO = _upsert("pedidos", CAMPOS_PEDIDO, "codigo_pedido")
+SQL_DETALLE = ("INSERT INTO detalles_pedidos (codigo_pedido, numero_linea, codigo_producto, "
+               "cantidad, precio_unidad, subtotal) VALUES (?, ?, ?, ?, ?, ?)")
+
+def cargar_productos(ruta_db):
+    """Devuelve los datos de productos con la estructura de datos_panaderia.json"""
+    conexion = conectar(ruta_db)
+    columnas = ", ".join(CAMPOS_PRODUCTO)
+    datos = {"productos": [dict(fila) for fila in
+                           conexion.execute(f"SELECT {columnas} FROM productos ORDER BY rowid")]}
+    extras = {fila["clave"]: json.loads(fila["valor"])
+              for fila in conexion.execute("SELECT clave, valor FROM extras")}
+    _extras[ruta_db] = json.loads(json.dumps(extras))
+    datos.update(extras)
+    return datos
+
+def cargar_pedidos(ruta_db):
+    """Devuelve los pedidos, cada uno con sus líneas, con la estructura de pedidos.json"""
+    return {"pedidos": list(iterar_pedidos(ruta_db))}
+
+def iterar_pedidos(ruta_db, desde=None, hasta=None):
+    """Recorre los pedidos con sus líneas fila a fila con un cursor (una sola consulta);
+    con desde y hasta (marcas de tiempo) solo los de ese rango, usando su índice"""
+    columnas_pedido = ", ".join(f"p.{c}" for c in CAMPOS_PEDIDO)
+    columnas_detalle = ", ".join(f"d.{c} AS linea_{c}" for c in CAMPOS_DETALLE)
+    condicion, parametros = "", ()
+    if desde is not None:
+        condicion, parametros = "WHERE p.marca_tiempo BETWEEN ? AND ? ", (desde, hasta)
+    filas = conectar(ruta_db).execute(
+        f"SELECT p.rowid AS fila, {columnas_pedido}, {columnas_detalle} FROM pedidos p "
+        "LEFT JOIN detalles_pedidos d ON d.codigo_pedido = p.codigo_pedido "
+        f"{condicion}ORDER BY p.rowid, d.numero_linea", parametros)
+    for _, grupo in itertools.groupby(filas, key=lambda fila: fila["fila"]):
+        grupo = list(grupo)
+        pedido = {c: grupo[0][c] for c in CAMPOS_PEDIDO}
+        pedido["detalles"] = [{c: fila[f"linea_{c}"] for c in CAMPOS_DETALLE}
+                              for fila in grupo if fila["linea_numero_linea"] is not None]
+        yield pedido
+
+def obtener_producto(ruta_db, codigo_producto):
+    """Busca un producto por código usando la clave primaria"""
+    columnas = ", ".join(CAMPOS_PRODUCTO)
+    fila = conectar(ruta_db).execute(
+        f"SELECT {columnas} FROM productos WHERE codigo_producto = ?", (codigo_producto,)).fetchone()
+    return dict(fila) if fila else None
+
+def obtener_detalles_pedido(ruta_db, codigo_pedido):
+    """Devuelve las líneas de un pedido usando la clave primaria"""
+    columnas = ", ".join(CAMPOS_DETALLE)
+    filas = conectar(ruta_db).execute(
+        f"SELECT {columnas} FROM detalles_pedidos WHERE codigo_pedido = ? ORDER BY numero_linea",
+        (codigo_pedido,))
+    return [dict(fila) for fila in filas]
+
+def _aplicar_cambio(conexion, coleccion, cambio):
+    """Aplica un registro de cambio (con la forma del diario) sobre las tablas"""
+    codigo = cambio["clave"]
+    valor = cambio["valor"]
+
+    # El stock con diferencia se suma al guardado: las ventas de otras terminales no se pisan
+    diferencia = cambio.get("diferencia")
+    if cambio["tipo"] == "stock":
+        if diferencia is None:
+            conexion.execute("UPDATE productos SET cantidad_en_stock = ? WHERE codigo_producto = ?",
+                             (valor, codigo))
+        else:
+            conexion.execute("UPDATE productos SET cantidad_en_stock = cantidad_en_stock + ? "
+                             "WHERE codigo_producto = ?", (diferencia, codigo))
+    elif coleccion == "productos":
+        if valor is None:
+            conexion.execute("DELETE FROM productos WHERE codigo_producto = ?", (codigo,))
+        elif diferencia is None:
+            conexion.execute(SQL_PRODUCTO, [valor.get(c) for c in CAMPOS_PRODUCTO])
+        else:
+            conexion.execute(SQL_PRODUCTO_DIFERENCIA, [valor.get(c) for c in CAMPOS_PRODUCTO] + [diferencia])
+    elif coleccion == "pedidos":
+        if valor is None:
+            conexion.execute("DELETE FROM pedidos WHERE codigo_pedido = ?", (codigo,))
+        else:
+            conexion.execute(SQL_PEDIDO, [valor.get(c) for c in CAMPOS_PEDIDO])
+    elif coleccion == "detalles":
+        # Las líneas de un pedido se reemplazan como bloque
+        conexion.execute("DELETE FROM detalles_pedidos WHERE codigo_pedido = ?", (codigo,))
+        if valor is not None:
+            conexion.executemany(SQL_DETALLE, [
+                [codigo] + [d.get(c) for c in CAMPOS_DETALLE] for d in valor["detalles"]
+            ])
+
+def aplicar_cambios(ruta_db, coleccion, cambios):
+    """Aplica los cambios de una colección en una sola transacción"""
+    if not cambios:
+        return
+    conexion = conectar(ruta_db)
+    with conexion:
+        for cambio in cambios:
+            _aplicar_cambio(conexion, coleccion, cambio)
+
+def aplicar_cambios_pedidos(ruta_db, cambios_pedidos, cambios_detalles):
+    """Aplica los cambios de cabeceras y líneas de pedidos en una sola transacción"""
+    if not cambios_pedidos and not cambios_detalles:
+        return
+    conexion = conectar(ruta_db)
+    with conexion:
+        for cambio in cambios_pedidos:
+            _aplicar_cambio(conexion, "pedidos", cambio)
+        for cambio in cambios_detalles:
+            _aplicar_cambio(conexion, "detalles", cambio)
+
+def guardar_extras(ruta_db, datos):
+    """Guarda las claves de datos_panaderia.json distintas de 'productos'"""
+    extras = {clave: valor for clave, valor in datos.items() if clave != "productos"}
+    if _extras.get(ruta_db) == extras:
+        return
+
+    conexion = conectar(ruta_db)
+    with conexion:
+        conexion.execute("DELETE FROM extras")
+        conexion.executemany("INSERT INTO extras (clave, valor) VALUES (?, ?)", [
+            (clave, json.dumps(valor, ensure_ascii=False)) for clave, valor in extras.items()
+        ])
+    _extras[ruta_db] = json.loads(json.dumps(extras))
+
+def importar_json(ruta_db, datos, datos_pedidos, datos_detalles):
+    """Reemplaza el contenido de la base de datos con los datos de los archivos JSON"""
+    conexion = conectar(ruta_db)
+    with conexion:
+        conexion.execute("DELETE FROM productos")
+        conexion.execute("DELETE FROM pedidos")
+        conexion.execute("DELETE FROM detalles_pedidos")
+        conexion.executemany(SQL_PRODUCTO, [
+            [p.get(c) for c in CAMPOS_PRODUCTO] for p in datos.get("productos", [])
+        ])
+        conexion.executemany(SQL_PEDIDO, [
+            [p.get(c) for c in CAMPOS_PEDIDO] for p in datos_pedidos.get("pedidos", [])
+        ])
+        for bloque in datos_detalles.get("detalles_pedidos", []):
+            conexion.executemany(SQL_DETALLE, [
+                [bloque["codigo_pedido"]] + [d.get(c) for c in CAMPOS_DETALLE] for d in bloque["detalles"]
+            ])
+        _completar_marcas(conexion)
+    guardar_extras(ruta_db, datos)
+    logger.info(f"Importados {len(datos.get('productos', []))} productos y "
+                f"{len(datos_pedidos.get('pedidos', []))} pedidos a {ruta_db}")
+
+def punto_de_control(ruta_db):
+    """Vuelca el registro WAL al archivo principal para poder copiarlo"""
+    if ruta_db in _conexiones:
+        _conexiones[ruta_db].execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+def migrar(forzar=False):
+    """Importa los archivos JSON actuales a la base de datos SQLite"""
+    from modulos.gestion_archivos import (RUTA_DATOS, RUTA_SQLITE, _leer_json,
+                                          _leer_pedidos_separados)
+
+    if not esta_vacia(RUTA_SQLITE) and not forzar:
+        print(f"La base de datos {RUTA_SQLITE} ya tiene datos; use --forzar para reemplazarlos")
+        return False
+
+    cabeceras, bloques = _leer_pedidos_separados()
+    importar_json(
+        RUTA_SQLITE,
+        _leer_json(RUTA_DATOS, {"productos": []}),
+        {"pedidos": cabeceras},
+        {"detalles_pedidos": bloques}
+    )
+    print(f"Migración completada: {RUTA_SQLITE}")
+    print('Active el motor con "almacenamiento": {"motor": "sqlite"} en config/config.json')
+    return True
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "migrar":
+        migrar(forzar="--forzar" in sys.argv[2:])
+    else:
+        print(__doc__)
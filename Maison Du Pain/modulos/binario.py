@@ -0,0 +1,254 @@
+"""
+Módulo de instantáneas binarias
+Guarda una colección de registros en un formato binario por columnas junto al
+archivo JSON: cada campo común se escribe como un bloque (textos separados por
+NUL, enteros y decimales como arreglos de 64 bits) que se lee de una sola vez.
+Los textos con pocos valores distintos se guardan como tabla de textos más un
+código pequeño por registro, y las listas de registros (las líneas de cada
+pedido) como columnas propias. El JSON sigue siendo el formato de intercambio; la instantánea solo se usa
+mientras corresponda exactamente a la versión del JSON de la que salió
+"""
+import json
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Mapping
+import logging
+
+from modulos import escritor
+from modulos import modelos
+
+logger = logging.getLogger(__name__)
+
+MAGIA = b"MDPB"
+VERSION = 2
+
+# Magia, versión y longitud de la cabecera JSON
+_PREAMBULO = struct.Struct("<4sHI")
+_LONGITUD = struct.Struct("<Q")
+
+SEPARADOR = "\x00"
+
+def firma(ruta_archivo):
+    """Fecha de modificación y tamaño del archivo de origen"""
+    estado = os.stat(ruta_archivo)
+    return [estado.st_mtime_ns, estado.st_size]
+
+def _tipo_columna(valores):
+    """Elige la codificación de una columna según los tipos de sus valores"""
+    tipos = {type(v) for v in valores}
+    if tipos == {str}:
+        texto = SEPARADOR.join(valores)
+        if texto.count(SEPARADOR) == len(valores) - 1:
+            # Cada valor se repite en promedio al menos dos veces: tabla de textos y códigos
+            return "diccionario" if len(set(valores)) * 2 <= len(valores) else "texto"
+    elif tipos == {int}:
+        try:
+            array("q", valores)
+            return "entero"
+        except OverflowError:
+            pass
+    elif tipos == {float}:
+        return "decimal"
+    return "json"
+
+def _tipo_codigo(cantidad_valores):
+    """Tipo de arreglo más pequeño que alcanza para los códigos de una tabla de textos"""
+    if cantidad_valores <= 0x100:
+        return "B"
+    return "H" if cantidad_valores <= 0x10000 else "I"
+
+def _codificar_columna(tipo, valores):
+    """Devuelve los bytes de una columna"""
+    if tipo == "texto":
+        return SEPARADOR.join(valores).encode("utf-8")
+    if tipo == "diccionario":
+        tabla = list(dict.fromkeys(valores))
+        posiciones = {valor: codigo for codigo, valor in enumerate(tabla)}
+        textos = SEPARADOR.join(tabla).encode("utf-8")
+        codigos = array(_tipo_codigo(len(tabla)), map(posiciones.__getitem__, valores))
+        return _LONGITUD.pack(len(textos)) + textos + codigos.tobytes()
+    if tipo == "entero":
+        return array("q", valores).tobytes()
+    if tipo == "decimal":
+        return array("d", valores).tobytes()
+    return json.dumps(valores, ensure_ascii=False, default=modelos.a_json).encode("utf-8")
+
+def _decodificar_columna(tipo, contenido, cantidad, orden_bytes):
+    """Reconstruye los valores de una columna"""
+    if tipo == "texto":
+        return contenido.decode("utf-8").split(SEPARADOR) if cantidad else []
+    if tipo == "diccionario":
+        (largo,) = _LONGITUD.unpack_from(contenido, 0)
+        # Los registros comparten el texto de la tabla en vez de tener cada uno su copia
+        tabla = contenido[_LONGITUD.size:_LONGITUD.size + largo].decode("utf-8").split(SEPARADOR)
+        codigos = array(_tipo_codigo(len(tabla)))
+        codigos.frombytes(contenido[_LONGITUD.size + largo:])
+        if orden_bytes != sys.byteorder:
+            codigos.byteswap()
+        return list(map(tabla.__getitem__, codigos))
+    if tipo in ("entero", "decimal"):
+        valores = array("q" if tipo == "entero" else "d")
+        valores.frombytes(contenido)
+        if orden_bytes != sys.byteorder:
+            valores.byteswap()
+        return valores.tolist()
+    return json.loads(contenido)
+
+def _campos_de_registros(valores):
+    """Campos comunes si cada valor es una lista de registros con los mismos campos, si no None"""
+    campos = None
+    for lista in valores:
+        if type(lista) is not list:
+            return None
+        for registro in lista:
+            if not isinstance(registro, Mapping):
+                return None
+            if campos is None:
+                campos = list(registro)
+            if len(registro) != len(campos) or any(campo not in registro for campo in campos):
+                return None
+    return campos
+
+def _codificar_registros(campos, valores):
+    """Bytes de una columna de listas de registros: cantidad por lista y una columna por campo"""
+    registros = [registro for lista in valores for registro in lista]
+    partes = [array("I", map(len, valores)).tobytes()]
+    columnas = []
+    for campo in campos:
+        subvalores = [registro[campo] for registro in registros]
+        tipo = _tipo_columna(subvalores)
+        columnas.append([campo, tipo])
+        partes.append(_codificar_columna(tipo, subvalores))
+    return columnas, b"".join(_LONGITUD.pack(len(parte)) + parte for parte in partes)
+
+def _decodificar_registros(columnas, contenido, cantidad, orden_bytes):
+    """Reconstruye las listas de registros de una columna"""
+    bloques = []
+    posicion = 0
+    while posicion < len(contenido):
+        (largo,) = _LONGITUD.unpack_from(contenido, posicion)
+        posicion += _LONGITUD.size
+        bloques.append(contenido[posicion:posicion + largo])
+        posicion += largo
+    if len(bloques) != len(columnas) + 1:
+        raise ValueError("columna de registros incompleta")
+
+    cantidades = array("I")
+    cantidades.frombytes(bloques[0])
+    if orden_bytes != sys.byteorder:
+        cantidades.byteswap()
+    if len(cantidades) != cantidad:
+        raise ValueError("columna de registros incompleta")
+    total = sum(cantidades)
+    subcolumnas = [_decodificar_columna(tipo, bloque, total, orden_bytes)
+                   for (_, tipo), bloque in zip(columnas, bloques[1:])]
+    campos = [campo for campo, _ in columnas]
+    registros = [dict(zip(campos, fila)) for fila in zip(*subcolumnas)] if campos else [{} for _ in range(total)]
+    if len(registros) != total:
+        raise ValueError("columna de registros incompleta")
+
+    listas = []
+    inicio = 0
+    for cantidad_lista in cantidades:
+        listas.append(registros[inicio:inicio + cantidad_lista])
+        inicio += cantidad_lista
+    return listas
+
+def escribir(ruta_binaria, ruta_origen, datos, clave):
+    """Escribe la instantánea binaria de datos[clave] asociada a la versión actual del JSON"""
+    registros = datos[clave]
+
+    # Los campos presentes en todos los registros van en columnas; el resto, por registro
+    comunes = list(registros[0]) if registros else []
+    for registro in registros:
+        if len(registro) != len(comunes) or any(campo not in registro for campo in comunes):
+            comunes = [campo for campo in comunes if campo in registro]
+    irregulares = {}
+    for indice, registro in enumerate(registros):
+        if len(registro) != len(comunes):
+            irregulares[indice] = {k: v for k, v in registro.items() if k not in comunes}
+
+    columnas = []
+    bloques = []
+    for campo in comunes:
+        valores = [registro[campo] for registro in registros]
+        tipo = _tipo_columna(valores)
+        campos_anidados = _campos_de_registros(valores) if tipo == "json" else None
+        if campos_anidados:
+            anidadas, bloque = _codificar_registros(campos_anidados, valores)
+            columnas.append([campo, "registros", anidadas])
+            bloques.append(bloque)
+            continue
+        columnas.append([campo, tipo])
+        bloques.append(_codificar_columna(tipo, valores))
+
+    cabecera = {
+        "origen": firma(ruta_origen),
+        "clave": clave,
+        "cantidad": len(registros),
+        "orden_bytes": sys.byteorder,
+        "columnas": columnas,
+        "irregulares": irregulares,
+        "raiz": {k: v for k, v in datos.items() if k != clave}
+    }
+    cabecera_bytes = json.dumps(cabecera, ensure_ascii=False, default=modelos.a_json).encode("utf-8")
+
+    partes = [_PREAMBULO.pack(MAGIA, VERSION, len(cabecera_bytes)), cabecera_bytes]
+    for bloque in bloques:
+        partes.append(_LONGITUD.pack(len(bloque)))
+        partes.append(bloque)
+    escritor.escribir_atomico(ruta_binaria, b"".join(partes))
+
+def leer(ruta_binaria, ruta_origen):
+    """Lee la instantánea si corresponde al JSON actual; devuelve (datos, tipos por campo) o None"""
+    try:
+        origen = firma(ruta_origen)
+        with open(ruta_binaria, "rb") as archivo:
+            contenido = archivo.read()
+    except FileNotFoundError:
+        return None
+
+    try:
+        magia, version, largo = _PREAMBULO.unpack_from(contenido, 0)
+        # Las instantáneas de la versión 1 no usan los tipos nuevos y se siguen leyendo
+        if magia != MAGIA or version > VERSION:
+            return None
+        posicion = _PREAMBULO.size
+        cabecera = json.loads(contenido[posicion:posicion + largo])
+        posicion += largo
+        # El JSON cambió (o fue restaurado) después de escribir la instantánea
+        if cabecera["origen"] != origen:
+            return None
+
+        cantidad = cabecera["cantidad"]
+        nombres = []
+        columnas = []
+        for campo, tipo, *anidadas in cabecera["columnas"]:
+            (largo,) = _LONGITUD.unpack_from(contenido, posicion)
+            posicion += _LONGITUD.size
+            bloque = contenido[posicion:posicion + largo]
+            if tipo == "registros":
+                valores = _decodificar_registros(anidadas[0], bloque, cantidad, cabecera["orden_bytes"])
+            else:
+                valores = _decodificar_columna(tipo, bloque, cantidad, cabecera["orden_bytes"])
+            if len(valores) != cantidad:
+                raise ValueError(f"columna {campo} incompleta")
+            posicion += largo
+            nombres.append(campo)
+            columnas.append(valores)
+    except (struct.error, ValueError, KeyError, IndexError) as e:
+        logger.warning(f"Instantánea binaria ilegible, se usará el JSON: {e}")
+        return None
+
+    if columnas:
+        registros = [dict(zip(nombres, fila)) for fila in zip(*columnas)]
+    else:
+        registros = [{} for _ in range(cantidad)]
+    for indice, resto in cabecera["irregulares"].items():
+        registros[int(indice)].update(resto)
+
+    datos = {cabecera["clave"]: registros}
+    datos.update(cabecera["raiz"])
+    return datos, {columna[0]: columna[1] for columna in cabecera["columnas"]}
@@ -0,0 +1,85 @@
+"""
+Módulo de bloqueos entre procesos
+Coordina a varias terminales que usan el mismo directorio de datos mediante un
+archivo de bloqueo: las lecturas toman un bloqueo compartido y las escrituras
+uno exclusivo. En Windows no hay bloqueos compartidos y ambos son exclusivos.
+Un bloqueo exclusivo no puede tomarse dentro de uno compartido del mismo hilo:
+convertirlo no es atómico y otro proceso podría escribir entre medio
+"""
+import contextlib
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# Estado por hilo: descriptor abierto, modo actual y nivel de anidamiento
+_estado = threading.local()
+
+COMPARTIDO = "compartido"
+EXCLUSIVO = "exclusivo"
+
+class BloqueoAnidadoError(Exception):
+    """Se pidió un bloqueo exclusivo mientras el hilo tiene uno compartido"""
+
+def _bloquear(descriptor, modo):
+    """Toma el bloqueo del archivo en el modo indicado (espera si está ocupado)"""
+    if fcntl is not None:
+        fcntl.flock(descriptor, fcntl.LOCK_SH if modo == COMPARTIDO else fcntl.LOCK_EX)
+    else:
+        os.lseek(descriptor, 0, os.SEEK_SET)
+        msvcrt.locking(descriptor, msvcrt.LK_LOCK, 1)
+
+def _desbloquear(descriptor):
+    """Libera el bloqueo del archivo"""
+    if fcntl is not None:
+        fcntl.flock(descriptor, fcntl.LOCK_UN)
+    else:
+        os.lseek(descriptor, 0, os.SEEK_SET)
+        msvcrt.locking(descriptor, msvcrt.LK_UNLCK, 1)
+
+@contextlib.contextmanager
+def _bloqueo(ruta_bloqueo, modo):
+    """Bloqueo reentrante dentro del mismo hilo"""
+    tomado = getattr(_estado, "tomados", None)
+    if tomado is None:
+        tomado = _estado.tomados = {}
+
+    actual = tomado.get(ruta_bloqueo)
+    if actual is not None:
+        descriptor, modo_actual, nivel = actual
+        # flock suelta el compartido antes de dar el exclusivo: lo leído bajo el
+        # compartido podría quedar viejo, así que quien escribe debe soltarlo primero
+        if modo == EXCLUSIVO and modo_actual == COMPARTIDO:
+            raise BloqueoAnidadoError(f"Bloqueo exclusivo pedido dentro de uno compartido: {ruta_bloqueo}")
+        tomado[ruta_bloqueo] = (descriptor, modo_actual, nivel + 1)
+        try:
+            yield
+        finally:
+            descriptor, modo_actual, nivel = tomado[ruta_bloqueo]
+            tomado[ruta_bloqueo] = (descriptor, modo_actual, nivel - 1)
+        return
+
+    os.makedirs(os.path.dirname(ruta_bloqueo), exist_ok=True)
+    descriptor = os.open(ruta_bloqueo, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        _bloquear(descriptor, modo)
+        tomado[ruta_bloqueo] = (descriptor, modo, 1)
+        try:
+            yield
+        finally:
+            del tomado[ruta_bloqueo]
+            _desbloquear(descriptor)
+    finally:
+        os.close(descriptor)
+
+def compartido(ruta_bloqueo):
+    """Bloqueo para leer: varios lectores a la vez, ningún escritor"""
+    return _bloqueo(ruta_bloqueo, COMPARTIDO)
+
+def exclusivo(ruta_bloqueo):
+    """Bloqueo para escribir: un solo proceso a la vez"""
+    return _bloqueo(ruta_bloqueo, EXCLUSIVO)
@@ -0,0 +1,169 @@
+"""
+Módulo de búsqueda de productos
+Índice de trigramas sobre el código y el nombre normalizados (minúsculas y sin
+tildes) de cada producto. Una consulta solo verifica los productos que contienen
+todos sus trigramas, y los resultados se ordenan por relevancia. Editar o quitar
+un producto deja su documento anterior descartado; cuando los descartados superan
+una fracción de los vigentes el índice se reconstruye
+"""
+from array import array
+import heapq
+import unicodedata
+
+# Resultados devueltos como máximo por consulta
+LIMITE_RESULTADOS = 50
+
+# Documentos descartados tolerados, como fracción de los vigentes, antes de reconstruir el índice
+FRACCION_DESCARTADOS = 0.5
+
+def normalizar(texto):
+    """Minúsculas y sin tildes, para comparar sin importar cómo se escribió"""
+    texto = texto.lower()
+    if texto.isascii():
+        return texto
+    descompuesto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in descompuesto if not unicodedata.combining(c))
+
+def _trigramas(texto):
+    """Conjunto de subcadenas de tres caracteres del texto"""
+    return set(map("".join, zip(texto, texto[1:], texto[2:])))
+
+class _Indice:
+    """Índice de trigramas de una lista de productos"""
+
+    def __init__(self, productos):
+        self.productos = productos
+        # Cada producto indexado recibe un número de documento; los quitados quedan en None
+        self.documentos = []
+        self.codigos = []
+        self.nombres = []
+        self.documento_de = {}
+        self.trigramas = {}
+        for producto in productos:
+            self.agregar(producto)
+        self.tamano = len(productos)
+
+    def agregar(self, producto):
+        """Indexa un producto con un número de documento nuevo"""
+        documento = len(self.documentos)
+        codigo = normalizar(producto["codigo_producto"])
+        nombre = normalizar(producto["nombre"])
+        self.documentos.append(producto)
+        self.codigos.append(codigo)
+        self.nombres.append(nombre)
+        self.documento_de[id(producto)] = documento
+        # El separador evita que una consulta coincida con el final del código y el inicio del nombre
+        for trigrama in _trigramas(f"{codigo}\0{nombre}"):
+            lista = self.trigramas.get(trigrama)
+            if lista is None:
+                lista = self.trigramas[trigrama] = array("I")
+            lista.append(documento)
+
+    def quitar(self, producto):
+        """Deja sin efecto el documento de un producto (sus entradas se descartan al consultar)"""
+        documento = self.documento_de.pop(id(producto), None)
+        if documento is not None:
+            self.documentos[documento] = None
+
+    def descartados(self):
+        """Cantidad de documentos quitados que siguen ocupando lugar en el índice"""
+        return len(self.documentos) - len(self.documento_de)
+
+    def vigente(self, productos):
+        """Indica si el índice sigue correspondiendo a la lista de productos"""
+        return self.productos is productos and self.tamano == len(productos)
+
+    def candidatos(self, consulta):
+        """Documentos que pueden contener la consulta"""
+        if len(consulta) < 3:
+            # Sin trigramas que intersecar se revisan todos los textos ya normalizados
+            return range(len(self.documentos))
+        listas = []
+        for trigrama in _trigramas(consulta):
+            lista = self.trigramas.get(trigrama)
+            if lista is None:
+                return ()
+            listas.append(lista)
+        # Se parte de la lista más corta para que las intersecciones sean pequeñas
+        listas.sort(key=len)
+        resultado = set(listas[0])
+        for lista in listas[1:]:
+            resultado.intersection_update(lista)
+            if not resultado:
+                break
+        return resultado
+
+def _relevancia(codigo, nombre, consulta):
+    """Menor es mejor: código exacto, prefijo de código, prefijo de nombre, inicio de palabra, resto"""
+    if codigo == consulta:
+        return 0
+    if codigo.startswith(consulta):
+        return 1
+    if nombre.startswith(consulta):
+        return 2
+    if f" {consulta}" in f" {nombre}":
+        return 3
+    return 4
+
+# Índice del catálogo en uso (la aplicación trabaja con un solo catálogo)
+_indice = None
+
+def obtener(productos):
+    """Devuelve el índice de la lista de productos, construyéndolo si la lista cambió"""
+    global _indice
+    if _indice is None or not _indice.vigente(productos):
+        _indice = _Indice(productos)
+    return _indice
+
+def buscar(productos, texto, limite=LIMITE_RESULTADOS):
+    """Productos cuyo código o nombre contiene el texto, ordenados por relevancia"""
+    consulta = normalizar(texto.strip())
+    if not consulta:
+        return []
+    indice = obtener(productos)
+    coincidencias = []
+    for documento in indice.candidatos(consulta):
+        producto = indice.documentos[documento]
+        if producto is None:
+            continue
+        codigo = indice.codigos[documento]
+        nombre = indice.nombres[documento]
+        if consulta in codigo or consulta in nombre:
+            coincidencias.append((_relevancia(codigo, nombre, consulta), len(nombre), codigo, documento))
+    return [indice.documentos[c[3]] for c in heapq.nsmallest(limite, coincidencias)]
+
+def agregar(productos, producto):
+    """Refleja en el índice un producto recién agregado al final de la lista"""
+    if _indice is None or _indice.productos is not productos or _indice.tamano != len(productos) - 1:
+        invalidar()
+        return
+    _indice.agregar(producto)
+    _indice.tamano += 1
+
+def actualizar(productos, producto):
+    """Vuelve a indexar un producto cuyo código o nombre cambió"""
+    if _indice is None or not _indice.vigente(productos):
+        return
+    _indice.quitar(producto)
+    _indice.agregar(producto)
+    _compactar(productos)
+
+def quitar(productos, producto):
+    """Refleja en el índice un producto recién quitado de la lista"""
+    if _indice is None or _indice.productos is not productos or _indice.tamano != len(productos) + 1:
+        invalidar()
+        return
+    _indice.quitar(producto)
+    _indice.tamano -= 1
+    _compactar(productos)
+
+def _compactar(productos):
+    """Reconstruye el índice si los documentos descartados superan la fracción tolerada de los vigentes"""
+    global _indice
+    if _indice.descartados() > FRACCION_DESCARTADOS * max(len(_indice.documento_de), 1):
+        _indice = _Indice(productos)
+
+def invalidar():
+    """Descarta el índice cuando los productos de la lista se reemplazan"""
+    global _indice
+    _indice = None
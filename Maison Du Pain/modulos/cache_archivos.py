@@ -0,0 +1,58 @@
+"""
+Módulo de caché de archivos JSON
+Guarda en memoria el contenido ya interpretado de cada archivo junto con su
+fecha de modificación y tamaño; mientras el archivo no cambie en disco las
+lecturas siguientes devuelven el mismo objeto sin volver a interpretarlo
+
+Los objetos devueltos son compartidos: quien los modifica debe guardarlos
+"""
+import json
+import os
+import threading
+
+# ruta -> (mtime_ns, tamaño, datos)
+_entradas = {}
+_candado = threading.Lock()
+
+def _firma(ruta_archivo):
+    """Devuelve la fecha de modificación y el tamaño del archivo"""
+    estado = os.stat(ruta_archivo)
+    return estado.st_mtime_ns, estado.st_size
+
+def vigente(ruta_archivo):
+    """Devuelve los datos en caché si el archivo no cambió desde que se leyó, o None"""
+    with _candado:
+        entrada = _entradas.get(ruta_archivo)
+    if entrada is None:
+        return None
+    try:
+        if _firma(ruta_archivo) == entrada[:2]:
+            return entrada[2]
+    except FileNotFoundError:
+        pass
+    olvidar(ruta_archivo)
+    return None
+
+def leer_json(ruta_archivo):
+    """Lee un archivo JSON usando la caché; lanza FileNotFoundError si no existe"""
+    datos = vigente(ruta_archivo)
+    if datos is not None:
+        return datos
+
+    firma = _firma(ruta_archivo)
+    with open(ruta_archivo, "r", encoding="utf-8") as archivo:
+        datos = json.load(archivo)
+    with _candado:
+        _entradas[ruta_archivo] = firma + (datos,)
+    return datos
+
+def recordar(ruta_archivo, datos):
+    """Actualiza la caché tras escribir el archivo con esos datos"""
+    firma = _firma(ruta_archivo)
+    with _candado:
+        _entradas[ruta_archivo] = firma + (datos,)
+
+def olvidar(ruta_archivo):
+    """Descarta la entrada de un archivo"""
+    with _candado:
+        _entradas.pop(ruta_archivo, None)
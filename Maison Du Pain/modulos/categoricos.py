@@ -0,0 +1,62 @@
+"""
+Módulo de campos categóricos
+Los campos con pocos valores distintos (categoría, estado, proveedor) y los
+códigos de producto que se repiten en cada línea de pedido se codifican con un
+diccionario por campo: cada texto distinto recibe un número pequeño y los
+registros comparten un único objeto por valor. Las agrupaciones cuentan sobre
+esos números en listas en vez de diccionarios de textos
+"""
+
+# Campos codificados con diccionario
+CAMPOS = ("categoria", "estado", "proveedor", "codigo_producto")
+
+class Diccionario:
+    """Tabla de textos de un campo: código -> texto y texto -> código"""
+
+    def __init__(self):
+        self.valores = []
+        self.codigos = {}
+
+    def codigo(self, valor):
+        """Código del valor, agregándolo a la tabla la primera vez"""
+        codigo = self.codigos.get(valor)
+        if codigo is None:
+            codigo = self.codigos[valor] = len(self.valores)
+            self.valores.append(valor)
+        return codigo
+
+    def valor(self, codigo):
+        return self.valores[codigo]
+
+    def __len__(self):
+        return len(self.valores)
+
+# Un diccionario por campo, compartido por todo el proceso (los códigos no cambian mientras se ejecuta)
+_diccionarios = {campo: Diccionario() for campo in CAMPOS}
+
+def diccionario(campo):
+    """Diccionario del campo"""
+    return _diccionarios[campo]
+
+def canonico(campo, valor):
+    """El objeto compartido para ese texto del campo (otros tipos de valor quedan igual)"""
+    if type(valor) is not str:
+        return valor
+    tabla = _diccionarios[campo]
+    return tabla.valores[tabla.codigo(valor)]
+
+def codificar(campo, valores):
+    """Códigos de una secuencia de textos del campo"""
+    codigo = _diccionarios[campo].codigo
+    return [codigo(valor) for valor in valores]
+
+def contar(codigos, tamano, pesos=None):
+    """Cantidad (o suma de pesos) por código, como una lista indexada por código"""
+    totales = [0] * tamano
+    if pesos is None:
+        for codigo in codigos:
+            totales[codigo] += 1
+    else:
+        for codigo, peso in zip(codigos, pesos):
+            totales[codigo] += peso
+    return totales
@@ -27,7 +27,9 @@ CONFIG_DEFAULT = {
         "stock_critico": 2,
         "alertas_automaticas": True,
         "respaldo_automatico": True,
-        "dias_retener_respaldos": 30
+        "dias_retener_respaldos": 30,
+        "compresion_respaldos": "gzip",
+        "nivel_compresion": 6
     },
     "ventas": {
         "moneda": "COP",
@@ -45,6 +47,21 @@ CONFIG_DEFAULT = {
         "exportar_automatico": False,
         "formato_exportacion": "json",
         "incluir_detalles": True
+    },
+    "registro": {
+        "nivel": "INFO",
+        "nivel_consola": "WARNING",
+        "tamano_maximo_mb": 5,
+        "archivos_conservados": 10
+    },
+    "almacenamiento": {
+        "motor": "json",
+        "compactar_cada": 500,
+        "escritura_agrupada": False,
+        "intervalo_escritura": 0.5,
+        "particionar_pedidos": False,
+        "instantanea_binaria": False,
+        "registro_recuperacion_kb": 1024
     }
 }
 
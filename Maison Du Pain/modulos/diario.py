@@ -0,0 +1,292 @@
+"""
+Módulo del diario de cambios
+Registra cada mutación (producto, stock, pedido, detalle) como un registro
+pequeño al final de un archivo, para no reescribir todos los datos en cada venta.
+Cada línea lleva una suma CRC32 que permite detectar una escritura interrumpida.
+Quien modifica registros los marca al guardarlos, así cada guardado compara
+con su versión anterior solo esos registros y no la colección completa. El stock
+se anota también como diferencia respecto de la versión anterior: al aplicarla
+se suma al stock guardado, así dos terminales que venden el mismo producto no
+pisan una la venta de la otra
+"""
+import json
+import os
+import threading
+import zlib
+import logging
+from collections.abc import Mapping
+
+from modulos import escritor
+from modulos import modelos
+
+logger = logging.getLogger(__name__)
+
+# Última versión conocida de cada colección, usada para detectar cambios
+_base = {
+    "productos": {},
+    "pedidos": {},
+    "detalles": {}
+}
+
+# Clave que identifica a cada registro dentro de su colección
+CLAVES = {
+    "productos": "codigo_producto",
+    "pedidos": "codigo_pedido",
+    "detalles": "codigo_pedido"
+}
+
+# Registros marcados al guardar desde el último cambio detectado: colección ->
+# {clave: registro, o None si se eliminó}; None si hay que revisar la colección completa
+_marcados = {
+    "productos": None,
+    "pedidos": None,
+    "detalles": None
+}
+# El escritor en segundo plano toma las marcas mientras el hilo principal agrega otras
+_candado_marcas = threading.Lock()
+
+# Tipo de registro del diario que corresponde a cada colección
+TIPOS = {
+    "productos": "producto",
+    "pedidos": "pedido",
+    "detalles": "detalle"
+}
+
+def copiar_registro(registro):
+    """Copia un registro (diccionario o modelo) como diccionario, con sus listas de registros anidadas"""
+    copia = {}
+    for campo, valor in registro.items():
+        if isinstance(valor, list):
+            copia[campo] = [dict(v) if isinstance(v, Mapping) else v for v in valor]
+        else:
+            copia[campo] = valor
+    return copia
+
+def fijar_base(coleccion, registros):
+    """Establece el estado de referencia de una colección tras cargarla o compactarla"""
+    clave = CLAVES[coleccion]
+    _base[coleccion] = {r[clave]: copiar_registro(r) for r in registros}
+    # La referencia ya coincide con los registros: las marcas anteriores sobran
+    with _candado_marcas:
+        _marcados[coleccion] = {}
+
+def marcar(coleccion, modificados, eliminados=()):
+    """Anota los registros agregados o modificados y los eliminados que tendrá en cuenta el próximo guardado"""
+    clave = CLAVES[coleccion]
+    with _candado_marcas:
+        marcados = _marcados[coleccion]
+        if marcados is None:
+            # Ya se revisará la colección completa
+            return
+        for registro in eliminados:
+            marcados[registro[clave]] = None
+        for registro in modificados:
+            marcados[registro[clave]] = registro
+
+def marcar_todos(coleccion):
+    """Hace que el próximo guardado revise la colección completa (no se sabe qué registros cambiaron)"""
+    with _candado_marcas:
+        _marcados[coleccion] = None
+
+def por_revisar(coleccion, registros):
+    """Registros que el guardado debe comparar y claves eliminadas, olvidando las marcas: los marcados,
+    o la colección completa sin claves (None) si no se sabe cuáles cambiaron"""
+    with _candado_marcas:
+        marcados = _marcados[coleccion]
+        _marcados[coleccion] = {}
+    if marcados is None:
+        return registros, None
+    return ([r for r in marcados.values() if r is not None],
+            [codigo for codigo, r in marcados.items() if r is None])
+
+def detectar_cambios(coleccion, registros, eliminados=None, diferencias=False):
+    """Compara los registros con su estado de referencia y devuelve los registros del diario; sin
+    eliminados (claves), registros es la colección completa y lo que no está se da por eliminado.
+    Con diferencias, los productos que ya existían llevan además el cambio de su stock"""
+    clave = CLAVES[coleccion]
+    tipo = TIPOS[coleccion]
+    base = _base[coleccion]
+    cambios = []
+    vistos = set()
+
+    for registro in registros:
+        codigo = registro[clave]
+        vistos.add(codigo)
+        anterior = base.get(codigo)
+        if anterior == registro:
+            continue
+
+        # Un cambio que solo afecta al stock se registra de forma compacta
+        if (coleccion == "productos" and anterior is not None and
+                anterior.keys() == registro.keys() and
+                all(anterior[c] == registro[c] for c in registro if c != "cantidad_en_stock")):
+            cambio = {"tipo": "stock", "clave": codigo, "valor": registro["cantidad_en_stock"]}
+        else:
+            cambio = {"tipo": tipo, "clave": codigo, "valor": registro}
+        if (diferencias and coleccion == "productos" and anterior is not None and
+                isinstance(anterior.get("cantidad_en_stock"), int) and
+                isinstance(registro.get("cantidad_en_stock"), int)):
+            cambio["diferencia"] = registro["cantidad_en_stock"] - anterior["cantidad_en_stock"]
+        cambios.append(cambio)
+        base[codigo] = copiar_registro(registro)
+
+    # Los registros que ya no están se marcan como eliminados
+    if eliminados is None:
+        eliminados = [c for c in base if c not in vistos]
+    for codigo in eliminados:
+        if codigo in base:
+            cambios.append({"tipo": tipo, "clave": codigo, "valor": None})
+            del base[codigo]
+
+    return cambios
+
+def _linea(cambio):
+    """Serializa un registro como línea: JSON, tabulador y CRC32 del JSON"""
+    texto = json.dumps(cambio, ensure_ascii=False, default=modelos.a_json)
+    return f"{texto}\t{zlib.crc32(texto.encode('utf-8')):08x}\n"
+
+def _decodificar(linea):
+    """Devuelve el registro de una línea, o None si está incompleta o no coincide su suma"""
+    texto, separador, suma = linea.rpartition(b"\t")
+    if not separador:
+        # Líneas anteriores a las sumas de verificación
+        texto = linea
+    elif f"{zlib.crc32(texto):08x}".encode("ascii") != suma.strip():
+        return None
+    try:
+        return json.loads(texto)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+
+def anexar(ruta_diario, cambios, durable=True):
+    """Agrega los cambios al final del diario y (salvo que se indique) los hace durables"""
+    if not cambios:
+        return 0
+
+    os.makedirs(os.path.dirname(ruta_diario), exist_ok=True)
+    lineas = "".join(_linea(c) for c in cambios)
+    with open(ruta_diario, "a", encoding="utf-8") as archivo:
+        archivo.write(lineas)
+        if durable:
+            archivo.flush()
+            os.fsync(archivo.fileno())
+    return len(cambios)
+
+def _leer_validos(ruta_diario):
+    """Lee los registros hasta el primero dañado; devuelve los registros y dónde terminan los válidos"""
+    registros = []
+    fin_valido = 0
+    with open(ruta_diario, "rb") as archivo:
+        for numero, linea in enumerate(archivo, 1):
+            if linea.strip():
+                registro = _decodificar(linea) if linea.endswith(b"\n") else None
+                if registro is None:
+                    # Lo que sigue a una línea dañada no es confiable: es la cola de una escritura interrumpida
+                    logger.warning(f"Registro dañado en la línea {numero} de {os.path.basename(ruta_diario)}, "
+                                   "se ignora el resto")
+                    break
+                registros.append(registro)
+            fin_valido += len(linea)
+    return registros, fin_valido
+
+def leer(ruta_diario):
+    """Lee los registros del diario en orden"""
+    if not os.path.exists(ruta_diario):
+        return []
+    return _leer_validos(ruta_diario)[0]
+
+def reparar_cola(ruta_diario):
+    """Recorta una cola dañada por una escritura interrumpida; devuelve los bytes descartados"""
+    if not os.path.exists(ruta_diario):
+        return 0
+    fin_valido = _leer_validos(ruta_diario)[1]
+    descartados = os.path.getsize(ruta_diario) - fin_valido
+    if descartados:
+        # Sin recortarla, los registros anexados después quedarían detrás de la línea dañada
+        with open(ruta_diario, "r+b") as archivo:
+            archivo.truncate(fin_valido)
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        logger.warning(f"Cola dañada de {os.path.basename(ruta_diario)} recortada ({descartados} bytes)")
+    return descartados
+
+def contar_registros(ruta_diario):
+    """Cuenta los registros pendientes de compactar"""
+    if not os.path.exists(ruta_diario):
+        return 0
+    with open(ruta_diario, "rb") as archivo:
+        return sum(1 for linea in archivo if linea.strip())
+
+def aplicar(coleccion, registros, cambios):
+    """Aplica los registros del diario de una colección sobre la lista cargada de la instantánea"""
+    clave = CLAVES[coleccion]
+    tipo = TIPOS[coleccion]
+    posiciones = {r[clave]: i for i, r in enumerate(registros)}
+    eliminados = set()
+
+    for cambio in cambios:
+        codigo = cambio["clave"]
+        # Con diferencia, el stock del registro existente se ajusta en vez de reemplazarse
+        existente = registros[posiciones[codigo]] if codigo in posiciones and codigo not in eliminados else None
+        diferencia = cambio.get("diferencia") if existente is not None else None
+        if cambio["tipo"] == "stock" and coleccion == "productos":
+            if existente is not None:
+                existente["cantidad_en_stock"] = (cambio["valor"] if diferencia is None
+                                                  else existente["cantidad_en_stock"] + diferencia)
+        elif cambio["tipo"] == tipo:
+            if cambio["valor"] is None:
+                eliminados.add(codigo)
+            elif codigo in posiciones:
+                valor = cambio["valor"]
+                if diferencia is not None:
+                    valor = dict(valor, cantidad_en_stock=existente["cantidad_en_stock"] + diferencia)
+                registros[posiciones[codigo]] = valor
+                eliminados.discard(codigo)
+            else:
+                posiciones[codigo] = len(registros)
+                registros.append(cambio["valor"])
+
+    if eliminados:
+        registros[:] = [r for r in registros if r[clave] not in eliminados]
+    return registros
+
+def fusionar(coleccion, registros_disco, registros):
+    """Aplica sobre la versión en disco los cambios hechos en memoria y devuelve esos cambios"""
+    # El stock se fusiona como diferencia: dos terminales que venden el mismo producto suman sus ventas
+    stock_disco = {r[CLAVES[coleccion]]: r.get("cantidad_en_stock") for r in registros_disco}
+    cambios = detectar_cambios(coleccion, *por_revisar(coleccion, registros), diferencias=True)
+    # Los cambios devueltos van al registro de recuperación, que necesita valores completos
+    for cambio in cambios:
+        diferencia = cambio.pop("diferencia", None)
+        actual = stock_disco.get(cambio["clave"])
+        if diferencia is None or actual is None:
+            continue
+        if cambio["tipo"] == "stock":
+            cambio["valor"] = actual + diferencia
+        else:
+            cambio["valor"] = dict(cambio["valor"], cantidad_en_stock=actual + diferencia)
+
+    aplicar(coleccion, registros_disco, cambios)
+    fijar_base(coleccion, registros_disco)
+    return cambios
+
+def valores_completos(cambios, productos):
+    """Cambios equivalentes sin diferencias de stock (None si no tienen): cada producto tocado pasa
+    a su estado final en la lista ya aplicada, así reproducirlos más de una vez da el mismo resultado"""
+    if not any("diferencia" in cambio for cambio in cambios):
+        return None
+    finales = {producto["codigo_producto"]: producto for producto in productos}
+    tocados = dict.fromkeys(c["clave"] for c in cambios if c["tipo"] in ("stock", TIPOS["productos"]))
+    return ([c for c in cambios if c["tipo"] not in ("stock", TIPOS["productos"])] +
+            [{"tipo": TIPOS["productos"], "clave": codigo, "valor": finales.get(codigo)} for codigo in tocados])
+
+def reescribir(ruta_diario, cambios):
+    """Reemplaza de forma atómica el contenido del diario por los cambios indicados"""
+    escritor.escribir_atomico(ruta_diario, "".join(_linea(c) for c in cambios).encode("utf-8"))
+
+def vaciar(ruta_diario):
+    """Descarta los registros del diario una vez integrados en la instantánea"""
+    if os.path.exists(ruta_diario):
+        with open(ruta_diario, "w", encoding="utf-8") as archivo:
+            archivo.flush()
+            os.fsync(archivo.fileno())
@@ -0,0 +1,147 @@
+"""
+Módulo del escritor en segundo plano
+Agrupa las escrituras que llegan en ráfaga y las confirma de forma atómica
+(archivo temporal + fsync + renombrado) una vez por intervalo. Lo escrito en
+el intervalo se pierde si el proceso se interrumpe antes de confirmarlo.
+Orden de los candados: primero el bloqueo de archivo y después el candado de
+confirmación, así quien ya tiene el bloqueo de archivo puede confirmar
+"""
+import atexit
+import contextlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from modulos import bloqueo
+from modulos import modelos
+
+logger = logging.getLogger(__name__)
+
+# Escrituras pendientes: clave (ruta del archivo) -> función que escribe el estado actual
+_pendientes = {}
+_condicion = threading.Condition()
+
+# Evita que el hilo y una confirmación explícita escriban a la vez; se toma siempre
+# después del bloqueo de archivo
+_candado_confirmacion = threading.Lock()
+
+_hilo = None
+_intervalo = 0.5
+_ruta_bloqueo = None
+
+# Reintentos máximos al vaciar si los datos cambian durante la serialización
+MAX_REINTENTOS = 5
+
+def _sincronizar_directorio(directorio):
+    """Hace durable el renombrado sincronizando el directorio"""
+    if os.name == "nt":
+        # En Windows no se pueden abrir directorios para sincronizarlos
+        return
+    descriptor = os.open(directorio, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+def escribir_atomico(ruta_archivo, contenido):
+    """Escribe bytes en un temporal, los sincroniza y lo renombra sobre el destino"""
+    directorio = os.path.dirname(ruta_archivo)
+    os.makedirs(directorio, exist_ok=True)
+    descriptor, ruta_temporal = tempfile.mkstemp(prefix=".tmp_", dir=directorio)
+    try:
+        with os.fdopen(descriptor, "wb") as archivo:
+            archivo.write(contenido)
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        os.replace(ruta_temporal, ruta_archivo)
+    except BaseException:
+        if os.path.exists(ruta_temporal):
+            os.remove(ruta_temporal)
+        raise
+    _sincronizar_directorio(directorio)
+
+def escribir_json_atomico(ruta_archivo, datos):
+    """Serializa los datos como JSON, los escribe de forma atómica y devuelve los bytes escritos"""
+    contenido = json.dumps(datos, indent=4, ensure_ascii=False, default=modelos.a_json).encode("utf-8")
+    escribir_atomico(ruta_archivo, contenido)
+    return contenido
+
+def configurar(intervalo, ruta_bloqueo=None):
+    """Ajusta el intervalo de agrupación en segundos y el bloqueo de archivo que toman las escrituras"""
+    global _intervalo, _ruta_bloqueo
+    _intervalo = max(0.0, float(intervalo))
+    _ruta_bloqueo = ruta_bloqueo
+
+def programar(clave, escritura):
+    """Marca una escritura como pendiente, reemplazando la anterior con la misma clave"""
+    global _hilo
+    with _condicion:
+        _pendientes[clave] = escritura
+        if _hilo is None or not _hilo.is_alive():
+            _hilo = threading.Thread(target=_bucle, name="escritor", daemon=True)
+            _hilo.start()
+        _condicion.notify()
+
+def hay_pendiente(clave):
+    """Indica si hay una escritura pendiente para la clave"""
+    with _condicion:
+        return clave in _pendientes
+
+def _bucle():
+    """Espera escrituras, deja que la ráfaga se acumule y las confirma juntas"""
+    while True:
+        with _condicion:
+            while not _pendientes:
+                _condicion.wait()
+        time.sleep(_intervalo)
+        _confirmar()
+
+def _bloqueo_archivo():
+    """Bloqueo exclusivo de archivo que se toma antes del candado de confirmación"""
+    if _ruta_bloqueo is None:
+        return contextlib.nullcontext()
+    return bloqueo.exclusivo(_ruta_bloqueo)
+
+def _confirmar(claves=None):
+    """Ejecuta las escrituras pendientes (todas o solo las claves indicadas)"""
+    with _condicion:
+        if not (_pendientes if claves is None else any(c in _pendientes for c in claves)):
+            return 0
+    with _bloqueo_archivo(), _candado_confirmacion:
+        with _condicion:
+            if claves is None:
+                lote = dict(_pendientes)
+                _pendientes.clear()
+            else:
+                lote = {c: _pendientes.pop(c) for c in claves if c in _pendientes}
+
+        fallidas = 0
+        for clave, escritura in lote.items():
+            try:
+                escritura()
+            except RuntimeError as e:
+                # Los datos cambiaron mientras se serializaban; se reintenta en el próximo ciclo
+                logger.warning(f"Escritura de {clave} aplazada: {e}")
+                with _condicion:
+                    _pendientes.setdefault(clave, escritura)
+                fallidas += 1
+            except Exception as e:
+                logger.error(f"Error en la escritura agrupada de {clave}: {e}")
+        return fallidas
+
+def confirmar_pendiente(clave):
+    """Confirma de inmediato la escritura pendiente de una clave, si la hay"""
+    if hay_pendiente(clave):
+        _confirmar([clave])
+
+def vaciar_pendientes():
+    """Confirma en disco todas las escrituras pendientes"""
+    for _ in range(MAX_REINTENTOS):
+        if not _confirmar():
+            break
+
+# Garantiza que nada quede sin escribir al terminar el proceso
+atexit.register(vaciar_pendientes)
@@ -2,120 +2,555 @@
 Módulo para la gestión de archivos JSON
 Maneja la carga y guardado de datos
 """
+import hashlib
 import json
 import os
 import shutil
+import threading
+from collections.abc import Mapping
 from datetime import datetime
 import logging
 
+from modulos import busqueda_productos
+from modulos import almacen_sqlite
+from modulos import binario
+from modulos import bloqueo
+from modulos import cache_archivos
+from modulos import diario
+from modulos import escritor
+from modulos import indice_fechas
+from modulos import indice_pedidos
+from modulos import indice_productos
+from modulos import lector_json
+from modulos import modelos
+from modulos import particiones
+from modulos import recuperacion
+from modulos import registro
+from modulos import respaldos
+from modulos import secuencias
+from modulos import tabla_productos
+from modulos import validacion
+from modulos import ventas_agregadas
+
 # Obtener la ruta base del proyecto
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATOS_DIR = os.path.join(BASE_DIR, "datos")
 BACKUP_DIR = os.path.join(BASE_DIR, "backups")
 LOGS_DIR = os.path.join(BASE_DIR, "logs")
 
+# Rutas de los archivos de datos
+RUTA_DATOS = os.path.join(DATOS_DIR, "datos_panaderia.json")
+PEDIDOS_DIR = os.path.join(DATOS_DIR, "pedidos")
+# Cada pedido incluye sus líneas en "detalles"; el archivo de detalles solo existe en
+# instalaciones anteriores (se integra en pedidos.json) y en las instantáneas del diario
+RUTA_PEDIDOS = os.path.join(PEDIDOS_DIR, "pedidos.json")
+RUTA_DETALLES = os.path.join(PEDIDOS_DIR, "detalles_pedidos.json")
+PARTICIONES_DIR = os.path.join(PEDIDOS_DIR, "particiones")
+RUTA_DIARIO = os.path.join(DATOS_DIR, "diario.jsonl")
+
+# Archivo de bloqueo compartido por todas las terminales que usan el mismo directorio de datos
+RUTA_BLOQUEO = os.path.join(DATOS_DIR, ".bloqueo")
+
+# Hash y versión de esquema del último archivo de datos escrito por el sistema
+RUTA_SELLO = os.path.join(DATOS_DIR, "datos_panaderia.sello.json")
+
+# Instantáneas binarias de carga rápida, junto a sus JSON
+RUTA_DATOS_BINARIO = os.path.join(DATOS_DIR, "datos_panaderia.bin")
+RUTA_PEDIDOS_BINARIO = os.path.join(PEDIDOS_DIR, "pedidos.bin")
+
+# Registro de recuperación del motor JSON y copia de su último punto de control
+RUTA_RECUPERACION = os.path.join(DATOS_DIR, "recuperacion.jsonl")
+PUNTOS_DIR = os.path.join(DATOS_DIR, "recuperacion")
+
+# Último número entregado de cada prefijo de código (PED, PAN, PT, PS...)
+RUTA_SECUENCIAS = os.path.join(DATOS_DIR, "secuencias.json")
+
+# Totales de ventas por día y por producto, mantenidos al guardar cada pedido
+RUTA_VENTAS = os.path.join(DATOS_DIR, "ventas_agregadas.json")
+
+# Clave de las escrituras agrupadas de las particiones de pedidos
+CLAVE_PARTICION_PEDIDOS = os.path.join(PARTICIONES_DIR, "pedidos")
+RUTA_SQLITE = os.path.join(DATOS_DIR, "panaderia.db")
+
 # Configurar logging
 def setup_logging():
-    """Configura el sistema de logging"""
-    os.makedirs(LOGS_DIR, exist_ok=True)
-    log_file = os.path.join(LOGS_DIR, f"panaderia_{datetime.now().strftime('%Y%m%d')}.log")
-    
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file, encoding='utf-8'),
-            logging.StreamHandler()
-        ]
-    )
+    """Configura el sistema de logging (en cola, con rotación por tamaño)"""
+    registro.iniciar(LOGS_DIR)
     return logging.getLogger(__name__)
 
 logger = setup_logging()
 
+# Configuración del sistema (se lee una sola vez por proceso)
+_config = None
+
+# Registros del diario aún no integrados en las instantáneas
+_registros_pendientes = None
+
+# Firma (mtime, tamaño) de cada archivo tal como lo leyó o escribió este proceso
+_firmas = {}
+
+# La verificación del registro de recuperación se hace una vez por proceso
+_recuperacion_verificada = False
+
+# Pedidos cargados por los motores diario y SQLite, con la generación del almacenamiento
+# en que se leyeron: mientras otra terminal no escriba se devuelve la misma lista
+_pedidos_cargados = None
+_generacion_pedidos = None
+
+# Generación en que se cargaron los productos con los motores diario y SQLite, para recargarlos
+# cuando otra terminal guarde
+_generacion_productos = None
+
+# Cambios de ventas (aporte anterior, aporte nuevo) de pedidos guardados cuya escritura aún no se hizo;
+# un None pide recalcular las ventas agregadas. Se aplican en la misma sección que escribe los pedidos
+_ventas_pendientes = []
+_candado_ventas = threading.Lock()
+
+def establecer_configuracion(config):
+    """Aplica la configuración del sistema a la capa de almacenamiento"""
+    global _config
+    _config = config
+    escritor.configurar(config["almacenamiento"].get("intervalo_escritura", 0.5), RUTA_BLOQUEO)
+    registro.configurar(config.get("registro", {}))
+    inventario = config.get("inventario", {})
+    respaldos.configurar_compresion(inventario.get("compresion_respaldos", "gzip"),
+                                    inventario.get("nivel_compresion", 6))
+
+def obtener_configuracion():
+    """Devuelve la configuración del sistema, cargándola si aún no se estableció"""
+    if _config is None:
+        from modulos.configuracion import cargar_configuracion
+        establecer_configuracion(cargar_configuracion())
+    return _config
+
+def umbrales_stock():
+    """Stock mínimo y stock crítico configurados para las alertas de inventario"""
+    inventario = obtener_configuracion().get("inventario", {})
+    return inventario.get("stock_minimo", 5), inventario.get("stock_critico", 2)
+
+def obtener_config_almacenamiento():
+    """Devuelve la sección de almacenamiento de la configuración"""
+    return obtener_configuracion()["almacenamiento"]
+
+def usa_diario():
+    """Indica si el almacenamiento trabaja en modo diario de cambios"""
+    return obtener_config_almacenamiento().get("motor") == "diario"
+
+def usa_sqlite():
+    """Indica si el almacenamiento usa la base de datos SQLite"""
+    return obtener_config_almacenamiento().get("motor") == "sqlite"
+
+def _abrir_sqlite():
+    """Abre la base de datos SQLite, importando los JSON la primera vez"""
+    if almacen_sqlite.abierta(RUTA_SQLITE):
+        return RUTA_SQLITE
+    # Una terminal que arranca a la vez espera a que la base quede creada e importada
+    with bloqueo.exclusivo(RUTA_BLOQUEO):
+        if not os.path.exists(RUTA_SQLITE) and os.path.exists(RUTA_DATOS):
+            logger.info("Base de datos SQLite nueva: importando los archivos JSON existentes")
+            # Se importa en un archivo aparte que luego se renombra: la base solo aparece completa,
+            # aunque la importación se interrumpa
+            temporal = RUTA_SQLITE + ".importando"
+            for ruta in (temporal, temporal + "-wal", temporal + "-shm"):
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+            cabeceras, bloques = _leer_pedidos_separados()
+            almacen_sqlite.importar_json(
+                temporal,
+                _leer_json(RUTA_DATOS, {"productos": []}),
+                {"pedidos": cabeceras},
+                {"detalles_pedidos": bloques}
+            )
+            almacen_sqlite.cerrar(temporal)
+            os.replace(temporal, RUTA_SQLITE)
+        almacen_sqlite.conectar(RUTA_SQLITE)
+    return RUTA_SQLITE
+
+def usa_particiones():
+    """Indica si los pedidos se guardan particionados por mes (solo motor JSON)"""
+    config = obtener_config_almacenamiento()
+    return config.get("motor", "json") == "json" and config.get("particionar_pedidos", False)
+
+def _preparar_particiones():
+    """Crea las particiones la primera vez y confirma las escrituras pendientes antes de leer"""
+    escritor.confirmar_pendiente(CLAVE_PARTICION_PEDIDOS)
+    if particiones.existe(PARTICIONES_DIR):
+        return
+    cabeceras, bloques = _leer_pedidos_separados()
+    particiones.migrar(PARTICIONES_DIR, {"pedidos": cabeceras}, {"detalles_pedidos": bloques})
+    
+    # Los archivos originales se conservan renombrados para no leerlos por error
+    for ruta in (RUTA_PEDIDOS, RUTA_DETALLES):
+        if os.path.exists(ruta):
+            os.replace(ruta, ruta + ".migrado")
+
+def usa_escritura_agrupada():
+    """Indica si las escrituras completas se agrupan en el escritor en segundo plano"""
+    return obtener_config_almacenamiento().get("escritura_agrupada", False)
+
+def _escribir_json(ruta_archivo, datos):
+    """Escribe un archivo JSON completo de forma atómica y devuelve los bytes escritos"""
+    contenido = escritor.escribir_json_atomico(ruta_archivo, datos)
+    # Lo recién escrito queda en caché para la próxima lectura
+    cache_archivos.recordar(ruta_archivo, datos)
+    return contenido
+
+def usa_instantanea_binaria():
+    """Indica si se mantiene una instantánea binaria junto a los JSON principales"""
+    return obtener_config_almacenamiento().get("instantanea_binaria", False)
+
+def _escribir_binario(ruta_binaria, ruta_origen, datos, clave):
+    """Actualiza la instantánea binaria; un fallo solo hace que la próxima carga use el JSON"""
+    if not usa_instantanea_binaria():
+        return
+    try:
+        binario.escribir(ruta_binaria, ruta_origen, datos, clave)
+    except Exception as e:
+        logger.warning(f"No se pudo escribir la instantánea binaria {ruta_binaria}: {e}")
+
+def _escribir_o_programar(ruta_archivo, escritura):
+    """Ejecuta la escritura ahora o la deja al escritor en segundo plano"""
+    if usa_escritura_agrupada():
+        escritor.programar(ruta_archivo, escritura)
+    else:
+        escritura()
+
+def _leer_json(ruta_archivo, por_defecto):
+    """Lee un archivo JSON o devuelve la estructura por defecto si no existe"""
+    # Una escritura agrupada pendiente debe llegar al disco antes de leer
+    escritor.confirmar_pendiente(ruta_archivo)
+    try:
+        with open(ruta_archivo, "r", encoding="utf-8") as archivo:
+            return json.load(archivo)
+    except FileNotFoundError:
+        return por_defecto
+
+def _unir_detalles(pedidos, bloques):
+    """Devuelve los pedidos con sus líneas incorporadas a partir de los bloques de detalles"""
+    lineas = {bloque["codigo_pedido"]: bloque["detalles"] for bloque in bloques}
+    return [dict(pedido, detalles=lineas.get(pedido["codigo_pedido"], pedido.get("detalles", [])))
+            for pedido in pedidos]
+
+def _separar_detalles(pedidos):
+    """Divide los pedidos en cabeceras y bloques de detalles, para los motores que los guardan aparte"""
+    cabeceras = []
+    bloques = []
+    for pedido in pedidos:
+        cabeceras.append({campo: valor for campo, valor in pedido.items() if campo != "detalles"})
+        bloques.append({"codigo_pedido": pedido["codigo_pedido"], "detalles": pedido.get("detalles", [])})
+    return cabeceras, bloques
+
+def _leer_pedidos_separados():
+    """Lee del disco los pedidos como cabeceras y bloques de detalles, en cualquiera de los dos formatos"""
+    cabeceras = _leer_json(RUTA_PEDIDOS, {"pedidos": []})["pedidos"]
+    bloques = _leer_json(RUTA_DETALLES, {"detalles_pedidos": []})["detalles_pedidos"]
+    if any("detalles" in pedido for pedido in cabeceras):
+        # pedidos.json en formato unificado: sus líneas completan las del archivo de detalles
+        cabeceras, embebidos = _separar_detalles(cabeceras)
+        presentes = {bloque["codigo_pedido"] for bloque in bloques}
+        bloques += [bloque for bloque in embebidos if bloque["codigo_pedido"] not in presentes]
+    return cabeceras, bloques
+
+def _migrar_pedidos_unificados():
+    """Integra una sola vez detalles_pedidos.json en pedidos.json (motor JSON)"""
+    if not os.path.exists(RUTA_DETALLES):
+        return
+    escritor.confirmar_pendiente(RUTA_PEDIDOS)
+    with bloqueo.exclusivo(RUTA_BLOQUEO):
+        # Otra terminal pudo hacer la migración mientras esperábamos el bloqueo
+        if not os.path.exists(RUTA_DETALLES):
+            return
+        cabeceras, bloques = _leer_pedidos_separados()
+        codigos = {pedido["codigo_pedido"] for pedido in cabeceras}
+        huerfanos = sum(1 for bloque in bloques if bloque["codigo_pedido"] not in codigos)
+        if huerfanos:
+            logger.warning(f"{huerfanos} bloques de detalles sin pedido quedan solo en "
+                           f"{os.path.basename(RUTA_DETALLES)}.migrado")
+        
+        datos = {"pedidos": _unir_detalles(cabeceras, bloques)}
+        _escribir_json(RUTA_PEDIDOS, datos)
+        _sincronizado(RUTA_PEDIDOS, "pedidos", datos["pedidos"])
+        # El archivo original se conserva renombrado para no leerlo por error
+        os.replace(RUTA_DETALLES, RUTA_DETALLES + ".migrado")
+        cache_archivos.olvidar(RUTA_DETALLES)
+        # pedidos.json se escribió fuera del registro de recuperación
+        _crear_punto_de_control(forzar=True)
+        logger.info(f"Pedidos migrados al formato unificado ({len(datos['pedidos'])} pedidos)")
+
+def _firma(ruta_archivo):
+    """Fecha de modificación y tamaño de un archivo, o None si no existe"""
+    try:
+        estado = os.stat(ruta_archivo)
+    except FileNotFoundError:
+        return None
+    return (estado.st_mtime_ns, estado.st_size)
+
+def _sincronizado(ruta_archivo, coleccion, registros):
+    """Registra que la colección en memoria coincide con el archivo en disco"""
+    diario.fijar_base(coleccion, registros)
+    _firmas[ruta_archivo] = _firma(ruta_archivo)
+
+def _fusionar_si_cambio(ruta_archivo, coleccion, datos, clave_json):
+    """Si otra terminal escribió el archivo desde nuestra última lectura, integra sus cambios a los nuestros
+    y devuelve esos cambios (None si no hizo falta)"""
+    if _firmas.get(ruta_archivo) == _firma(ruta_archivo):
+        return None
+    try:
+        with open(ruta_archivo, "r", encoding="utf-8") as archivo:
+            en_disco = json.load(archivo)[clave_json]
+    except FileNotFoundError:
+        return None
+    
+    cambios = diario.fusionar(coleccion, en_disco, datos[clave_json])
+    # Se actualiza la misma lista para que quien la tiene en memoria vea el estado fusionado
+    datos[clave_json][:] = en_disco
+    if coleccion == "productos":
+        modelos.convertir_productos(datos[clave_json])
+        tabla_productos.invalidar()
+        indice_productos.invalidar()
+        busqueda_productos.invalidar()
+    else:
+        modelos.convertir_pedidos(datos[clave_json])
+        indice_pedidos.invalidar()
+        indice_fechas.invalidar()
+    logger.info(f"Cambios de otra terminal integrados en {os.path.basename(ruta_archivo)}")
+    return cambios
+
+def _escribir_coleccion(ruta_archivo, coleccion, datos, clave_json):
+    """Escribe un archivo completo bajo bloqueo exclusivo, sin pisar los cambios de otras terminales"""
+    with bloqueo.exclusivo(RUTA_BLOQUEO):
+        cambios = _fusionar_si_cambio(ruta_archivo, coleccion, datos, clave_json)
+        if cambios is None:
+            cambios = diario.detectar_cambios(coleccion, *diario.por_revisar(coleccion, datos[clave_json]))
+        
+        # Los cambios quedan anotados antes de reescribir el archivo, por si la escritura se interrumpe
+        recuperacion.anotar(RUTA_RECUPERACION, cambios)
+        contenido = _escribir_json(ruta_archivo, datos)
+        # La referencia del diario ya quedó al día con los cambios detectados
+        _firmas[ruta_archivo] = _firma(ruta_archivo)
+        if cambios:
+            recuperacion.confirmar(RUTA_RECUPERACION, coleccion)
+        _crear_punto_de_control()
+    return contenido
+
+def _archivos_recuperables():
+    """Archivos del motor JSON protegidos por el registro de recuperación: colección -> (ruta, clave)"""
+    return {"productos": (RUTA_DATOS, "productos"), "pedidos": (RUTA_PEDIDOS, "pedidos")}
+
+def _crear_punto_de_control(forzar=False):
+    """Copia los archivos al punto de control cuando el registro de recuperación alcanza su tamaño máximo"""
+    tamano_maximo = obtener_config_almacenamiento().get("registro_recuperacion_kb", 1024) * 1024
+    if forzar or recuperacion.requiere_punto(RUTA_RECUPERACION, PUNTOS_DIR, tamano_maximo):
+        with bloqueo.exclusivo(RUTA_BLOQUEO):
+            recuperacion.punto_de_control(RUTA_RECUPERACION, PUNTOS_DIR,
+                                          {c: ruta for c, (ruta, _) in _archivos_recuperables().items()})
+
+def _recuperar(coleccion):
+    """Reconstruye un archivo del motor JSON dañado o con una escritura sin confirmar"""
+    ruta_archivo, clave_json = _archivos_recuperables()[coleccion]
+    with bloqueo.exclusivo(RUTA_BLOQUEO):
+        datos = recuperacion.reconstruir(RUTA_RECUPERACION, PUNTOS_DIR, coleccion, ruta_archivo, clave_json)
+        if datos is None:
+            return None
+        # Sin sello nuevo: la próxima carga valida lo reconstruido
+        _escribir_json(ruta_archivo, datos)
+        _sincronizado(ruta_archivo, coleccion, datos[clave_json])
+        recuperacion.confirmar(RUTA_RECUPERACION, coleccion)
+    return datos
+
+def _verificar_recuperacion():
+    """Al primer acceso del proceso, recorta la cola dañada del registro y completa las escrituras interrumpidas"""
+    global _recuperacion_verificada
+    if _recuperacion_verificada:
+        return
+    _recuperacion_verificada = True
+    if not os.path.exists(RUTA_RECUPERACION):
+        return
+    with bloqueo.exclusivo(RUTA_BLOQUEO):
+        diario.reparar_cola(RUTA_RECUPERACION)
+        for coleccion in sorted(recuperacion.sin_confirmar(RUTA_RECUPERACION)):
+            _recuperar(coleccion)
+
+def _apartar_danado(ruta_archivo):
+    """Conserva con otro nombre un archivo que no se pudo recuperar, para que la estructura nueva no lo pise"""
+    if not os.path.exists(ruta_archivo):
+        return None
+    destino = f"{ruta_archivo}.danado-{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    os.replace(ruta_archivo, destino)
+    cache_archivos.olvidar(ruta_archivo)
+    logger.error(f"{os.path.basename(ruta_archivo)} no se pudo recuperar; se conserva como "
+                 f"{os.path.basename(destino)}")
+    return destino
+
+def registrar_en_diario(coleccion, registros, eliminados=None):
+    """Anexa al diario los cambios de los registros (y de las claves eliminadas, si se indican) y compacta
+    si corresponde"""
+    global _registros_pendientes, _generacion_pedidos, _generacion_productos
+    with bloqueo.exclusivo(RUTA_BLOQUEO):
+        # Lo que anexa (o compacta) este proceso no desactualiza los datos que ya tiene en memoria
+        al_dia = _generacion_pedidos is not None and _generacion_pedidos == _generacion()
+        productos_al_dia = (_generacion_productos is not None and
+                            _generacion_productos == _generacion("productos"))
+        if _registros_pendientes is None:
+            # Los registros nuevos no deben quedar detrás de una línea dañada por un corte
+            diario.reparar_cola(RUTA_DIARIO)
+            _registros_pendientes = diario.contar_registros(RUTA_DIARIO)
+        # El stock se anota como diferencia: se suma al de las ventas de otras terminales
+        cambios = diario.detectar_cambios(coleccion, registros, eliminados, diferencias=True)
+        _registros_pendientes += diario.anexar(RUTA_DIARIO, cambios)
+
+        if _registros_pendientes >= obtener_config_almacenamiento().get("compactar_cada", 500):
+            compactar_diario()
+        if al_dia:
+            _generacion_pedidos = _generacion()
+        if productos_al_dia:
+            _generacion_productos = _generacion("productos")
+
+def compactar_diario():
+    """Integra el diario en las instantáneas JSON y lo vacía"""
+    global _registros_pendientes
+    cambios = diario.leer(RUTA_DIARIO)
+    if not cambios:
+        _registros_pendientes = 0
+        return
+
+    datos = _leer_json(RUTA_DATOS, {"productos": [], "pedidos": []})
+    cabeceras, bloques = _leer_pedidos_separados()
+    datos_pedidos = {"pedidos": cabeceras}
+    datos_detalles = {"detalles_pedidos": bloques}
+
+    diario.aplicar("productos", datos["productos"], cambios)
+    diario.aplicar("pedidos", cabeceras, cambios)
+    diario.aplicar("detalles", bloques, cambios)
+
+    # Las diferencias de stock no se pueden reproducir dos veces: antes de escribir las instantáneas
+    # el diario pasa a valores completos, así una compactación interrumpida no suma dos veces una venta
+    completos = diario.valores_completos(cambios, datos["productos"])
+    if completos is not None:
+        diario.reescribir(RUTA_DIARIO, completos)
+
+    _escribir_json(RUTA_DATOS, datos)
+    _escribir_json(RUTA_PEDIDOS, datos_pedidos)
+    _escribir_json(RUTA_DETALLES, datos_detalles)
+
+    # Reproducir el diario es idempotente, así que vaciarlo al final es seguro
+    diario.vaciar(RUTA_DIARIO)
+    _registros_pendientes = 0
+    # Las instantáneas se escribieron fuera del registro de recuperación del motor JSON
+    recuperacion.descartar(RUTA_RECUPERACION, PUNTOS_DIR)
+    # Las instantáneas solo cambian aquí, así que el respaldo se hace en la compactación
+    respaldos.programar_respaldo(_respaldar_y_limpiar)
+    logger.info(f"Diario compactado: {len(cambios)} registros integrados")
+
 def crear_respaldo():
-    """Crea un respaldo automático de los datos"""
+    """Crea un respaldo incremental de los datos"""
     try:
-        os.makedirs(BACKUP_DIR, exist_ok=True)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if not os.path.exists(DATOS_DIR):
+            return True
         
-        # Respaldar archivo principal
-        if os.path.exists(os.path.join(DATOS_DIR, "datos_panaderia.json")):
-            backup_file = os.path.join(BACKUP_DIR, f"datos_panaderia_{timestamp}.json")
-            shutil.copy2(os.path.join(DATOS_DIR, "datos_panaderia.json"), backup_file)
+        if usa_sqlite():
+            # El archivo de la base de datos solo es copiable tras volcar el WAL
+            almacen_sqlite.punto_de_control(RUTA_SQLITE)
         
-        # Respaldar pedidos
-        pedidos_dir = os.path.join(DATOS_DIR, "pedidos")
-        if os.path.exists(pedidos_dir):
-            backup_pedidos_dir = os.path.join(BACKUP_DIR, f"pedidos_{timestamp}")
-            shutil.copytree(pedidos_dir, backup_pedidos_dir)
+        # Solo se guardan los fragmentos que no estaban ya en el almacén
+        manifiesto = respaldos.crear_instantanea(DATOS_DIR, BACKUP_DIR)
         
-        logger.info(f"Respaldo creado exitosamente: {timestamp}")
+        logger.info(f"Respaldo creado exitosamente: {manifiesto['id']}")
         return True
     except Exception as e:
         logger.error(f"Error al crear respaldo: {e}")
         return False
 
-def limpiar_respaldos_antiguos(dias_retener=30):
+def _respaldar_y_limpiar():
+    """Respaldo automático tras un guardado, seguido de la limpieza de respaldos vencidos"""
+    crear_respaldo()
+    limpiar_respaldos_antiguos()
+
+def limpiar_respaldos_antiguos(dias_retener=None):
     """Limpia respaldos más antiguos que el número de días especificado"""
     try:
         if not os.path.exists(BACKUP_DIR):
             return
         
+        if dias_retener is None:
+            dias_retener = obtener_configuracion()["inventario"].get("dias_retener_respaldos", 30)
+        
         fecha_limite = datetime.now().timestamp() - (dias_retener * 24 * 3600)
         
-        for archivo in os.listdir(BACKUP_DIR):
-            ruta_archivo = os.path.join(BACKUP_DIR, archivo)
-            if os.path.getctime(ruta_archivo) < fecha_limite:
-                if os.path.isfile(ruta_archivo):
-                    os.remove(ruta_archivo)
-                elif os.path.isdir(ruta_archivo):
-                    shutil.rmtree(ruta_archivo)
-                logger.info(f"Respaldo eliminado: {archivo}")
+        # El catálogo ordenado evita recorrer el directorio en cada guardado
+        respaldos.podar(BACKUP_DIR, fecha_limite)
     except Exception as e:
         logger.error(f"Error al limpiar respaldos: {e}")
 
+def _columnas_validas(tipos):
+    """Indica si los tipos de columna de una instantánea binaria ya garantizan datos válidos"""
+    return (all(campo in tipos for campo in validacion.CAMPOS_REQUERIDOS)
+            and tipos["cantidad_en_stock"] == "entero"
+            and tipos["precio_venta"] in ("entero", "decimal"))
+
+def _escribir_sello(contenido):
+    """Registra el hash del archivo de datos recién escrito y la versión del esquema"""
+    sello = {
+        "sha256": hashlib.sha256(contenido).hexdigest(),
+        "esquema": validacion.VERSION_ESQUEMA
+    }
+    escritor.escribir_json_atomico(RUTA_SELLO, sello)
+
+def _sello_coincide(contenido):
+    """Indica si el archivo no cambió desde la última escritura del sistema"""
+    try:
+        with open(RUTA_SELLO, "r", encoding="utf-8") as archivo:
+            sello = json.load(archivo)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return False
+    return (sello.get("esquema") == validacion.VERSION_ESQUEMA and
+            sello.get("sha256") == hashlib.sha256(contenido).hexdigest())
+
 def validar_datos(datos):
     """Valida la estructura y contenido de los datos"""
-    errores = []
-    
-    if not isinstance(datos, dict):
-        errores.append("Los datos deben ser un diccionario")
-        return errores
-    
-    if "productos" not in datos:
-        errores.append("Falta la clave 'productos' en los datos")
-    else:
-        for i, producto in enumerate(datos["productos"]):
-            campos_requeridos = ["codigo_producto", "nombre", "categoria", "descripcion", 
-                               "proveedor", "cantidad_en_stock", "precio_venta", "precio_proveedor"]
-            
-            for campo in campos_requeridos:
-                if campo not in producto:
-                    errores.append(f"Producto {i+1}: Falta el campo '{campo}'")
-            
-            # Validar tipos de datos
-            if "cantidad_en_stock" in producto and not isinstance(producto["cantidad_en_stock"], int):
-                errores.append(f"Producto {i+1}: cantidad_en_stock debe ser un número entero")
-            
-            if "precio_venta" in producto and not isinstance(producto["precio_venta"], (int, float)):
-                errores.append(f"Producto {i+1}: precio_venta debe ser un número")
-    
-    return errores
+    return validacion.mensajes(validacion.validar(datos))
 
 def cargar_datos():
     """Carga los datos desde el archivo JSON"""
+    global _generacion_productos
     try:
-        ruta_archivo = os.path.join(DATOS_DIR, "datos_panaderia.json")
-        with open(ruta_archivo, "r", encoding="utf-8") as archivo:
-            datos = json.load(archivo)
+        # La generación se toma antes de leer: una escritura durante la lectura obliga a recargar
+        generacion = _generacion("productos") if usa_diario() or usa_sqlite() else None
+        if usa_diario():
+            # La instantánea puede no existir todavía si todo está en el diario
+            datos = _leer_json(RUTA_DATOS, {"productos": [], "pedidos": []})
+            diario.aplicar("productos", datos.get("productos", []), diario.leer(RUTA_DIARIO))
+            if not datos.get("productos") and not os.path.exists(RUTA_DATOS):
+                raise FileNotFoundError(RUTA_DATOS)
+        elif usa_sqlite():
+            datos = almacen_sqlite.cargar_productos(_abrir_sqlite())
+            # Los datos de ejemplo solo se crean sin base ni archivos JSON: una base vacía con
+            # los JSON presentes quedó vacía a propósito
+            if not datos["productos"] and len(datos) == 1 and not os.path.exists(RUTA_DATOS):
+                raise FileNotFoundError(RUTA_SQLITE)
+        else:
+            datos, valido = _leer_datos_json()
+            if valido:
+                modelos.convertir_productos(datos["productos"])
+                return datos
             
         # Validar datos
-        errores = validar_datos(datos)
+        resultado = validacion.validar(datos)
+        errores = validacion.mensajes(resultado)
         if errores:
-            logger.warning(f"Errores de validación encontrados: {errores}")
+            logger.warning(f"Errores de validación encontrados ({len(errores)} en "
+                           f"{resultado['productos']} productos): {errores}")
             # Intentar reparar datos corruptos
             datos = reparar_datos(datos)
+        elif not (usa_diario() or usa_sqlite()):
+            # El próximo arranque podrá saltarse la lectura del JSON
+            _escribir_binario(RUTA_DATOS_BINARIO, RUTA_DATOS, datos, "productos")
         
+        if usa_diario() or usa_sqlite():
+            diario.fijar_base("productos", datos["productos"])
+            _generacion_productos = generacion
+        
+        modelos.convertir_productos(datos["productos"])
         logger.info("Datos cargados exitosamente")
         return datos
     except FileNotFoundError:
@@ -123,15 +558,83 @@ def cargar_datos():
         return crear_estructura_inicial()
     except json.JSONDecodeError as e:
         logger.error(f"Error al decodificar JSON: {e}")
+        if usa_sqlite():
+            # Los datos de ejemplo se mezclarían con los de la base de datos
+            raise
+        if not usa_diario():
+            _apartar_danado(RUTA_DATOS)
         return crear_estructura_inicial()
     except Exception as e:
         logger.error(f"Error inesperado al cargar datos: {e}")
+        if usa_sqlite():
+            raise
+        if not usa_diario():
+            _apartar_danado(RUTA_DATOS)
         return crear_estructura_inicial()
 
+def _leer_datos_json():
+    """Lee el archivo principal del motor JSON; devuelve los datos y si ya se sabe que son válidos"""
+    # La escritura pendiente se confirma antes de bloquear: el escritor necesita el bloqueo exclusivo
+    escritor.confirmar_pendiente(RUTA_DATOS)
+    _verificar_recuperacion()
+    with bloqueo.compartido(RUTA_BLOQUEO):
+        instantanea = binario.leer(RUTA_DATOS_BINARIO, RUTA_DATOS) if usa_instantanea_binaria() else None
+        if instantanea is not None and _columnas_validas(instantanea[1]):
+            # Cada producto tiene los campos requeridos con su tipo: no hace falta validar
+            logger.info("Datos cargados desde la instantánea binaria")
+            datos, valido = instantanea[0], True
+        else:
+            with open(RUTA_DATOS, "rb") as archivo:
+                contenido = archivo.read()
+            try:
+                datos = json.loads(contenido)
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                datos, error = None, e
+            else:
+                # Si el archivo es exactamente el que escribimos, ya era válido
+                valido = _sello_coincide(contenido)
+                if valido:
+                    logger.info("Datos cargados exitosamente (sello verificado)")
+                    _escribir_binario(RUTA_DATOS_BINARIO, RUTA_DATOS, datos, "productos")
+        if datos is not None:
+            _sincronizado(RUTA_DATOS, "productos", datos["productos"])
+            return datos, valido
+    
+    # Archivo truncado o dañado: se reconstruye (con bloqueo exclusivo, ya sin el compartido)
+    # en vez de reemplazarlo por datos de ejemplo
+    datos = _recuperar("productos")
+    if datos is None:
+        raise error
+    return datos, False
+
+def recargar_si_cambio(datos):
+    """Actualiza en memoria los productos si otra terminal guardó cambios desde nuestra última lectura"""
+    if usa_diario() or usa_sqlite():
+        if _generacion_productos is None or _generacion_productos == _generacion("productos"):
+            return False
+    elif escritor.hay_pendiente(RUTA_DATOS):
+        return False
+    elif _firmas.get(RUTA_DATOS) == _firma(RUTA_DATOS) or not os.path.exists(RUTA_DATOS):
+        return False
+    
+    datos.update(cargar_datos())
+    tabla_productos.invalidar()
+    indice_productos.invalidar()
+    busqueda_productos.invalidar()
+    logger.info("Productos recargados: otra terminal guardó cambios")
+    return True
+
+def reservar_codigo(prefijo, registros, campo, anteriores=()):
+    """Reserva el siguiente código del prefijo ("PED-004"), único aunque varias terminales creen a la vez;
+    la numeración continúa también desde los códigos con los prefijos anteriores"""
+    numero = secuencias.reservar(RUTA_SECUENCIAS, RUTA_BLOQUEO, prefijo,
+                                 lambda: (registro[campo] for registro in registros), anteriores)
+    return f"{prefijo}-{numero:03d}"
+
 def reparar_datos(datos):
     """Intenta reparar datos corruptos o incompletos"""
     try:
-        if not isinstance(datos, dict):
+        if not isinstance(datos, Mapping):
             datos = {}
         
         if "productos" not in datos:
@@ -140,7 +643,7 @@ def reparar_datos(datos):
         # Reparar productos individuales
         productos_reparados = []
         for producto in datos["productos"]:
-            if isinstance(producto, dict):
+            if isinstance(producto, Mapping):
                 producto_reparado = {
                     "codigo_producto": producto.get("codigo_producto", "DESCONOCIDO"),
                     "nombre": producto.get("nombre", "Producto sin nombre"),
@@ -160,27 +663,51 @@ def reparar_datos(datos):
         logger.error(f"Error al reparar datos: {e}")
         return crear_estructura_inicial()
 
-def guardar_datos(datos):
-    """Guarda los datos en el archivo JSON"""
+def _marcar(coleccion, modificados, eliminados):
+    """Anota qué registros cambiaron para que el guardado compare solo esos (todos si no se indican)"""
+    if modificados is None:
+        diario.marcar_todos(coleccion)
+    else:
+        diario.marcar(coleccion, modificados, eliminados)
+
+def guardar_datos(datos, modificados=None, eliminados=()):
+    """Guarda los datos en el archivo JSON; modificados (agregados o cambiados) y eliminados
+    indican qué productos cambiaron, y sin ellos se revisa la lista completa"""
     try:
-        # Crear respaldo antes de guardar
-        crear_respaldo()
-        
-        # Aseguramos que existe el directorio
-        os.makedirs(DATOS_DIR, exist_ok=True)
-        
-        ruta_archivo = os.path.join(DATOS_DIR, "datos_panaderia.json")
-        with open(ruta_archivo, "w", encoding="utf-8") as archivo:
-            json.dump(datos, archivo, indent=4, ensure_ascii=False)
+        _marcar("productos", modificados, eliminados)
+        if usa_diario():
+            # Solo se anexan los productos modificados desde la última escritura
+            registrar_en_diario("productos", *diario.por_revisar("productos", datos["productos"]))
+            logger.info("Cambios registrados en el diario")
+            return
         
-        # Limpiar respaldos antiguos
-        limpiar_respaldos_antiguos()
+        if usa_sqlite():
+            # Una transacción con solo las filas modificadas
+            # El stock se suma como diferencia al guardado, dentro de la transacción
+            cambios = diario.detectar_cambios("productos", *diario.por_revisar("productos", datos["productos"]),
+                                              diferencias=True)
+            almacen_sqlite.aplicar_cambios(_abrir_sqlite(), "productos", cambios)
+            almacen_sqlite.guardar_extras(RUTA_SQLITE, datos)
+            logger.info("Datos guardados exitosamente")
+            return
         
-        logger.info("Datos guardados exitosamente")
+        # Varios guardados seguidos se confirman como una sola escritura
+        _escribir_o_programar(RUTA_DATOS, lambda: _escribir_archivo_datos(datos))
     except Exception as e:
         logger.error(f"Error al guardar datos: {e}")
         raise
 
+def _escribir_archivo_datos(datos):
+    """Reescribe el archivo principal de datos y encola su respaldo"""
+    with bloqueo.exclusivo(RUTA_BLOQUEO):
+        _escribir_sello(_escribir_coleccion(RUTA_DATOS, "productos", datos, "productos"))
+        _escribir_binario(RUTA_DATOS_BINARIO, RUTA_DATOS, datos, "productos")
+    
+    # El respaldo (y la limpieza de los antiguos) se hace en segundo plano, ya con los datos en disco
+    respaldos.programar_respaldo(_respaldar_y_limpiar)
+    
+    logger.info("Datos guardados exitosamente")
+
 def crear_estructura_inicial():
     """Crea la estructura inicial de datos"""
     datos = {
@@ -208,51 +735,272 @@ def crear_estructura_inicial():
         ],
         "pedidos": []
     }
+    modelos.convertir_productos(datos["productos"])
     guardar_datos(datos)
     return datos
 
 def cargar_pedidos():
-    """Carga los pedidos desde el archivo JSON"""
+    """Carga los pedidos, cada uno con sus líneas en la lista 'detalles'"""
     try:
-        ruta_pedidos = os.path.join(DATOS_DIR, "pedidos")
-        os.makedirs(ruta_pedidos, exist_ok=True)
+        if usa_diario() or usa_sqlite():
+            return _pedidos_vigentes()
         
-        ruta_archivo = os.path.join(ruta_pedidos, "pedidos.json")
-        with open(ruta_archivo, "r", encoding="utf-8") as archivo:
-            return json.load(archivo)
+        if usa_particiones():
+            _preparar_particiones()
+            cabeceras = particiones.cargar(PARTICIONES_DIR, "pedidos")
+            bloques = particiones.cargar(PARTICIONES_DIR, "detalles")
+            return {"pedidos": modelos.convertir_pedidos(_unir_detalles(cabeceras, bloques))}
+        
+        os.makedirs(PEDIDOS_DIR, exist_ok=True)
+        _migrar_pedidos_unificados()
+        _verificar_recuperacion()
+        return _leer_archivo_pedidos(RUTA_PEDIDOS, RUTA_PEDIDOS_BINARIO, "pedidos", "pedidos")
     except FileNotFoundError:
         datos = {"pedidos": []}
         guardar_pedidos(datos)
         return datos
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        logger.error(f"Error al decodificar los pedidos: {e}")
+        _apartar_danado(RUTA_PEDIDOS)
+        datos = {"pedidos": []}
+        guardar_pedidos(datos)
+        return datos
+
+def _generacion(coleccion="pedidos"):
+    """Estado de los pedidos (o productos) guardados en los motores diario y SQLite; cambia cuando otra
+    terminal escribe"""
+    if usa_sqlite():
+        return almacen_sqlite.version_datos(_abrir_sqlite())
+    if coleccion == "productos":
+        return (_firma(RUTA_DATOS), _firma(RUTA_DIARIO))
+    return tuple(_firma(ruta) for ruta in (RUTA_PEDIDOS, RUTA_DETALLES, RUTA_DIARIO))
+
+def _pedidos_vigentes():
+    """Pedidos de los motores diario y SQLite, releídos solo si otra terminal los cambió"""
+    global _pedidos_cargados, _generacion_pedidos
+    # La generación se toma antes de leer: una escritura durante la lectura obliga a releer
+    generacion = _generacion()
+    if _pedidos_cargados is not None and generacion == _generacion_pedidos:
+        return _pedidos_cargados
+    
+    if usa_diario():
+        cabeceras, bloques = _leer_pedidos_separados()
+        cambios = diario.leer(RUTA_DIARIO)
+        diario.aplicar("pedidos", cabeceras, cambios)
+        diario.aplicar("detalles", bloques, cambios)
+        diario.fijar_base("pedidos", cabeceras)
+        diario.fijar_base("detalles", bloques)
+        datos = {"pedidos": modelos.convertir_pedidos(_unir_detalles(cabeceras, bloques))}
+    else:
+        datos = almacen_sqlite.cargar_pedidos(_abrir_sqlite())
+        _fijar_base_separada(datos["pedidos"])
+        modelos.convertir_pedidos(datos["pedidos"])
+    
+    # Los índices de la lista anterior se reconstruyen al consultar la nueva
+    _pedidos_cargados, _generacion_pedidos = datos, generacion
+    return datos
+
+def _fijar_base_separada(pedidos):
+    """Fija el estado de referencia de cabeceras y detalles a partir de los pedidos unificados"""
+    cabeceras, bloques = _separar_detalles(pedidos)
+    diario.fijar_base("pedidos", cabeceras)
+    diario.fijar_base("detalles", bloques)
 
 def cargar_detalles_pedidos():
-    """Carga los detalles de pedidos desde el archivo JSON"""
-    try:
-        ruta_pedidos = os.path.join(DATOS_DIR, "pedidos")
-        os.makedirs(ruta_pedidos, exist_ok=True)
+    """Compatibilidad: los detalles agrupados por pedido, tomados de los pedidos unificados"""
+    # Las listas de líneas son las mismas de los pedidos: modificarlas modifica el pedido
+    return {"detalles_pedidos": [{"codigo_pedido": pedido["codigo_pedido"],
+                                  "detalles": pedido.setdefault("detalles", [])}
+                                 for pedido in cargar_pedidos()["pedidos"]]}
+
+def _leer_archivo_pedidos(ruta_archivo, ruta_binaria, coleccion, clave_json):
+    """Lee un archivo de pedidos del motor JSON (caché o instantánea binaria) bajo bloqueo compartido"""
+    escritor.confirmar_pendiente(ruta_archivo)
+    with bloqueo.compartido(RUTA_BLOQUEO):
+        datos = cache_archivos.vigente(ruta_archivo)
+        if datos is not None:
+            return datos
         
-        ruta_archivo = os.path.join(ruta_pedidos, "detalles_pedidos.json")
-        with open(ruta_archivo, "r", encoding="utf-8") as archivo:
-            return json.load(archivo)
-    except FileNotFoundError:
-        datos = {"detalles_pedidos": []}
-        guardar_detalles_pedidos(datos)
-        return datos
+        instantanea = None
+        if ruta_binaria and usa_instantanea_binaria():
+            instantanea = binario.leer(ruta_binaria, ruta_archivo)
+        if instantanea is not None:
+            datos = instantanea[0]
+            cache_archivos.recordar(ruta_archivo, datos)
+        else:
+            try:
+                datos = cache_archivos.leer_json(ruta_archivo)
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                datos, error = None, e
+        if datos is not None:
+            _sincronizado(ruta_archivo, coleccion, datos[clave_json])
+            # La conversión se hace sobre el objeto en caché: las próximas lecturas ya reciben modelos
+            modelos.convertir_pedidos(datos[clave_json])
+            return datos
+    
+    # La reconstrucción toma el bloqueo exclusivo, así que se hace ya sin el compartido
+    datos = _recuperar(coleccion)
+    if datos is None:
+        raise error
+    modelos.convertir_pedidos(datos[clave_json])
+    return datos
+
+def _iterar_particiones(meses=None):
+    """Recorre los pedidos particionados uniendo a cada uno las líneas de su mismo mes"""
+    if meses is None:
+        meses = sorted(particiones.cargar_manifiesto(PARTICIONES_DIR)["particiones"])
+    for mes in meses:
+        lineas = {bloque["codigo_pedido"]: bloque["detalles"]
+                  for bloque in particiones.iterar(PARTICIONES_DIR, "detalles", [mes])}
+        for pedido in particiones.iterar(PARTICIONES_DIR, "pedidos", [mes]):
+            yield dict(pedido, detalles=lineas.get(pedido["codigo_pedido"], []))
+
+def iterar_pedidos():
+    """Recorre los pedidos (con sus líneas) uno a uno sin cargar todo el archivo en memoria"""
+    if usa_diario():
+        # El estado real requiere reproducir el diario sobre la instantánea
+        yield from cargar_pedidos()["pedidos"]
+    elif usa_sqlite():
+        yield from almacen_sqlite.iterar_pedidos(_abrir_sqlite())
+    elif usa_particiones():
+        _preparar_particiones()
+        yield from _iterar_particiones()
+    else:
+        _migrar_pedidos_unificados()
+        escritor.confirmar_pendiente(RUTA_PEDIDOS)
+        en_cache = cache_archivos.vigente(RUTA_PEDIDOS)
+        if en_cache is not None:
+            yield from en_cache["pedidos"]
+        elif os.path.exists(RUTA_PEDIDOS):
+            yield from lector_json.iterar_elementos(RUTA_PEDIDOS, "pedidos")
+
+def iterar_detalles_pedidos():
+    """Compatibilidad: recorre los bloques de detalles de pedido uno a uno"""
+    for pedido in iterar_pedidos():
+        yield {"codigo_pedido": pedido["codigo_pedido"], "detalles": pedido.get("detalles", [])}
+
+def iterar_pedidos_periodo(fecha_inicio, fecha_fin):
+    """Recorre los pedidos cuya fecha está en el rango usando su marca de tiempo guardada"""
+    desde, hasta = indice_fechas.limites(fecha_inicio, fecha_fin)
+    if usa_particiones():
+        # Solo se abren los meses del rango
+        _preparar_particiones()
+        meses = particiones.meses_en_rango(particiones.cargar_manifiesto(PARTICIONES_DIR),
+                                           fecha_inicio, fecha_fin)
+        for pedido in _iterar_particiones(meses):
+            if desde <= indice_fechas.marca_tiempo(pedido) <= hasta:
+                yield pedido
+    elif usa_sqlite():
+        yield from almacen_sqlite.iterar_pedidos(_abrir_sqlite(), desde, hasta)
+    else:
+        # Dos bisecciones sobre el índice ordenado por fecha
+        yield from indice_fechas.en_rango(cargar_pedidos()["pedidos"], fecha_inicio, fecha_fin)
+
+def _escribir_pedidos(escritura):
+    """Ejecuta una escritura de pedidos y, en la misma sección exclusiva, les aplica a las ventas agregadas
+    los cambios pendientes"""
+    global _ventas_pendientes
+    with bloqueo.exclusivo(RUTA_BLOQUEO):
+        with _candado_ventas:
+            cambios, _ventas_pendientes = _ventas_pendientes, []
+        # Marcados como pendientes antes de escribir: si la escritura se interrumpe, se recalculan
+        agregados = ventas_agregadas.iniciar_cambio(RUTA_VENTAS) if cambios else None
+        escritura()
+        if agregados is not None and None not in cambios:
+            ventas_agregadas.completar_cambio(RUTA_VENTAS, agregados, cambios)
+
+def _confirmar_pedidos_pendientes():
+    """Confirma la escritura agrupada de pedidos pendiente, junto con sus cambios de ventas"""
+    escritor.confirmar_pendiente(CLAVE_PARTICION_PEDIDOS if usa_particiones() else RUTA_PEDIDOS)
+
+def cargar_ventas_agregadas():
+    """Totales de ventas guardados (calculados desde los pedidos la primera vez)"""
+    _confirmar_pedidos_pendientes()
+    return ventas_agregadas.obtener(RUTA_VENTAS, RUTA_BLOQUEO, iterar_pedidos)
+
+def verificar_ventas_agregadas():
+    """Compara las ventas agregadas guardadas con las calculadas desde los pedidos y devuelve las diferencias"""
+    _confirmar_pedidos_pendientes()
+    with bloqueo.compartido(RUTA_BLOQUEO):
+        guardados = ventas_agregadas.leer(RUTA_VENTAS)
+    return ventas_agregadas.diferencias(guardados, ventas_agregadas.calcular(iterar_pedidos()))
+
+def reconstruir_ventas_agregadas():
+    """Recalcula las ventas agregadas desde los pedidos"""
+    return ventas_agregadas.reconstruir(RUTA_VENTAS, RUTA_BLOQUEO, iterar_pedidos)
 
-def guardar_pedidos(datos):
-    """Guarda los pedidos en el archivo JSON"""
-    ruta_pedidos = os.path.join(DATOS_DIR, "pedidos")
-    os.makedirs(ruta_pedidos, exist_ok=True)
+def _guardar_particiones(pedidos):
+    """Escribe las particiones modificadas (cabeceras y detalles) bajo bloqueo exclusivo"""
+    cabeceras, bloques = _separar_detalles(pedidos)
     
-    ruta_archivo = os.path.join(ruta_pedidos, "pedidos.json")
-    with open(ruta_archivo, "w", encoding="utf-8") as archivo:
-        json.dump(datos, archivo, indent=4, ensure_ascii=False)
+    def escritura():
+        # Los detalles se ubican en el mes de su pedido, que debe conocerse antes de guardarlos
+        particiones.registrar_meses(cabeceras)
+        particiones.guardar(PARTICIONES_DIR, "pedidos", cabeceras)
+        particiones.guardar(PARTICIONES_DIR, "detalles", bloques)
+    _escribir_pedidos(escritura)
 
-def guardar_detalles_pedidos(datos):
-    """Guarda los detalles de pedidos en el archivo JSON"""
-    ruta_pedidos = os.path.join(DATOS_DIR, "pedidos")
-    os.makedirs(ruta_pedidos, exist_ok=True)
+def _registrar_pedidos(cabeceras, bloques, codigos_eliminados):
+    """Registra en el diario o en SQLite los cambios de cabeceras y líneas de los pedidos"""
+    if usa_diario():
+        registrar_en_diario("pedidos", cabeceras, codigos_eliminados)
+        registrar_en_diario("detalles", bloques, codigos_eliminados)
+    else:
+        # Cabeceras y líneas del pedido en una sola transacción
+        almacen_sqlite.aplicar_cambios_pedidos(
+            _abrir_sqlite(),
+            diario.detectar_cambios("pedidos", cabeceras, codigos_eliminados),
+            diario.detectar_cambios("detalles", bloques, codigos_eliminados))
+
+def guardar_pedidos(datos, modificados=None, eliminados=(), ventas=()):
+    """Guarda los pedidos junto con sus líneas; modificados (agregados o cambiados) y eliminados
+    indican qué pedidos cambiaron, y sin ellos se revisa la lista completa. ventas son los cambios
+    (aporte anterior, aporte nuevo) que el guardado hace en las ventas agregadas; sin modificados
+    se recalculan"""
+    with _candado_ventas:
+        _ventas_pendientes.extend(ventas if modificados is not None else [None])
+    # La fecha se convierte a marca de tiempo una sola vez, al guardar el pedido, y los
+    # índices de búsqueda se actualizan con los pedidos que cambiaron
+    if modificados is None:
+        indice_fechas.completar_marcas(datos["pedidos"])
+        indice_pedidos.sincronizar(datos["pedidos"])
+        indice_fechas.sincronizar(datos["pedidos"])
+    else:
+        indice_fechas.completar_marcas(modificados)
+        indice_pedidos.actualizar(datos["pedidos"], modificados, eliminados)
+        indice_fechas.actualizar(datos["pedidos"], modificados, eliminados)
+    
+    if usa_particiones():
+        _preparar_particiones()
+        _escribir_o_programar(CLAVE_PARTICION_PEDIDOS, lambda: _guardar_particiones(datos["pedidos"]))
+        return
     
-    ruta_archivo = os.path.join(ruta_pedidos, "detalles_pedidos.json")
-    with open(ruta_archivo, "w", encoding="utf-8") as archivo:
-        json.dump(datos, archivo, indent=4, ensure_ascii=False) 
\ No newline at end of file
+    # Las particiones comparan cada mes con su última versión escrita; los demás motores
+    # comparan con su versión anterior solo los pedidos marcados
+    if usa_diario() or usa_sqlite():
+        _marcar("pedidos", modificados, eliminados)
+        # Solo los pedidos que cambiaron se separan en cabecera y bloque de líneas
+        revisar, codigos_eliminados = diario.por_revisar("pedidos", datos["pedidos"])
+        cabeceras, bloques = _separar_detalles(revisar)
+        _escribir_pedidos(lambda: _registrar_pedidos(cabeceras, bloques, codigos_eliminados))
+        return
+    
+    # La migración fija la referencia del diario: las marcas se anotan después
+    _migrar_pedidos_unificados()
+    _marcar("pedidos", modificados, eliminados)
+    _escribir_o_programar(RUTA_PEDIDOS, lambda: _escribir_archivo_pedidos(datos))
+
+def _escribir_archivo_pedidos(datos):
+    """Reescribe el archivo de pedidos y su instantánea binaria"""
+    def escritura():
+        _escribir_coleccion(RUTA_PEDIDOS, "pedidos", datos, "pedidos")
+        _escribir_binario(RUTA_PEDIDOS_BINARIO, RUTA_PEDIDOS, datos, "pedidos")
+    _escribir_pedidos(escritura)
+
+def guardar_detalles_pedidos(datos):
+    """Compatibilidad: incorpora los bloques de detalles a sus pedidos y guarda los pedidos"""
+    datos_pedidos = cargar_pedidos()
+    lineas = {bloque["codigo_pedido"]: bloque["detalles"] for bloque in datos["detalles_pedidos"]}
+    for pedido in datos_pedidos["pedidos"]:
+        pedido["detalles"] = lineas.get(pedido["codigo_pedido"], [])
+    guardar_pedidos(datos_pedidos)
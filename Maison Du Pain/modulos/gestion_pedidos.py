@@ -5,7 +5,13 @@ Maneja operaciones CRUD para pedidos de la panadería
 from rich.console import Console
 from rich.table import Table
 from datetime import datetime
-from modulos.gestion_archivos import cargar_pedidos, cargar_detalles_pedidos, guardar_pedidos, guardar_detalles_pedidos, cargar_datos, guardar_datos
+from modulos.gestion_archivos import (cargar_pedidos, guardar_pedidos, cargar_datos, guardar_datos, reservar_codigo)
+from modulos import indice_fechas
+from modulos import indice_pedidos
+from modulos import indice_productos
+from modulos.modelos import LineaPedido, Pedido
+from modulos import tabla_productos
+from modulos import ventas_agregadas
 
 # Instancia de consola para la visualización
 console = Console()
@@ -23,16 +29,8 @@ def mostrar_menu_pedidos():
 
 def generar_codigo_pedido(datos):
     """Genera un código único para el pedido"""
-    # Buscamos el último número usado
-    ultimo_numero = 0
-    for pedido in datos["pedidos"]:
-        numero = int(pedido["codigo_pedido"].split("-")[1])
-        if numero > ultimo_numero:
-            ultimo_numero = numero
-    
-    # Generamos el nuevo código
-    nuevo_numero = ultimo_numero + 1
-    return f"PED-{nuevo_numero:03d}"
+    # El número sale de la secuencia guardada, sin recorrer los pedidos
+    return reservar_codigo("PED", datos["pedidos"], "codigo_pedido")
 
 def crear_pedido(datos_productos):
     """Crea un nuevo pedido"""
@@ -40,25 +38,23 @@ def crear_pedido(datos_productos):
     
     # Cargamos los datos actuales
     datos_pedidos = cargar_pedidos()
-    datos_detalles = cargar_detalles_pedidos()
     
     # Pedimos los datos del cliente
     codigo_cliente = input("Código del cliente: ")
     
-    # Creamos el pedido
-    pedido = {
-        "codigo_pedido": generar_codigo_pedido(datos_pedidos),
-        "codigo_cliente": codigo_cliente,
-        "fecha_pedido": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "estado": "pendiente",
-        "total": 0.0
-    }
-    
-    # Creamos los detalles del pedido
-    detalles_pedido = {
-        "codigo_pedido": pedido["codigo_pedido"],
-        "detalles": []
-    }
+    # Creamos el pedido (la fecha también como marca de tiempo para los reportes por período)
+    ahora = datetime.now().replace(microsecond=0)
+    pedido = Pedido(
+        codigo_pedido=generar_codigo_pedido(datos_pedidos),
+        codigo_cliente=codigo_cliente,
+        fecha_pedido=ahora.strftime("%Y-%m-%d %H:%M:%S"),
+        marca_tiempo=indice_fechas.marca_de(ahora),
+        estado="pendiente",
+        total=0.0,
+        detalles=[]
+    )
+    # Productos cuyo stock cambia con el pedido: solo esos se comparan al guardar
+    productos_modificados = []
     
     # Agregamos productos al pedido
     while True:
@@ -84,11 +80,7 @@ def crear_pedido(datos_productos):
             break
         
         # Buscamos el producto
-        producto_encontrado = None
-        for producto in datos_productos["productos"]:
-            if producto["codigo_producto"].lower() == codigo_producto.lower():
-                producto_encontrado = producto
-                break
+        producto_encontrado = indice_productos.buscar_sin_mayusculas(datos_productos["productos"], codigo_producto)
         
         if not producto_encontrado:
             console.print("\n[bold red]❌ Producto no encontrado. Por favor, use uno de los códigos mostrados en la tabla.[/bold red]")
@@ -104,36 +96,35 @@ def crear_pedido(datos_productos):
         subtotal = cantidad * producto_encontrado["precio_venta"]
         
         # Creamos el detalle
-        detalle = {
-            "numero_linea": len(detalles_pedido["detalles"]) + 1,
-            "codigo_producto": producto_encontrado["codigo_producto"],
-            "cantidad": cantidad,
-            "precio_unidad": producto_encontrado["precio_venta"],
-            "subtotal": subtotal
-        }
+        detalle = LineaPedido(
+            numero_linea=len(pedido.detalles) + 1,
+            codigo_producto=producto_encontrado["codigo_producto"],
+            cantidad=cantidad,
+            precio_unidad=producto_encontrado["precio_venta"],
+            subtotal=subtotal
+        )
         
         # Actualizamos el stock
         producto_encontrado["cantidad_en_stock"] -= cantidad
+        tabla_productos.actualizar(datos_productos["productos"], producto_encontrado)
+        productos_modificados.append(producto_encontrado)
         
         # Agregamos el detalle al pedido
-        detalles_pedido["detalles"].append(detalle)
-        pedido["total"] += subtotal
+        pedido.detalles.append(detalle)
+        pedido.total += subtotal
     
-    # Agregamos el pedido y sus detalles a las listas
+    # Agregamos el pedido (con sus detalles) a la lista
     datos_pedidos["pedidos"].append(pedido)
-    datos_detalles["detalles_pedidos"].append(detalles_pedido)
     
     # Guardamos los cambios
-    guardar_pedidos(datos_pedidos)
-    guardar_detalles_pedidos(datos_detalles)
-    guardar_datos(datos_productos)  # Guardamos también los cambios en el stock
+    guardar_pedidos(datos_pedidos, [pedido], ventas=[(None, ventas_agregadas.aporte(pedido))])
+    guardar_datos(datos_productos, productos_modificados)  # Guardamos también los cambios en el stock
     
     console.print("\n[bold green]✅ Pedido creado exitosamente![/bold green]")
 
 def listar_pedidos():
     """Muestra todos los pedidos en una tabla"""
     datos_pedidos = cargar_pedidos()
-    datos_detalles = cargar_detalles_pedidos()
     
     if not datos_pedidos["pedidos"]:
         console.print("\n[bold yellow]⚠ No hay pedidos registrados[/bold yellow]")
@@ -163,39 +154,38 @@ def listar_pedidos():
     # Preguntamos si quiere ver los detalles
     if input("\n¿Desea ver los detalles de algún pedido? (s/n): ").lower() == 's':
         codigo = input("Ingrese el código del pedido: ")
-        mostrar_detalles_pedido(codigo, datos_detalles)
+        mostrar_detalles_pedido(codigo, datos_pedidos)
 
-def mostrar_detalles_pedido(codigo_pedido, datos_detalles):
+def mostrar_detalles_pedido(codigo_pedido, datos_pedidos):
     """Muestra los detalles de un pedido específico"""
-    for detalle_pedido in datos_detalles["detalles_pedidos"]:
-        if detalle_pedido["codigo_pedido"] == codigo_pedido:
-            # Creamos la tabla de detalles
-            tabla = Table(title=f"Detalles del Pedido {codigo_pedido}")
-            tabla.add_column("Línea", justify="center")
-            tabla.add_column("Producto", style="cyan", justify="center")
-            tabla.add_column("Cantidad", justify="center")
-            tabla.add_column("Precio Unit.", justify="center")
-            tabla.add_column("Subtotal", justify="center")
-            
-            # Agregamos los detalles a la tabla
-            for detalle in detalle_pedido["detalles"]:
-                tabla.add_row(
-                    str(detalle["numero_linea"]),
-                    detalle["codigo_producto"],
-                    str(detalle["cantidad"]),
-                    f"${detalle['precio_unidad']:.2f}",
-                    f"${detalle['subtotal']:.2f}"
-                )
-            
-            console.print(tabla)
-            return
+    pedido = indice_pedidos.buscar(datos_pedidos["pedidos"], codigo_pedido)
+    if pedido is None:
+        console.print("\n[bold red]❌ Pedido no encontrado[/bold red]")
+        return
+    
+    # Creamos la tabla de detalles
+    tabla = Table(title=f"Detalles del Pedido {codigo_pedido}")
+    tabla.add_column("Línea", justify="center")
+    tabla.add_column("Producto", style="cyan", justify="center")
+    tabla.add_column("Cantidad", justify="center")
+    tabla.add_column("Precio Unit.", justify="center")
+    tabla.add_column("Subtotal", justify="center")
+    
+    # Agregamos los detalles a la tabla
+    for detalle in pedido.get("detalles", []):
+        tabla.add_row(
+            str(detalle["numero_linea"]),
+            detalle["codigo_producto"],
+            str(detalle["cantidad"]),
+            f"${detalle['precio_unidad']:.2f}",
+            f"${detalle['subtotal']:.2f}"
+        )
     
-    console.print("\n[bold red]❌ Pedido no encontrado[/bold red]")
+    console.print(tabla)
 
 def buscar_pedido():
     """Busca un pedido por código o código de cliente"""
     datos_pedidos = cargar_pedidos()
-    datos_detalles = cargar_detalles_pedidos()
     
     if not datos_pedidos["pedidos"]:
         console.print("\n[bold yellow]⚠ No hay pedidos registrados[/bold yellow]")
@@ -203,6 +193,11 @@ def buscar_pedido():
     
     busqueda = input("\nIngrese código del pedido o código del cliente: ").lower()
     
+    # El texto puede estar en cualquier posición del código o del cliente, así que se revisan todos
+    # (el índice sirve a las búsquedas por código exacto)
+    resultados = [p for p in datos_pedidos["pedidos"]
+                  if busqueda in p["codigo_pedido"].lower() or busqueda in p["codigo_cliente"].lower()]
+    
     # Creamos la tabla para mostrar resultados
     tabla = Table(title="Resultados de la Búsqueda")
     tabla.add_column("Código", style="cyan", justify="center")
@@ -211,31 +206,26 @@ def buscar_pedido():
     tabla.add_column("Estado", style="magenta", justify="center")
     tabla.add_column("Total", justify="center")
     
-    encontrados = False
-    for pedido in datos_pedidos["pedidos"]:
-        if (busqueda in pedido["codigo_pedido"].lower() or 
-            busqueda in pedido["codigo_cliente"].lower()):
-            tabla.add_row(
-                pedido["codigo_pedido"],
-                pedido["codigo_cliente"],
-                pedido["fecha_pedido"],
-                pedido["estado"],
-                f"${pedido['total']:.2f}"
-            )
-            encontrados = True
+    for pedido in resultados:
+        tabla.add_row(
+            pedido["codigo_pedido"],
+            pedido["codigo_cliente"],
+            pedido["fecha_pedido"],
+            pedido["estado"],
+            f"${pedido['total']:.2f}"
+        )
     
-    if encontrados:
+    if resultados:
         console.print(tabla)
         if input("\n¿Desea ver los detalles de algún pedido? (s/n): ").lower() == 's':
             codigo = input("Ingrese el código del pedido: ")
-            mostrar_detalles_pedido(codigo, datos_detalles)
+            mostrar_detalles_pedido(codigo, datos_pedidos)
     else:
         console.print("\n[bold yellow]⚠ No se encontraron pedidos[/bold yellow]")
 
 def editar_pedido():
     """Edita un pedido existente"""
     datos_pedidos = cargar_pedidos()
-    datos_detalles = cargar_detalles_pedidos()
     datos_productos = cargar_datos()
     
     if not datos_pedidos["pedidos"]:
@@ -245,33 +235,19 @@ def editar_pedido():
     codigo = input("\nIngrese el código del pedido a editar: ")
     
     # Buscamos el pedido
-    pedido_index = None
-    pedido_encontrado = None
-    for i, pedido in enumerate(datos_pedidos["pedidos"]):
-        if pedido["codigo_pedido"] == codigo:
-            pedido_index = i
-            pedido_encontrado = pedido
-            break
+    pedido_encontrado = indice_pedidos.buscar(datos_pedidos["pedidos"], codigo)
     
     if pedido_encontrado is None:
         console.print("\n[bold red]❌ Pedido no encontrado[/bold red]")
         return
         
-    # Buscamos los detalles del pedido
-    detalle_pedido_index = None
-    detalle_pedido = None
-    for i, detalle in enumerate(datos_detalles["detalles_pedidos"]):
-        if detalle["codigo_pedido"] == codigo:
-            detalle_pedido_index = i
-            detalle_pedido = detalle
-            break
-    
-    if detalle_pedido is None:
-        console.print("\n[bold red]❌ Detalles del pedido no encontrados[/bold red]")
-        return
+    # Las líneas viajan dentro del pedido
+    detalles = pedido_encontrado.setdefault("detalles", [])
+    # Lo que el pedido aportaba a las ventas antes de editarlo
+    aporte_anterior = ventas_agregadas.aporte(pedido_encontrado)
     
     # Mostramos los detalles actuales del pedido
-    mostrar_detalles_pedido(codigo, datos_detalles)
+    mostrar_detalles_pedido(codigo, datos_pedidos)
     
     # Menú de edición
     console.print("\n[bold cyan]=== OPCIONES DE EDICIÓN ===[/bold cyan]")
@@ -301,7 +277,7 @@ def editar_pedido():
             return
         
         # Guardamos los cambios
-        guardar_pedidos(datos_pedidos)
+        guardar_pedidos(datos_pedidos, [pedido_encontrado])
         console.print("\n[bold green]✅ Estado del pedido actualizado exitosamente![/bold green]")
     
     # 2. Agregar productos
@@ -311,17 +287,14 @@ def editar_pedido():
         mostrar_lista_productos(datos_productos)
         
         # Agregamos productos al pedido
+        productos_modificados = []
         while True:
             codigo_producto = input("\nCódigo del producto a agregar (o 'fin' para terminar): ")
             if codigo_producto.lower() == 'fin':
                 break
             
             # Buscamos el producto
-            producto_encontrado = None
-            for producto in datos_productos["productos"]:
-                if producto["codigo_producto"] == codigo_producto:
-                    producto_encontrado = producto
-                    break
+            producto_encontrado = indice_productos.buscar(datos_productos["productos"], codigo_producto)
             
             if not producto_encontrado:
                 console.print("\n[bold red]❌ Producto no encontrado[/bold red]")
@@ -342,30 +315,32 @@ def editar_pedido():
             subtotal = cantidad * producto_encontrado["precio_venta"]
             
             # Creamos el detalle
-            detalle = {
-                "numero_linea": len(detalle_pedido["detalles"]) + 1,
-                "codigo_producto": producto_encontrado["codigo_producto"],
-                "cantidad": cantidad,
-                "precio_unidad": producto_encontrado["precio_venta"],
-                "subtotal": subtotal
-            }
+            detalle = LineaPedido(
+                numero_linea=len(detalles) + 1,
+                codigo_producto=producto_encontrado["codigo_producto"],
+                cantidad=cantidad,
+                precio_unidad=producto_encontrado["precio_venta"],
+                subtotal=subtotal
+            )
             
             # Actualizamos el stock
             producto_encontrado["cantidad_en_stock"] -= cantidad
+            tabla_productos.actualizar(datos_productos["productos"], producto_encontrado)
+            productos_modificados.append(producto_encontrado)
             
             # Agregamos el detalle al pedido
-            detalle_pedido["detalles"].append(detalle)
+            detalles.append(detalle)
             pedido_encontrado["total"] += subtotal
         
         # Guardamos los cambios
-        guardar_datos(datos_productos)
-        guardar_pedidos(datos_pedidos)
-        guardar_detalles_pedidos(datos_detalles)
+        guardar_datos(datos_productos, productos_modificados)
+        guardar_pedidos(datos_pedidos, [pedido_encontrado],
+                        ventas=[(aporte_anterior, ventas_agregadas.aporte(pedido_encontrado))])
         console.print("\n[bold green]✅ Productos agregados al pedido exitosamente![/bold green]")
     
     # 3. Cambiar cantidad
     elif opcion_edicion == "3":
-        if not detalle_pedido["detalles"]:
+        if not detalles:
             console.print("\n[bold yellow]⚠ Este pedido no tiene productos[/bold yellow]")
             return
         
@@ -374,7 +349,7 @@ def editar_pedido():
         # Buscamos el detalle
         detalle_encontrado = None
         detalle_index = None
-        for i, detalle in enumerate(detalle_pedido["detalles"]):
+        for i, detalle in enumerate(detalles):
             if detalle["numero_linea"] == numero_linea:
                 detalle_encontrado = detalle
                 detalle_index = i
@@ -385,11 +360,8 @@ def editar_pedido():
             return
         
         # Buscamos el producto para verificar stock
-        producto_encontrado = None
-        for producto in datos_productos["productos"]:
-            if producto["codigo_producto"] == detalle_encontrado["codigo_producto"]:
-                producto_encontrado = producto
-                break
+        producto_encontrado = indice_productos.buscar(datos_productos["productos"],
+                                                      detalle_encontrado["codigo_producto"])
         
         if producto_encontrado is None:
             console.print("\n[bold red]❌ Producto no encontrado en inventario[/bold red]")
@@ -415,6 +387,7 @@ def editar_pedido():
         # Actualizamos el stock
         diferencia = nueva_cantidad - detalle_encontrado["cantidad"]
         producto_encontrado["cantidad_en_stock"] -= diferencia
+        tabla_productos.actualizar(datos_productos["productos"], producto_encontrado)
         
         # Actualizamos el total del pedido
         pedido_encontrado["total"] -= detalle_encontrado["subtotal"]
@@ -427,14 +400,14 @@ def editar_pedido():
         pedido_encontrado["total"] += detalle_encontrado["subtotal"]
         
         # Guardamos los cambios
-        guardar_datos(datos_productos)
-        guardar_pedidos(datos_pedidos)
-        guardar_detalles_pedidos(datos_detalles)
+        guardar_datos(datos_productos, [producto_encontrado])
+        guardar_pedidos(datos_pedidos, [pedido_encontrado],
+                        ventas=[(aporte_anterior, ventas_agregadas.aporte(pedido_encontrado))])
         console.print("\n[bold green]✅ Cantidad actualizada exitosamente![/bold green]")
     
     # 4. Eliminar producto
     elif opcion_edicion == "4":
-        if not detalle_pedido["detalles"]:
+        if not detalles:
             console.print("\n[bold yellow]⚠ Este pedido no tiene productos[/bold yellow]")
             return
         
@@ -443,7 +416,7 @@ def editar_pedido():
         # Buscamos el detalle
         detalle_encontrado = None
         detalle_index = None
-        for i, detalle in enumerate(detalle_pedido["detalles"]):
+        for i, detalle in enumerate(detalles):
             if detalle["numero_linea"] == numero_linea:
                 detalle_encontrado = detalle
                 detalle_index = i
@@ -454,26 +427,25 @@ def editar_pedido():
             return
         
         # Buscamos el producto para devolver stock
-        for producto in datos_productos["productos"]:
-            if producto["codigo_producto"] == detalle_encontrado["codigo_producto"]:
-                # Devolvemos el stock
-                producto["cantidad_en_stock"] += detalle_encontrado["cantidad"]
-                break
+        producto = indice_productos.buscar(datos_productos["productos"], detalle_encontrado["codigo_producto"])
+        if producto is not None:
+            producto["cantidad_en_stock"] += detalle_encontrado["cantidad"]
+            tabla_productos.actualizar(datos_productos["productos"], producto)
         
         # Actualizamos el total del pedido
         pedido_encontrado["total"] -= detalle_encontrado["subtotal"]
         
         # Eliminamos el detalle
-        detalle_pedido["detalles"].pop(detalle_index)
+        detalles.pop(detalle_index)
         
         # Renumeramos las líneas
-        for i, detalle in enumerate(detalle_pedido["detalles"]):
+        for i, detalle in enumerate(detalles):
             detalle["numero_linea"] = i + 1
         
         # Guardamos los cambios
-        guardar_datos(datos_productos)
-        guardar_pedidos(datos_pedidos)
-        guardar_detalles_pedidos(datos_detalles)
+        guardar_datos(datos_productos, [producto] if producto is not None else [])
+        guardar_pedidos(datos_pedidos, [pedido_encontrado],
+                        ventas=[(aporte_anterior, ventas_agregadas.aporte(pedido_encontrado))])
         console.print("\n[bold green]✅ Producto eliminado del pedido exitosamente![/bold green]")
     
     else:
@@ -482,12 +454,11 @@ def editar_pedido():
         
     # Mostramos los detalles actualizados
     console.print("\n[bold cyan]=== DETALLES ACTUALIZADOS DEL PEDIDO ===[/bold cyan]")
-    mostrar_detalles_pedido(codigo, datos_detalles)
+    mostrar_detalles_pedido(codigo, datos_pedidos)
 
 def eliminar_pedido():
     """Elimina un pedido del sistema"""
     datos_pedidos = cargar_pedidos()
-    datos_detalles = cargar_detalles_pedidos()
     
     if not datos_pedidos["pedidos"]:
         console.print("\n[bold yellow]⚠ No hay pedidos registrados[/bold yellow]")
@@ -495,26 +466,21 @@ def eliminar_pedido():
     
     codigo = input("\nIngrese el código del pedido a eliminar: ")
     
-    # Buscamos y eliminamos el pedido
-    for i, pedido in enumerate(datos_pedidos["pedidos"]):
-        if pedido["codigo_pedido"] == codigo:
-            confirmacion = input("¿Está seguro de eliminar este pedido? (s/n): ").lower()
-            if confirmacion == 's':
-                # Eliminamos el pedido
-                datos_pedidos["pedidos"].pop(i)
-                # Eliminamos los detalles
-                for j, detalle in enumerate(datos_detalles["detalles_pedidos"]):
-                    if detalle["codigo_pedido"] == codigo:
-                        datos_detalles["detalles_pedidos"].pop(j)
-                        break
-                
-                # Guardamos los cambios
-                guardar_pedidos(datos_pedidos)
-                guardar_detalles_pedidos(datos_detalles)
-                console.print("\n[bold green]✅ Pedido eliminado exitosamente![/bold green]")
-            return
+    # Buscamos el pedido
+    pedido = indice_pedidos.buscar(datos_pedidos["pedidos"], codigo)
+    if pedido is None:
+        console.print("\n[bold red]❌ Pedido no encontrado[/bold red]")
+        return
     
-    console.print("\n[bold red]❌ Pedido no encontrado[/bold red]")
+    confirmacion = input("¿Está seguro de eliminar este pedido? (s/n): ").lower()
+    if confirmacion == 's':
+        # Eliminamos el pedido junto con sus detalles (este mismo registro, no otro igual)
+        posicion = next(i for i, p in enumerate(datos_pedidos["pedidos"]) if p is pedido)
+        datos_pedidos["pedidos"].pop(posicion)
+        
+        # Guardamos los cambios
+        guardar_pedidos(datos_pedidos, [], eliminados=[pedido], ventas=[(ventas_agregadas.aporte(pedido), None)])
+        console.print("\n[bold green]✅ Pedido eliminado exitosamente![/bold green]")
 
 def gestionar_pedidos(datos_productos):
     """Gestiona el menú de pedidos"""
@@ -5,10 +5,18 @@ Maneja operaciones CRUD para productos de panadería
 from rich.console import Console
 from rich.table import Table
 from datetime import datetime
+from modulos.gestion_archivos import reservar_codigo, umbrales_stock
+from modulos import busqueda_productos
+from modulos import indice_productos
+from modulos.modelos import Producto
+from modulos import tabla_productos
 
 # Instancia de consola para la visualización
 console = Console()
 
+# Prefijos con que se escribieron los códigos de cada categoría en datos anteriores
+PREFIJOS_ANTERIORES = {"PAN": ("PN",), "PT": ("PASTEL",), "PS": ("POSTRE",)}
+
 def updateQuantityInventory(stock, quantity):
     """Actualiza la cantidad en inventario de manera segura"""
     if quantity > 0:
@@ -30,39 +38,6 @@ def mostrar_menu_productos():
 
 def generar_codigo_producto(datos):
     """Genera un código único para el producto"""
-    # Buscamos el último número usado por categoría
-    ultimos_numeros = {
-        "pan": 0,
-        "pt": 0,  # PT para pasteles
-        "ps": 0   # PS para postres
-    }
-    
-    # Mapeo de categorías completas a códigos
-    mapeo_categorias = {
-        "pan": "PAN",
-        "pastel": "PT",
-        "postre": "PS"
-    }
-    
-    for producto in datos["productos"]:
-        categoria = producto["categoria"].lower()
-        codigo_categoria = mapeo_categorias.get(categoria)
-        if codigo_categoria:
-            # Extraemos el número del código existente
-            partes = producto["codigo_producto"].split("-")
-            if len(partes) == 2:
-                try:
-                    numero = int(partes[1])
-                    categoria_corta = partes[0].lower()
-                    if categoria_corta == "pt" or categoria_corta == "pastel":
-                        ultimos_numeros["pt"] = max(ultimos_numeros["pt"], numero)
-                    elif categoria_corta == "ps" or categoria_corta == "postre":
-                        ultimos_numeros["ps"] = max(ultimos_numeros["ps"], numero)
-                    elif categoria_corta == "pan":
-                        ultimos_numeros["pan"] = max(ultimos_numeros["pan"], numero)
-                except ValueError:
-                    pass
-    
     # Pedimos la categoría
     console.print("\n[bold cyan]Categorías disponibles:[/bold cyan]")
     console.print("1. Pan")
@@ -86,10 +61,9 @@ def generar_codigo_producto(datos):
         else:
             console.print("\n[bold red]❌ Opción no válida[/bold red]")
     
-    # Generamos el nuevo código
-    categoria_corta = codigo_categoria.lower()
-    nuevo_numero = ultimos_numeros[categoria_corta] + 1
-    return f"{codigo_categoria}-{nuevo_numero:03d}"
+    # Generamos el nuevo código con la secuencia guardada de la categoría, sin recorrer los productos
+    return reservar_codigo(codigo_categoria, datos["productos"], "codigo_producto",
+                           PREFIJOS_ANTERIORES[codigo_categoria])
 
 def agregar_producto(datos):
     """Agrega un nuevo producto al sistema"""
@@ -118,19 +92,22 @@ def agregar_producto(datos):
     categoria = mapeo_categorias_inverso.get(categoria_codigo, "otro")
     
     # Creamos el producto
-    producto = {
-        "codigo_producto": codigo,
-        "nombre": nombre,
-        "categoria": categoria,
-        "descripcion": descripcion,
-        "proveedor": proveedor,
-        "cantidad_en_stock": stock,
-        "precio_venta": precio_venta,
-        "precio_proveedor": precio_proveedor
-    }
+    producto = Producto(
+        codigo_producto=codigo,
+        nombre=nombre,
+        categoria=categoria,
+        descripcion=descripcion,
+        proveedor=proveedor,
+        cantidad_en_stock=stock,
+        precio_venta=precio_venta,
+        precio_proveedor=precio_proveedor
+    )
     
     # Agregamos el producto a la lista
     datos["productos"].append(producto)
+    indice_productos.agregar(datos["productos"], producto)
+    busqueda_productos.agregar(datos["productos"], producto)
+    tabla_productos.invalidar()
     console.print("\n[bold green]✅ Producto agregado exitosamente![/bold green]")
 
 def listar_productos(datos):
@@ -172,7 +149,10 @@ def buscar_producto(datos):
         console.print("\n[bold yellow]⚠ No hay productos registrados[/bold yellow]")
         return
     
-    busqueda = input("\nIngrese código o nombre del producto: ").lower()
+    busqueda = input("\nIngrese código o nombre del producto: ")
+    
+    # El índice de trigramas devuelve las coincidencias ya ordenadas por relevancia
+    encontrados = busqueda_productos.buscar(datos["productos"], busqueda)
     
     # Creamos la tabla para mostrar resultados
     tabla = Table(title="Resultados de la Búsqueda")
@@ -183,28 +163,27 @@ def buscar_producto(datos):
     tabla.add_column("Precio Venta ($)", justify="center")
     tabla.add_column("Descripción", style="white", justify="center")
     
-    encontrados = False
-    for producto in datos["productos"]:
-        if (busqueda in producto["codigo_producto"].lower() or 
-            busqueda in producto["nombre"].lower()):
-            tabla.add_row(
-                producto["codigo_producto"],
-                producto["nombre"],
-                producto["categoria"],
-                str(producto["cantidad_en_stock"]),
-                f"{producto['precio_venta']:.2f}",
-                producto["descripcion"]
-            )
-            encontrados = True
+    for producto in encontrados:
+        tabla.add_row(
+            producto["codigo_producto"],
+            producto["nombre"],
+            producto["categoria"],
+            str(producto["cantidad_en_stock"]),
+            f"{producto['precio_venta']:.2f}",
+            producto["descripcion"]
+        )
     
     if encontrados:
         console.print(tabla)
+        if len(encontrados) == busqueda_productos.LIMITE_RESULTADOS:
+            console.print(f"[dim]Se muestran los {len(encontrados)} resultados más relevantes[/dim]")
         
-        # Verificar productos con bajo stock
-        for producto in datos["productos"]:
-            if ((busqueda in producto["codigo_producto"].lower() or 
-                busqueda in producto["nombre"].lower()) and 
-                producto["cantidad_en_stock"] < 5):
+        # Verificar productos con bajo stock entre los encontrados
+        stock_minimo, stock_critico = umbrales_stock()
+        for producto in encontrados:
+            if producto["cantidad_en_stock"] <= stock_critico:
+                console.print(f"\n[bold red]🚨 CRÍTICO: El producto {producto['nombre']} tiene stock crítico ({producto['cantidad_en_stock']} unidades)[/bold red]")
+            elif producto["cantidad_en_stock"] < stock_minimo:
                 console.print(f"\n[bold red]⚠ ALERTA: El producto {producto['nombre']} tiene stock bajo ({producto['cantidad_en_stock']} unidades)[/bold red]")
     else:
         console.print("\n[bold yellow]⚠ No se encontraron productos[/bold yellow]")
@@ -218,24 +197,26 @@ def editar_producto(datos):
     codigo = input("\nIngrese el código del producto a editar: ")
     
     # Buscamos el producto
-    for producto in datos["productos"]:
-        if producto["codigo_producto"] == codigo:
-            # Pedimos los nuevos datos
-            producto["nombre"] = input("Nuevo nombre: ")
-            producto["descripcion"] = input("Nueva descripción: ")
-            producto["proveedor"] = input("Nuevo proveedor: ")
-            
-            # Actualizamos el stock usando la nueva función
-            cantidad = int(input("Cantidad a agregar/quitar (positivo para agregar, negativo para quitar): "))
-            producto["cantidad_en_stock"] = updateQuantityInventory(producto["cantidad_en_stock"], cantidad)
-            
-            producto["precio_venta"] = float(input("Nuevo precio de venta: "))
-            producto["precio_proveedor"] = float(input("Nuevo precio del proveedor: "))
-            
-            console.print("\n[bold green]✅ Producto editado exitosamente![/bold green]")
-            return
+    producto = indice_productos.buscar(datos["productos"], codigo)
+    if producto is None:
+        console.print("\n[bold red]❌ Producto no encontrado[/bold red]")
+        return
+    
+    # Pedimos los nuevos datos
+    producto["nombre"] = input("Nuevo nombre: ")
+    producto["descripcion"] = input("Nueva descripción: ")
+    producto["proveedor"] = input("Nuevo proveedor: ")
     
-    console.print("\n[bold red]❌ Producto no encontrado[/bold red]")
+    # Actualizamos el stock usando la nueva función
+    cantidad = int(input("Cantidad a agregar/quitar (positivo para agregar, negativo para quitar): "))
+    producto["cantidad_en_stock"] = updateQuantityInventory(producto["cantidad_en_stock"], cantidad)
+    
+    producto["precio_venta"] = float(input("Nuevo precio de venta: "))
+    producto["precio_proveedor"] = float(input("Nuevo precio del proveedor: "))
+    tabla_productos.actualizar(datos["productos"], producto)
+    busqueda_productos.actualizar(datos["productos"], producto)
+    
+    console.print("\n[bold green]✅ Producto editado exitosamente![/bold green]")
 
 def eliminar_producto(datos):
     """Elimina un producto del sistema"""
@@ -248,36 +229,41 @@ def eliminar_producto(datos):
     
     codigo = input("\nIngrese el código del producto a eliminar: ")
     
-    # Buscamos y eliminamos el producto
-    for i, producto in enumerate(datos["productos"]):
-        if producto["codigo_producto"] == codigo:
-            # Mostramos los detalles del producto a eliminar
-            console.print("\n[bold red]⚠ Producto a eliminar:[/bold red]")
-            tabla = Table(title="Detalles del Producto")
-            tabla.add_column("Código", style="cyan")
-            tabla.add_column("Nombre", style="green")
-            tabla.add_column("Categoría", style="yellow")
-            tabla.add_column("Stock", justify="right")
-            tabla.add_column("Precio Venta", justify="right")
-            tabla.add_column("Precio Proveedor", justify="right")
-            
-            tabla.add_row(
-                producto["codigo_producto"],
-                producto["nombre"],
-                producto["categoria"],
-                str(producto["cantidad_en_stock"]),
-                f"${producto['precio_venta']:.2f}",
-                f"${producto['precio_proveedor']:.2f}"
-            )
-            console.print(tabla)
-            
-            confirmacion = input("\n¿Está seguro de eliminar este producto? (s/n): ").lower()
-            if confirmacion == 's':
-                datos["productos"].pop(i)
-                console.print("\n[bold green]✅ Producto eliminado exitosamente![/bold green]")
-            return
+    # Buscamos el producto
+    producto = indice_productos.buscar(datos["productos"], codigo)
+    if producto is None:
+        console.print("\n[bold red]❌ Producto no encontrado[/bold red]")
+        return
+    
+    # Mostramos los detalles del producto a eliminar
+    console.print("\n[bold red]⚠ Producto a eliminar:[/bold red]")
+    tabla = Table(title="Detalles del Producto")
+    tabla.add_column("Código", style="cyan")
+    tabla.add_column("Nombre", style="green")
+    tabla.add_column("Categoría", style="yellow")
+    tabla.add_column("Stock", justify="right")
+    tabla.add_column("Precio Venta", justify="right")
+    tabla.add_column("Precio Proveedor", justify="right")
+    
+    tabla.add_row(
+        producto["codigo_producto"],
+        producto["nombre"],
+        producto["categoria"],
+        str(producto["cantidad_en_stock"]),
+        f"${producto['precio_venta']:.2f}",
+        f"${producto['precio_proveedor']:.2f}"
+    )
+    console.print(tabla)
     
-    console.print("\n[bold red]❌ Producto no encontrado[/bold red]")
+    confirmacion = input("\n¿Está seguro de eliminar este producto? (s/n): ").lower()
+    if confirmacion == 's':
+        # Se quita este mismo diccionario, no otro igual
+        posicion = next(i for i, p in enumerate(datos["productos"]) if p is producto)
+        datos["productos"].pop(posicion)
+        indice_productos.quitar(datos["productos"], producto)
+        busqueda_productos.quitar(datos["productos"], producto)
+        tabla_productos.invalidar()
+        console.print("\n[bold green]✅ Producto eliminado exitosamente![/bold green]")
 
 def mostrar_lista_productos(datos):
     """Muestra la lista de productos sin pedir opciones"""
@@ -0,0 +1,138 @@
+"""
+Módulo del índice de pedidos por fecha
+Cada pedido guarda en "marca_tiempo" su fecha como entero (segundos), calculada
+una sola vez al guardarlo. El índice mantiene esas marcas ordenadas, así un
+período es dos bisecciones y un corte de la lista. Guardar un pedido solo
+reubica ese pedido, y el índice dura mientras la lista cargada sea la misma
+"""
+import bisect
+from datetime import datetime, timezone
+
+FORMATO_FECHA = "%Y-%m-%d %H:%M:%S"
+
+def marca_de(fecha):
+    """Segundos de una fecha sin zona horaria, contados como si fuera UTC (sin saltos de horario)"""
+    return int(fecha.replace(tzinfo=timezone.utc).timestamp())
+
+def marca_tiempo(pedido):
+    """Marca de tiempo guardada en el pedido, o calculada de su fecha si aún no la tiene"""
+    marca = pedido.get("marca_tiempo")
+    if marca is None:
+        marca = marca_de(datetime.strptime(pedido["fecha_pedido"], FORMATO_FECHA))
+    return marca
+
+def completar_marcas(pedidos):
+    """Agrega la marca de tiempo a los pedidos que no la tienen (pedidos anteriores a ella)"""
+    for pedido in pedidos:
+        if pedido.get("marca_tiempo") is None:
+            pedido["marca_tiempo"] = marca_tiempo(pedido)
+
+class _Indice:
+    """Marcas de tiempo ordenadas de una lista de pedidos con sus pedidos en paralelo"""
+
+    def __init__(self, pedidos):
+        self.pedidos = pedidos
+        # id del pedido -> (pedido, marca); guardar el pedido evita que su id se reutilice
+        self.valores = {id(p): (p, marca_tiempo(p)) for p in pedidos}
+        pares = sorted(self.valores.values(), key=lambda par: par[1])
+        self.marcas = [marca for _, marca in pares]
+        self.ordenados = [pedido for pedido, _ in pares]
+        self.tamano = len(pedidos)
+
+    def _insertar(self, pedido, marca):
+        posicion = bisect.bisect_right(self.marcas, marca)
+        self.marcas.insert(posicion, marca)
+        self.ordenados.insert(posicion, pedido)
+
+    def _quitar(self, pedido, marca):
+        posicion = bisect.bisect_left(self.marcas, marca)
+        while posicion < len(self.marcas) and self.marcas[posicion] == marca:
+            if self.ordenados[posicion] is pedido:
+                del self.marcas[posicion]
+                del self.ordenados[posicion]
+                return
+            posicion += 1
+
+    def _reubicar(self, pedido):
+        """Inserta un pedido nuevo o lo mueve si cambió su fecha (un pedido nuevo suele ir al final)"""
+        marca = marca_tiempo(pedido)
+        anterior = self.valores.get(id(pedido))
+        if anterior is not None and anterior[1] == marca:
+            return
+        if anterior is not None:
+            self._quitar(pedido, anterior[1])
+        self._insertar(pedido, marca)
+        self.valores[id(pedido)] = (pedido, marca)
+
+    def _descartar(self, pedido):
+        """Quita del índice un pedido eliminado de la lista"""
+        anterior = self.valores.pop(id(pedido), None)
+        if anterior is not None:
+            self._quitar(*anterior)
+
+    def sincronizar(self):
+        """Refleja altas, bajas y cambios de fecha recorriendo toda la lista"""
+        vistos = set()
+        for pedido in self.pedidos:
+            vistos.add(id(pedido))
+            self._reubicar(pedido)
+
+        for pedido, _ in [par for clave, par in self.valores.items() if clave not in vistos]:
+            self._descartar(pedido)
+        self.tamano = len(self.pedidos)
+
+    def actualizar(self, modificados, eliminados):
+        """Refleja solo los pedidos indicados; el resto de la lista no cambió"""
+        for pedido in eliminados:
+            self._descartar(pedido)
+        for pedido in modificados:
+            self._reubicar(pedido)
+        self.tamano = len(self.pedidos)
+
+    def vigente(self, pedidos):
+        """Indica si el índice sigue correspondiendo a la lista de pedidos"""
+        return self.pedidos is pedidos and self.tamano == len(pedidos)
+
+# Índice de la lista de pedidos en uso
+_indice = None
+
+def obtener(pedidos):
+    """Devuelve el índice de la lista de pedidos, construyéndolo si la lista cambió"""
+    global _indice
+    if _indice is None or not _indice.vigente(pedidos):
+        _indice = _Indice(pedidos)
+    return _indice
+
+def limites(fecha_inicio, fecha_fin):
+    """Primera y última marca de tiempo (enteras) comprendidas en el rango de fechas"""
+    # Las fechas de los pedidos no tienen fracciones de segundo: el inicio se redondea hacia arriba
+    desde = marca_de(fecha_inicio) + (1 if fecha_inicio.microsecond else 0)
+    return desde, marca_de(fecha_fin)
+
+def en_rango(pedidos, fecha_inicio, fecha_fin):
+    """Pedidos con fecha entre fecha_inicio y fecha_fin (ambas incluidas), en orden de fecha"""
+    indice = obtener(pedidos)
+    desde, hasta = limites(fecha_inicio, fecha_fin)
+    return indice.ordenados[bisect.bisect_left(indice.marcas, desde):bisect.bisect_right(indice.marcas, hasta)]
+
+def sincronizar(pedidos):
+    """Actualiza el índice con los cambios de la lista que se va a guardar"""
+    global _indice
+    if _indice is None or _indice.pedidos is not pedidos:
+        # Otra lista: se indexará cuando se consulte
+        _indice = None
+        return
+    _indice.sincronizar()
+
+def actualizar(pedidos, modificados, eliminados=()):
+    """Actualiza el índice con los pedidos agregados o modificados y los quitados de la lista"""
+    global _indice
+    if _indice is None or _indice.pedidos is not pedidos:
+        _indice = None
+        return
+    _indice.actualizar(modificados, eliminados)
+
+def invalidar():
+    """Descarta el índice cuando los pedidos de la lista se reemplazan"""
+    global _indice
+    _indice = None
@@ -0,0 +1,171 @@
+"""
+Módulo de índices de pedidos
+Mantiene junto a la lista de pedidos listas ordenadas por código de pedido,
+código de cliente y estado; una búsqueda exacta o por prefijo son dos
+bisecciones. guardar_pedidos actualiza solo los pedidos que cambiaron, y el
+índice dura mientras la lista de pedidos cargada siga siendo la misma
+"""
+import bisect
+
+# Campos indexados; dentro de un mismo valor los pedidos quedan en orden de fecha
+CAMPOS = ("codigo_pedido", "codigo_cliente", "estado")
+
+# Mayor que cualquier carácter: cierra el rango de un prefijo
+_FIN = "\U0010ffff"
+
+def _valores(pedido):
+    """Valores indexados del pedido (en minúsculas) y su fecha como desempate"""
+    return tuple(str(pedido.get(campo, "")).lower() for campo in CAMPOS) + (pedido.get("fecha_pedido", ""),)
+
+class _Orden:
+    """Claves ordenadas de un campo con sus pedidos en una lista paralela"""
+
+    def __init__(self, pares):
+        pares.sort(key=lambda par: par[0])
+        self.claves = [clave for clave, _ in pares]
+        self.pedidos = [pedido for _, pedido in pares]
+
+    def insertar(self, clave, pedido):
+        posicion = bisect.bisect_right(self.claves, clave)
+        self.claves.insert(posicion, clave)
+        self.pedidos.insert(posicion, pedido)
+
+    def quitar(self, clave, pedido):
+        posicion = bisect.bisect_left(self.claves, clave)
+        while posicion < len(self.claves) and self.claves[posicion] == clave:
+            if self.pedidos[posicion] is pedido:
+                del self.claves[posicion]
+                del self.pedidos[posicion]
+                return
+            posicion += 1
+
+    def rango(self, desde, hasta):
+        """Pedidos cuyas claves quedan entre desde (incluido) y hasta (excluido)"""
+        return self.pedidos[bisect.bisect_left(self.claves, (desde,)):bisect.bisect_left(self.claves, (hasta,))]
+
+class _Indice:
+    """Índices ordenados de una lista de pedidos"""
+
+    def __init__(self, pedidos):
+        self.pedidos = pedidos
+        # id del pedido -> (pedido, valores indexados); guardar el pedido evita que su id se reutilice
+        self.valores = {id(p): (p, _valores(p)) for p in pedidos}
+        self.ordenes = {campo: _Orden([(self._clave(valores, i), p) for p, valores in self.valores.values()])
+                        for i, campo in enumerate(CAMPOS)}
+        self.tamano = len(pedidos)
+
+    @staticmethod
+    def _clave(valores, posicion):
+        """Clave de un pedido en el índice del campo: valor, fecha y código"""
+        return (valores[posicion], valores[-1], valores[0])
+
+    def _insertar(self, pedido, valores, campos=CAMPOS):
+        for i, campo in enumerate(CAMPOS):
+            if campo in campos:
+                self.ordenes[campo].insertar(self._clave(valores, i), pedido)
+
+    def _quitar(self, pedido, valores, campos=CAMPOS):
+        for i, campo in enumerate(CAMPOS):
+            if campo in campos:
+                self.ordenes[campo].quitar(self._clave(valores, i), pedido)
+
+    def _reindexar(self, pedido):
+        """Inserta un pedido nuevo o lo mueve en los índices de los campos que cambiaron"""
+        valores = _valores(pedido)
+        anterior = self.valores.get(id(pedido))
+        if anterior is None:
+            self._insertar(pedido, valores)
+        elif anterior[1] == valores:
+            return
+        else:
+            # Un cambio de código o de fecha mueve al pedido en los tres índices
+            if anterior[1][0] != valores[0] or anterior[1][-1] != valores[-1]:
+                cambiados = CAMPOS
+            else:
+                cambiados = [c for i, c in enumerate(CAMPOS) if anterior[1][i] != valores[i]]
+            self._quitar(pedido, anterior[1], cambiados)
+            self._insertar(pedido, valores, cambiados)
+        self.valores[id(pedido)] = (pedido, valores)
+
+    def _descartar(self, pedido):
+        """Quita de los índices un pedido eliminado de la lista"""
+        anterior = self.valores.pop(id(pedido), None)
+        if anterior is not None:
+            self._quitar(pedido, anterior[1])
+
+    def sincronizar(self):
+        """Refleja altas, bajas y cambios de los campos indexados recorriendo toda la lista"""
+        vistos = set()
+        for pedido in self.pedidos:
+            vistos.add(id(pedido))
+            self._reindexar(pedido)
+
+        for pedido, _ in [par for clave, par in self.valores.items() if clave not in vistos]:
+            self._descartar(pedido)
+        self.tamano = len(self.pedidos)
+
+    def actualizar(self, modificados, eliminados):
+        """Refleja solo los pedidos indicados; el resto de la lista no cambió"""
+        for pedido in eliminados:
+            self._descartar(pedido)
+        for pedido in modificados:
+            self._reindexar(pedido)
+        self.tamano = len(self.pedidos)
+
+    def vigente(self, pedidos):
+        """Indica si el índice sigue correspondiendo a la lista de pedidos"""
+        return self.pedidos is pedidos and self.tamano == len(pedidos)
+
+# Índice de la lista de pedidos en uso
+_indice = None
+
+def obtener(pedidos):
+    """Devuelve el índice de la lista de pedidos, construyéndolo si la lista cambió"""
+    global _indice
+    if _indice is None or not _indice.vigente(pedidos):
+        _indice = _Indice(pedidos)
+    return _indice
+
+def _consultar(pedidos, campo, desde, hasta):
+    """Pedidos del rango que todavía cumplen la condición (un cambio sin guardar no devuelve de más)"""
+    encontrados = obtener(pedidos).ordenes[campo].rango(desde, hasta)
+    return [p for p in encontrados if desde <= str(p.get(campo, "")).lower() < hasta]
+
+def por_prefijo(pedidos, campo, prefijo):
+    """Pedidos cuyo campo empieza con el prefijo (sin distinguir mayúsculas)"""
+    prefijo = prefijo.lower()
+    return _consultar(pedidos, campo, prefijo, prefijo + _FIN)
+
+def por_valor(pedidos, campo, valor):
+    """Pedidos cuyo campo es igual al valor (sin distinguir mayúsculas), en orden de fecha"""
+    valor = valor.lower()
+    return _consultar(pedidos, campo, valor, valor + "\0")
+
+def buscar(pedidos, codigo_pedido):
+    """Devuelve el pedido con ese código o None"""
+    for pedido in por_valor(pedidos, "codigo_pedido", codigo_pedido):
+        if pedido["codigo_pedido"] == codigo_pedido:
+            return pedido
+    return None
+
+def sincronizar(pedidos):
+    """Actualiza el índice con los cambios de la lista que se va a guardar"""
+    global _indice
+    if _indice is None or _indice.pedidos is not pedidos:
+        # Otra lista: se indexará cuando se consulte
+        _indice = None
+        return
+    _indice.sincronizar()
+
+def actualizar(pedidos, modificados, eliminados=()):
+    """Actualiza el índice con los pedidos agregados o modificados y los quitados de la lista"""
+    global _indice
+    if _indice is None or _indice.pedidos is not pedidos:
+        _indice = None
+        return
+    _indice.actualizar(modificados, eliminados)
+
+def invalidar():
+    """Descarta el índice cuando los pedidos de la lista se reemplazan"""
+    global _indice
+    _indice = None
@@ -0,0 +1,74 @@
+"""
+Módulo del índice de productos por código
+Mantiene junto a la lista de productos un diccionario código -> producto, para
+que pedidos y reportes encuentren un producto sin recorrer todo el catálogo
+"""
+
+class _Indice:
+    """Índice por código (exacto y sin distinguir mayúsculas) de una lista de productos"""
+
+    def __init__(self, productos):
+        self.productos = productos
+        self.por_codigo = {}
+        self.por_codigo_minusculas = {}
+        # Códigos (en minúsculas) que aparecen más de una vez: al quitar uno hay que reconstruir
+        self.repetidos = set()
+        for producto in productos:
+            self.agregar(producto)
+        self.tamano = len(productos)
+
+    def agregar(self, producto):
+        """Registra un producto; ante códigos repetidos gana el primero, como en un recorrido"""
+        codigo = producto["codigo_producto"]
+        if codigo.lower() in self.por_codigo_minusculas:
+            self.repetidos.add(codigo.lower())
+        self.por_codigo.setdefault(codigo, producto)
+        self.por_codigo_minusculas.setdefault(codigo.lower(), producto)
+
+    def vigente(self, productos):
+        """Indica si el índice sigue correspondiendo a la lista de productos"""
+        return self.productos is productos and self.tamano == len(productos)
+
+# Índice del catálogo en uso (la aplicación trabaja con un solo catálogo)
+_indice = None
+
+def obtener(productos):
+    """Devuelve el índice de la lista de productos, reconstruyéndolo si la lista cambió"""
+    global _indice
+    if _indice is None or not _indice.vigente(productos):
+        _indice = _Indice(productos)
+    return _indice
+
+def buscar(productos, codigo):
+    """Devuelve el producto con ese código o None"""
+    return obtener(productos).por_codigo.get(codigo)
+
+def buscar_sin_mayusculas(productos, codigo):
+    """Devuelve el producto con ese código sin distinguir mayúsculas, o None"""
+    return obtener(productos).por_codigo_minusculas.get(codigo.lower())
+
+def agregar(productos, producto):
+    """Refleja en el índice un producto recién agregado al final de la lista"""
+    if _indice is None or _indice.productos is not productos or _indice.tamano != len(productos) - 1:
+        invalidar()
+        return
+    _indice.agregar(producto)
+    _indice.tamano += 1
+
+def quitar(productos, producto):
+    """Refleja en el índice un producto recién quitado de la lista"""
+    codigo = producto["codigo_producto"]
+    if (_indice is None or _indice.productos is not productos or
+            _indice.tamano != len(productos) + 1 or codigo.lower() in _indice.repetidos):
+        invalidar()
+        return
+    if _indice.por_codigo.get(codigo) is producto:
+        del _indice.por_codigo[codigo]
+    if _indice.por_codigo_minusculas.get(codigo.lower()) is producto:
+        del _indice.por_codigo_minusculas[codigo.lower()]
+    _indice.tamano -= 1
+
+def invalidar():
+    """Descarta el índice cuando los productos de la lista se reemplazan"""
+    global _indice
+    _indice = None
@@ -0,0 +1,93 @@
+"""
+Módulo de lectura incremental de JSON
+Recorre los elementos de un arreglo dentro de un archivo JSON uno a uno,
+leyendo el archivo por bloques en lugar de cargar todo el documento
+"""
+import json
+
+TAMANO_BLOQUE = 64 * 1024
+
+# Caracteres que pueden seguir a un valor completo
+DELIMITADORES = ",:]}"
+
+_decodificador = json.JSONDecoder()
+
+class _Lector:
+    """Búfer de lectura que se rellena bajo demanda"""
+
+    def __init__(self, archivo):
+        self.archivo = archivo
+        self.buffer = ""
+        self.posicion = 0
+        self.fin = False
+
+    def leer_mas(self):
+        """Agrega un bloque al búfer y descarta lo ya consumido"""
+        bloque = self.archivo.read(TAMANO_BLOQUE)
+        if not bloque:
+            self.fin = True
+            return False
+        self.buffer = self.buffer[self.posicion:] + bloque
+        self.posicion = 0
+        return True
+
+    def saltar_espacios(self, separadores=""):
+        """Avanza sobre espacios en blanco (y los separadores indicados)"""
+        while True:
+            while self.posicion < len(self.buffer) and (
+                    self.buffer[self.posicion].isspace() or self.buffer[self.posicion] in separadores):
+                self.posicion += 1
+            if self.posicion < len(self.buffer) or not self.leer_mas():
+                return
+
+    def siguiente_caracter(self):
+        """Devuelve el siguiente carácter significativo sin consumirlo"""
+        self.saltar_espacios()
+        if self.posicion >= len(self.buffer):
+            raise json.JSONDecodeError("Fin de archivo inesperado", self.buffer, self.posicion)
+        return self.buffer[self.posicion]
+
+    def consumir(self, caracter):
+        """Consume un carácter esperado"""
+        if self.siguiente_caracter() != caracter:
+            raise json.JSONDecodeError(f"Se esperaba '{caracter}'", self.buffer, self.posicion)
+        self.posicion += 1
+
+    def valor(self):
+        """Decodifica el siguiente valor JSON completo, leyendo más bloques si hace falta"""
+        self.saltar_espacios()
+        while True:
+            try:
+                valor, fin = _decodificador.raw_decode(self.buffer, self.posicion)
+                # Un número seguido de algo que no sea un delimitador podría estar cortado
+                if self.fin or (fin < len(self.buffer) and
+                                (self.buffer[fin] in DELIMITADORES or self.buffer[fin].isspace())):
+                    self.posicion = fin
+                    return valor
+            except json.JSONDecodeError:
+                if self.fin:
+                    raise
+            if not self.leer_mas():
+                continue
+
+def iterar_elementos(ruta_archivo, clave):
+    """Genera uno a uno los elementos del arreglo guardado bajo 'clave' en el objeto raíz"""
+    with open(ruta_archivo, "r", encoding="utf-8") as archivo:
+        lector = _Lector(archivo)
+        lector.consumir("{")
+
+        while lector.siguiente_caracter() != "}":
+            nombre = lector.valor()
+            lector.consumir(":")
+
+            if nombre != clave:
+                # Otras claves del objeto raíz se decodifican y se descartan
+                lector.valor()
+            else:
+                lector.consumir("[")
+                while lector.siguiente_caracter() != "]":
+                    yield lector.valor()
+                    lector.saltar_espacios(",")
+                lector.consumir("]")
+
+            lector.saltar_espacios(",")
@@ -0,0 +1,173 @@
+"""
+Módulo de modelos de registros
+Producto, Pedido y LineaPedido son dataclasses con __slots__: cada registro
+guarda solo sus valores, sin la tabla de claves propia de un diccionario. Se
+usan como diccionarios (registro["campo"], get, items...), así el resto del
+sistema los trata igual que a los registros leídos del JSON. Los campos
+categóricos guardan el texto compartido del diccionario de su campo
+
+Uso para medir la memoria por registro:
+    python -m modulos.modelos [cantidad_de_pedidos]
+"""
+from collections.abc import Mapping, MutableMapping
+from dataclasses import dataclass
+import sys
+
+from modulos import categoricos
+
+class _Registro(MutableMapping):
+    """Acceso por clave a los campos de un modelo, como en un diccionario"""
+    __slots__ = ()
+    # Campos cuyos textos se toman del diccionario compartido de modulos.categoricos
+    _CATEGORICOS = ()
+
+    def __post_init__(self):
+        for campo in self._CATEGORICOS:
+            setattr(self, campo, categoricos.canonico(campo, getattr(self, campo)))
+
+    def __getitem__(self, campo):
+        if campo in self.__slots__:
+            return getattr(self, campo)
+        raise KeyError(campo)
+
+    def __setitem__(self, campo, valor):
+        if campo not in self.__slots__:
+            raise KeyError(f"{type(self).__name__} no tiene el campo '{campo}'")
+        if campo in self._CATEGORICOS:
+            valor = categoricos.canonico(campo, valor)
+        setattr(self, campo, valor)
+
+    def __delitem__(self, campo):
+        raise TypeError(f"Los campos de {type(self).__name__} no se pueden eliminar")
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __contains__(self, campo):
+        return campo in self.__slots__
+
+    def get(self, campo, defecto=None):
+        return getattr(self, campo) if campo in self.__slots__ else defecto
+
+    def __eq__(self, otro):
+        # Igual a un diccionario (o modelo) con los mismos campos y valores, como entre diccionarios
+        if not isinstance(otro, Mapping):
+            return NotImplemented
+        return len(otro) == len(self.__slots__) and all(
+            campo in otro and getattr(self, campo) == otro[campo] for campo in self.__slots__)
+
+    __hash__ = None
+
+    def a_json(self):
+        """Diccionario con los campos del registro, para serializarlo"""
+        return {campo: getattr(self, campo) for campo in self.__slots__}
+
+@dataclass(eq=False)
+class Producto(_Registro):
+    """Producto del catálogo"""
+    __slots__ = ("codigo_producto", "nombre", "categoria", "descripcion", "proveedor",
+                 "cantidad_en_stock", "precio_venta", "precio_proveedor")
+    _CATEGORICOS = ("codigo_producto", "categoria", "proveedor")
+    codigo_producto: str
+    nombre: str
+    categoria: str
+    descripcion: str
+    proveedor: str
+    cantidad_en_stock: int
+    precio_venta: float
+    precio_proveedor: float
+
+@dataclass(eq=False)
+class LineaPedido(_Registro):
+    """Línea de un pedido"""
+    __slots__ = ("numero_linea", "codigo_producto", "cantidad", "precio_unidad", "subtotal")
+    _CATEGORICOS = ("codigo_producto",)
+    numero_linea: int
+    codigo_producto: str
+    cantidad: int
+    precio_unidad: float
+    subtotal: float
+
+@dataclass(eq=False)
+class Pedido(_Registro):
+    """Pedido con sus líneas en "detalles" """
+    __slots__ = ("codigo_pedido", "codigo_cliente", "fecha_pedido", "marca_tiempo",
+                 "estado", "total", "detalles")
+    _CATEGORICOS = ("estado",)
+    codigo_pedido: str
+    codigo_cliente: str
+    fecha_pedido: str
+    marca_tiempo: int
+    estado: str
+    total: float
+    detalles: list
+
+# Campos de cada modelo, para reconocer los registros que se pueden convertir
+_CAMPOS = {modelo: frozenset(modelo.__slots__) for modelo in (Producto, LineaPedido, Pedido)}
+
+def a_json(objeto):
+    """Función default de json.dumps: serializa los modelos como diccionarios"""
+    if isinstance(objeto, _Registro):
+        return objeto.a_json()
+    raise TypeError(f"Object of type {type(objeto).__name__} is not JSON serializable")
+
+def _convertir(modelo, registro):
+    """El registro como modelo si tiene exactamente sus campos; si no (campos extra o faltantes) queda igual"""
+    if isinstance(registro, _Registro) or registro.keys() != _CAMPOS[modelo]:
+        return registro
+    return modelo(**registro)
+
+def convertir_productos(productos):
+    """Reemplaza en la misma lista los productos leídos como diccionarios por modelos"""
+    productos[:] = [_convertir(Producto, producto) for producto in productos]
+    return productos
+
+def convertir_pedidos(pedidos):
+    """Reemplaza en la misma lista los pedidos (y sus líneas) leídos como diccionarios por modelos"""
+    for posicion, pedido in enumerate(pedidos):
+        if isinstance(pedido, _Registro):
+            continue
+        detalles = pedido.get("detalles")
+        if isinstance(detalles, list):
+            detalles[:] = [_convertir(LineaPedido, linea) for linea in detalles]
+        pedidos[posicion] = _convertir(Pedido, pedido)
+    return pedidos
+
+def _medir(construir):
+    """Bytes reservados al construir los registros (se conservan vivos hasta medir)"""
+    import tracemalloc
+    tracemalloc.start()
+    registros = construir()
+    memoria = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return memoria, len(registros)
+
+def comparar_memoria(cantidad=50000):
+    """Memoria por pedido (con 3 líneas) como diccionarios y como modelos"""
+    import json
+    pedidos = [{"codigo_pedido": f"PED-{i:06d}", "codigo_cliente": f"CLI-{i % 500:03d}",
+                "fecha_pedido": "2025-03-21 15:30:00", "marca_tiempo": 1742571000 + i,
+                "estado": "entregado", "total": 75.0,
+                "detalles": [{"numero_linea": n, "codigo_producto": f"PAN-{n:03d}", "cantidad": 2,
+                              "precio_unidad": 12.5, "subtotal": 25.0} for n in (1, 2, 3)]}
+               for i in range(cantidad)]
+    contenido = json.dumps({"pedidos": pedidos})
+    del pedidos
+    # Ambas mediciones incluyen los valores (textos y números) que comparten dicts y modelos
+    como_diccionarios = _medir(lambda: json.loads(contenido)["pedidos"])
+    como_modelos = _medir(lambda: convertir_pedidos(json.loads(contenido)["pedidos"]))
+    return {"pedidos": cantidad,
+            "diccionarios": como_diccionarios[0] / cantidad,
+            "modelos": como_modelos[0] / cantidad}
+
+if __name__ == "__main__":
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    resultado = comparar_memoria(cantidad)
+    ahorro = resultado["diccionarios"] - resultado["modelos"]
+    print(f"{resultado['pedidos']} pedidos con 3 líneas cada uno")
+    print(f"  Diccionarios: {resultado['diccionarios']:.0f} bytes por pedido")
+    print(f"  Modelos:      {resultado['modelos']:.0f} bytes por pedido")
+    print(f"  Ahorro:       {ahorro:.0f} bytes por pedido ({ahorro / resultado['diccionarios']:.0%})")
@@ -0,0 +1,164 @@
+"""
+Módulo de particiones mensuales de pedidos
+Guarda los pedidos y sus detalles en un directorio por mes de fecha_pedido,
+con un manifiesto pequeño que resume cada partición. Solo se reescriben los
+meses que cambiaron, y los reportes por período abren solo los meses del rango
+"""
+import json
+import os
+from datetime import datetime
+import logging
+
+from modulos import cache_archivos
+from modulos import diario
+from modulos import escritor
+from modulos import lector_json
+
+logger = logging.getLogger(__name__)
+
+ARCHIVOS = {
+    "pedidos": "pedidos.json",
+    "detalles": "detalles_pedidos.json"
+}
+
+CLAVES_JSON = {
+    "pedidos": "pedidos",
+    "detalles": "detalles_pedidos"
+}
+
+# Mes de cada pedido, para ubicar sus detalles en la misma partición
+mes_de_pedido = {}
+
+# Última versión escrita de cada partición: (colección, mes) -> registros
+_escritos = {}
+
+def mes_de(fecha_pedido):
+    """Devuelve la partición (AAAA-MM) de una fecha de pedido"""
+    return fecha_pedido[:7]
+
+def _ruta_manifiesto(directorio):
+    """Ruta del manifiesto de particiones"""
+    return os.path.join(directorio, "manifiesto.json")
+
+def _ruta_particion(directorio, mes, coleccion):
+    """Ruta del archivo de una colección dentro de una partición"""
+    return os.path.join(directorio, mes, ARCHIVOS[coleccion])
+
+def cargar_manifiesto(directorio):
+    """Lee el manifiesto de particiones"""
+    try:
+        with open(_ruta_manifiesto(directorio), "r", encoding="utf-8") as archivo:
+            return json.load(archivo)
+    except FileNotFoundError:
+        return {"particiones": {}}
+
+def existe(directorio):
+    """Indica si el almacenamiento particionado ya fue creado"""
+    return os.path.exists(_ruta_manifiesto(directorio))
+
+def meses_en_rango(manifiesto, fecha_inicio, fecha_fin):
+    """Devuelve los meses cuyas fechas se solapan con el rango"""
+    inicio = fecha_inicio.strftime("%Y-%m-%d %H:%M:%S")
+    fin = fecha_fin.strftime("%Y-%m-%d %H:%M:%S")
+    return sorted(mes for mes, resumen in manifiesto["particiones"].items()
+                  if resumen["desde"] <= fin and resumen["hasta"] >= inicio)
+
+def _leer_particion(directorio, mes, coleccion):
+    """Lee los registros de una colección en una partición e indica si venían de la caché"""
+    ruta = _ruta_particion(directorio, mes, coleccion)
+    en_cache = cache_archivos.vigente(ruta)
+    if en_cache is not None:
+        return en_cache[CLAVES_JSON[coleccion]], True
+    try:
+        return cache_archivos.leer_json(ruta)[CLAVES_JSON[coleccion]], False
+    except FileNotFoundError:
+        return [], False
+
+def cargar(directorio, coleccion):
+    """Carga una colección completa uniendo todas las particiones en orden"""
+    registros = []
+    for mes in sorted(cargar_manifiesto(directorio)["particiones"]):
+        particion, desde_cache = _leer_particion(directorio, mes, coleccion)
+        # Una partición en caché no cambió en disco desde la última copia registrada
+        if not desde_cache or (coleccion, mes) not in _escritos:
+            _escritos[(coleccion, mes)] = [diario.copiar_registro(r) for r in particion]
+        if coleccion == "pedidos":
+            for pedido in particion:
+                mes_de_pedido[pedido["codigo_pedido"]] = mes
+        registros.extend(particion)
+    return registros
+
+def iterar(directorio, coleccion, meses=None):
+    """Recorre los registros de las particiones indicadas (o de todas) uno a uno"""
+    if meses is None:
+        meses = sorted(cargar_manifiesto(directorio)["particiones"])
+    for mes in meses:
+        ruta = _ruta_particion(directorio, mes, coleccion)
+        en_cache = cache_archivos.vigente(ruta)
+        if en_cache is not None:
+            yield from en_cache[CLAVES_JSON[coleccion]]
+        elif os.path.exists(ruta):
+            yield from lector_json.iterar_elementos(ruta, CLAVES_JSON[coleccion])
+
+def registrar_meses(pedidos):
+    """Actualiza el mes de cada pedido antes de guardar sus detalles"""
+    for pedido in pedidos:
+        mes_de_pedido[pedido["codigo_pedido"]] = mes_de(pedido["fecha_pedido"])
+
+def _agrupar(coleccion, registros):
+    """Agrupa los registros por mes"""
+    grupos = {}
+    mes_actual = datetime.now().strftime("%Y-%m")
+    for registro in registros:
+        if coleccion == "pedidos":
+            mes = mes_de(registro["fecha_pedido"])
+        else:
+            mes = mes_de_pedido.get(registro["codigo_pedido"], mes_actual)
+        grupos.setdefault(mes, []).append(registro)
+    return grupos
+
+def guardar(directorio, coleccion, registros):
+    """Escribe solo las particiones de la colección que cambiaron"""
+    grupos = _agrupar(coleccion, registros)
+    meses = set(grupos) | {mes for (col, mes) in _escritos if col == coleccion}
+
+    manifiesto = cargar_manifiesto(directorio)
+    cambio_manifiesto = False
+    for mes in sorted(meses):
+        grupo = grupos.get(mes, [])
+        if _escritos.get((coleccion, mes)) == grupo:
+            continue
+
+        ruta = _ruta_particion(directorio, mes, coleccion)
+        escritor.escribir_json_atomico(ruta, {CLAVES_JSON[coleccion]: grupo})
+        cache_archivos.recordar(ruta, {CLAVES_JSON[coleccion]: grupo})
+        _escritos[(coleccion, mes)] = [diario.copiar_registro(r) for r in grupo]
+        logger.info(f"Partición {mes} de {coleccion} guardada ({len(grupo)} registros)")
+
+        if coleccion == "detalles" and mes not in manifiesto["particiones"]:
+            # Detalles sin pedido conocido: la partición debe figurar para volver a leerlos
+            manifiesto["particiones"][mes] = {"pedidos": 0, "desde": f"{mes}-01 00:00:00",
+                                              "hasta": f"{mes}-01 00:00:00"}
+            cambio_manifiesto = True
+
+        if coleccion == "pedidos":
+            resumen = {"pedidos": len(grupo)}
+            if grupo:
+                fechas = [p["fecha_pedido"] for p in grupo]
+                resumen["desde"] = min(fechas)
+                resumen["hasta"] = max(fechas)
+            else:
+                resumen["desde"] = resumen["hasta"] = f"{mes}-01 00:00:00"
+            if manifiesto["particiones"].get(mes) != resumen:
+                manifiesto["particiones"][mes] = resumen
+                cambio_manifiesto = True
+
+    if cambio_manifiesto or not existe(directorio):
+        escritor.escribir_json_atomico(_ruta_manifiesto(directorio), manifiesto)
+
+def migrar(directorio, datos_pedidos, datos_detalles):
+    """Reparte los archivos monolíticos de pedidos en particiones mensuales"""
+    registrar_meses(datos_pedidos["pedidos"])
+    guardar(directorio, "pedidos", datos_pedidos["pedidos"])
+    guardar(directorio, "detalles", datos_detalles["detalles_pedidos"])
+    logger.info(f"Pedidos migrados a {len(cargar_manifiesto(directorio)['particiones'])} particiones mensuales")
@@ -0,0 +1,126 @@
+"""
+Módulo de recuperación ante fallos
+Antes de reescribir un archivo del motor JSON se anotan sus cambios en un
+registro con sumas de verificación y, una vez escrito, una marca de
+confirmación. Cada cierto tamaño del registro se copia el estado en un punto de
+control y el registro vuelve a empezar, así que reconstruir un archivo dañado o
+con cambios sin confirmar cuesta como mucho reproducir ese registro
+"""
+import hashlib
+import json
+import os
+import logging
+
+from modulos import diario
+from modulos import escritor
+
+logger = logging.getLogger(__name__)
+
+CONFIRMADO = "confirmado"
+
+# Colección a la que pertenece cada tipo de registro
+COLECCION_DE_TIPO = {
+    "producto": "productos",
+    "stock": "productos",
+    "pedido": "pedidos"
+}
+
+def _ruta_manifiesto(directorio_puntos):
+    """Ruta del manifiesto del punto de control"""
+    return os.path.join(directorio_puntos, "manifiesto.json")
+
+def anotar(ruta_registro, cambios):
+    """Anota de forma durable los cambios que se van a escribir (antes de escribirlos)"""
+    return diario.anexar(ruta_registro, cambios)
+
+def confirmar(ruta_registro, coleccion):
+    """Marca como escritos los cambios anotados de una colección"""
+    # Si la marca se pierde, la recuperación solo repite cambios ya escritos
+    diario.anexar(ruta_registro, [{"tipo": CONFIRMADO, "clave": coleccion}], durable=False)
+
+def sin_confirmar(ruta_registro):
+    """Colecciones con cambios anotados cuya escritura no llegó a confirmarse"""
+    pendientes = set()
+    for registro in diario.leer(ruta_registro):
+        if registro["tipo"] == CONFIRMADO:
+            pendientes.discard(registro["clave"])
+        elif registro["tipo"] in COLECCION_DE_TIPO:
+            pendientes.add(COLECCION_DE_TIPO[registro["tipo"]])
+    return pendientes
+
+def requiere_punto(ruta_registro, directorio_puntos, tamano_maximo):
+    """Indica si corresponde un nuevo punto de control (no hay ninguno o el registro creció)"""
+    if not os.path.exists(_ruta_manifiesto(directorio_puntos)):
+        return True
+    return os.path.exists(ruta_registro) and os.path.getsize(ruta_registro) >= tamano_maximo
+
+def punto_de_control(ruta_registro, directorio_puntos, archivos):
+    """Copia los archivos (colección -> ruta) al punto de control y vacía el registro"""
+    if sin_confirmar(ruta_registro):
+        # Los archivos aún no reflejan todo lo anotado: se reconstruyen antes
+        return False
+
+    manifiesto = {}
+    for coleccion, ruta in archivos.items():
+        try:
+            with open(ruta, "rb") as archivo:
+                contenido = archivo.read()
+        except FileNotFoundError:
+            continue
+        nombre = os.path.basename(ruta)
+        escritor.escribir_atomico(os.path.join(directorio_puntos, nombre), contenido)
+        manifiesto[coleccion] = {"archivo": nombre, "sha256": hashlib.sha256(contenido).hexdigest()}
+    escritor.escribir_json_atomico(_ruta_manifiesto(directorio_puntos), manifiesto)
+
+    # Con el punto de control escrito, lo anotado antes ya no hace falta
+    diario.vaciar(ruta_registro)
+    logger.info(f"Punto de control de recuperación creado ({', '.join(manifiesto)})")
+    return True
+
+def _leer_punto(directorio_puntos, coleccion, clave_json):
+    """Lee la copia de una colección en el punto de control, verificando su hash"""
+    try:
+        with open(_ruta_manifiesto(directorio_puntos), "r", encoding="utf-8") as archivo:
+            manifiesto = json.load(archivo)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    entrada = manifiesto.get(coleccion)
+    if entrada is None:
+        # El archivo no existía en el punto de control: todo lo posterior está en el registro
+        return {clave_json: []}
+    try:
+        with open(os.path.join(directorio_puntos, entrada["archivo"]), "rb") as archivo:
+            contenido = archivo.read()
+    except FileNotFoundError:
+        return None
+    if hashlib.sha256(contenido).hexdigest() != entrada["sha256"]:
+        logger.error(f"La copia de {entrada['archivo']} en el punto de control está dañada")
+        return None
+    return json.loads(contenido)
+
+def reconstruir(ruta_registro, directorio_puntos, coleccion, ruta_archivo, clave_json):
+    """Devuelve la colección reconstruida: el archivo (o, si está dañado, el punto de control) más el registro"""
+    try:
+        with open(ruta_archivo, "r", encoding="utf-8") as archivo:
+            datos = json.load(archivo)
+        origen = os.path.basename(ruta_archivo)
+    except (FileNotFoundError, json.JSONDecodeError, UnicodeDecodeError):
+        datos = _leer_punto(directorio_puntos, coleccion, clave_json)
+        origen = "el punto de control"
+    if datos is None:
+        return None
+
+    # Los registros son valores completos, así que reproducirlos sobre cualquier estado
+    # intermedio desde el punto de control da el último estado escrito
+    cambios = [c for c in diario.leer(ruta_registro) if COLECCION_DE_TIPO.get(c["tipo"]) == coleccion]
+    diario.aplicar(coleccion, datos.setdefault(clave_json, []), cambios)
+    logger.warning(f"{os.path.basename(ruta_archivo)} reconstruido desde {origen} "
+                   f"y {len(cambios)} registros de recuperación")
+    return datos
+
+def descartar(ruta_registro, directorio_puntos):
+    """Olvida el registro y el punto de control (los archivos se escribieron por otra vía)"""
+    diario.vaciar(ruta_registro)
+    if os.path.exists(_ruta_manifiesto(directorio_puntos)):
+        os.remove(_ruta_manifiesto(directorio_puntos))
@@ -0,0 +1,120 @@
+"""
+Módulo del registro de eventos (logging)
+Los mensajes se encolan en memoria y un hilo aparte los escribe en el archivo
+de log y en la consola, así registrar nunca demora una operación. Cada proceso
+escribe su propio archivo (panaderia-<pid>.log): varias terminales no rotan el
+mismo archivo a la vez. El archivo rota por tamaño, las copias rotadas se
+comprimen con gzip y al configurar se eliminan los archivos de los procesos más
+antiguos
+"""
+import atexit
+import gzip
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import shutil
+
+FORMATO = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Valores por defecto de la sección "registro" de la configuración
+TAMANO_MAXIMO_MB = 5
+ARCHIVOS_CONSERVADOS = 10
+
+# Archivo de log de un proceso y sus copias rotadas: el grupo es el PID
+PATRON_ARCHIVO = re.compile(r"^panaderia-(\d+)\.log(\.\d+\.gz)?$")
+
+_directorio = None
+_escucha = None
+_manejador_cola = None
+_manejador_archivo = None
+_manejador_consola = None
+
+def _nombre_rotado(nombre):
+    """Nombre de una copia rotada (comprimida)"""
+    return nombre + ".gz"
+
+def _rotar(origen, destino):
+    """Comprime el archivo rotado y elimina el original"""
+    with open(origen, "rb") as entrada, gzip.open(destino, "wb") as salida:
+        shutil.copyfileobj(entrada, salida)
+    os.remove(origen)
+
+def podar(directorio, conservados):
+    """Elimina los archivos de log de los procesos más antiguos, conservando los de los más recientes"""
+    procesos = {}
+    for nombre in os.listdir(directorio):
+        coincidencia = PATRON_ARCHIVO.match(nombre)
+        if coincidencia:
+            procesos.setdefault(coincidencia.group(1), []).append(os.path.join(directorio, nombre))
+    propio = str(os.getpid())
+    antiguos = sorted((pid for pid in procesos if pid != propio),
+                      key=lambda pid: max(os.path.getmtime(ruta) for ruta in procesos[pid]), reverse=True)
+    # El proceso actual ocupa uno de los lugares conservados
+    for pid in antiguos[max(0, conservados - 1):]:
+        for ruta in procesos[pid]:
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+
+def iniciar(directorio):
+    """Instala la cola de logging en el logger raíz y arranca el hilo que la vacía"""
+    global _directorio, _escucha, _manejador_cola, _manejador_archivo, _manejador_consola
+    if _escucha is not None:
+        return
+
+    os.makedirs(directorio, exist_ok=True)
+    _directorio = directorio
+    formato = logging.Formatter(FORMATO)
+
+    _manejador_archivo = logging.handlers.RotatingFileHandler(
+        os.path.join(directorio, f"panaderia-{os.getpid()}.log"),
+        maxBytes=TAMANO_MAXIMO_MB * 1024 * 1024,
+        backupCount=ARCHIVOS_CONSERVADOS,
+        encoding="utf-8"
+    )
+    _manejador_archivo.namer = _nombre_rotado
+    _manejador_archivo.rotator = _rotar
+    _manejador_archivo.setFormatter(formato)
+
+    _manejador_consola = logging.StreamHandler()
+    _manejador_consola.setFormatter(formato)
+
+    cola = queue.SimpleQueue()
+    raiz = logging.getLogger()
+    raiz.setLevel(logging.INFO)
+    _manejador_cola = logging.handlers.QueueHandler(cola)
+    raiz.addHandler(_manejador_cola)
+
+    _escucha = logging.handlers.QueueListener(cola, _manejador_archivo, _manejador_consola,
+                                              respect_handler_level=True)
+    _escucha.start()
+    atexit.register(detener)
+
+def configurar(opciones):
+    """Aplica la sección "registro" de la configuración (niveles, rotación y archivos conservados)"""
+    try:
+        logging.getLogger().setLevel(str(opciones.get("nivel", "INFO")).upper())
+        if _manejador_consola is not None:
+            _manejador_consola.setLevel(str(opciones.get("nivel_consola", "INFO")).upper())
+    except ValueError as e:
+        logging.getLogger(__name__).warning(f"Nivel de registro no válido: {e}")
+    if _manejador_archivo is not None:
+        _manejador_archivo.maxBytes = int(opciones.get("tamano_maximo_mb", TAMANO_MAXIMO_MB) * 1024 * 1024)
+        _manejador_archivo.backupCount = opciones.get("archivos_conservados", ARCHIVOS_CONSERVADOS)
+    if _directorio is not None:
+        podar(_directorio, opciones.get("archivos_conservados", ARCHIVOS_CONSERVADOS))
+
+def detener():
+    """Escribe los mensajes pendientes y detiene el hilo del registro"""
+    global _escucha
+    if _escucha is not None:
+        _escucha.stop()
+        _escucha = None
+        # Lo que se registre después (otros cierres al salir) se escribe directamente
+        raiz = logging.getLogger()
+        raiz.removeHandler(_manejador_cola)
+        raiz.addHandler(_manejador_archivo)
+        raiz.addHandler(_manejador_consola)
@@ -11,6 +11,12 @@ from datetime import datetime, timedelta
 import json
 import os
 from collections import defaultdict, Counter
+import heapq
+
+from modulos import categoricos
+from modulos import indice_productos
+from modulos import modelos
+from modulos import tabla_productos
 
 console = Console()
 
@@ -23,31 +29,50 @@ def mostrar_menu_reportes():
     console.print("4️⃣ 💰 Análisis Financiero")
     console.print("5️⃣ 📅 Reporte por Período")
     console.print("6️⃣ 📋 Exportar Reportes")
-    console.print("7️⃣ 🔙 Volver al Menú Principal")
+    console.print("7️⃣ 🔍 Verificar Totales de Ventas")
+    console.print("8️⃣ 🔙 Volver al Menú Principal")
     return input("\n⚡ Seleccione una opción: ")
 
+def _ventas_por_categoria(datos_productos, por_producto):
+    """Unidades e ingresos por categoría a partir de las ventas agregadas por producto"""
+    # La categoría es la actual de cada producto: cambiarla no obliga a recalcular las ventas
+    categorias, ventas = [], []
+    sin_categoria = [0, 0.0]
+    for codigo, venta in por_producto.items():
+        producto = indice_productos.buscar(datos_productos["productos"], codigo)
+        if producto is None:
+            # Los productos ya eliminados se suman aparte, sin agregar un texto al diccionario compartido
+            sin_categoria[0] += venta["unidades"]
+            sin_categoria[1] += venta["ingresos"]
+        else:
+            categorias.append(producto["categoria"])
+            ventas.append(venta)
+    codigos = categoricos.codificar("categoria", categorias)
+    tamano = len(categoricos.diccionario("categoria"))
+    unidades = categoricos.contar(codigos, tamano, (venta["unidades"] for venta in ventas))
+    ingresos = categoricos.contar(codigos, tamano, (venta["ingresos"] for venta in ventas))
+    resultado = {categoricos.diccionario("categoria").valor(codigo): (unidades[codigo], ingresos[codigo])
+                 for codigo in sorted(set(codigos))}
+    if len(categorias) < len(por_producto):
+        resultado["sin categoría"] = tuple(sin_categoria)
+    return resultado
+
 def generar_reporte_ventas(datos_productos):
     """Genera un reporte detallado de ventas"""
-    from modulos.gestion_archivos import cargar_pedidos, cargar_detalles_pedidos
+    from modulos.gestion_archivos import cargar_ventas_agregadas
     
-    datos_pedidos = cargar_pedidos()
-    datos_detalles = cargar_detalles_pedidos()
+    # Totales mantenidos al guardar cada pedido: una entrada por día, sin recorrer los pedidos
+    ventas = cargar_ventas_agregadas()
+    total_ventas = ventas["total_ventas"]
+    total_pedidos = ventas["total_pedidos"]
+    ventas_por_fecha = ventas["por_fecha"]
     
-    if not datos_pedidos["pedidos"]:
+    if not total_pedidos:
         console.print("\n[bold yellow]⚠ No hay pedidos para generar reporte[/bold yellow]")
         return
     
-    # Análisis de ventas
-    total_ventas = sum(pedido["total"] for pedido in datos_pedidos["pedidos"])
-    total_pedidos = len(datos_pedidos["pedidos"])
     promedio_por_pedido = total_ventas / total_pedidos if total_pedidos > 0 else 0
     
-    # Análisis por fecha
-    ventas_por_fecha = defaultdict(float)
-    for pedido in datos_pedidos["pedidos"]:
-        fecha = pedido["fecha_pedido"].split()[0]  # Solo la fecha
-        ventas_por_fecha[fecha] += pedido["total"]
-    
     # Crear tabla de resumen
     tabla_resumen = Table(title="📊 Resumen de Ventas")
     tabla_resumen.add_column("Métrica", style="cyan", justify="center")
@@ -66,33 +91,44 @@ def generar_reporte_ventas(datos_productos):
         tabla_fechas.add_column("Fecha", style="cyan", justify="center")
         tabla_fechas.add_column("Total Ventas", style="green", justify="center")
         
-        for fecha, total in sorted(ventas_por_fecha.items()):
-            tabla_fechas.add_row(fecha, f"${total:.2f}")
+        for fecha, dia in sorted(ventas_por_fecha.items()):
+            tabla_fechas.add_row(fecha, f"${dia['ventas']:.2f}")
         
         console.print(tabla_fechas)
+    
+    # Tabla de ventas por categoría
+    por_categoria = _ventas_por_categoria(datos_productos, ventas["por_producto"])
+    if por_categoria:
+        tabla_categorias = Table(title="🏷️ Ventas por Categoría")
+        tabla_categorias.add_column("Categoría", style="cyan", justify="center")
+        tabla_categorias.add_column("Unidades", style="yellow", justify="center")
+        tabla_categorias.add_column("Ingresos", style="green", justify="center")
+        
+        for categoria, (unidades, ingresos) in por_categoria.items():
+            tabla_categorias.add_row(categoria.title(), str(unidades), f"${ingresos:.2f}")
+        
+        console.print(tabla_categorias)
 
 def analizar_inventario(datos):
     """Analiza el estado del inventario"""
+    from modulos.gestion_archivos import umbrales_stock
+    
     if not datos["productos"]:
         console.print("\n[bold yellow]⚠ No hay productos para analizar[/bold yellow]")
         return
     
     # Estadísticas generales
     total_productos = len(datos["productos"])
-    total_stock = sum(p["cantidad_en_stock"] for p in datos["productos"])
-    valor_inventario = sum(p["cantidad_en_stock"] * p["precio_venta"] for p in datos["productos"])
+    total_stock = tabla_productos.total_stock(datos["productos"])
+    valor_inventario = tabla_productos.valor_inventario(datos["productos"])
     
-    # Productos con stock bajo
-    productos_stock_bajo = [p for p in datos["productos"] if p["cantidad_en_stock"] < 5]
+    # Productos con stock crítico y bajo según la configuración (los de menor stock primero)
+    stock_minimo, stock_critico = umbrales_stock()
+    productos_criticos, productos_bajos = tabla_productos.alertas_stock(datos["productos"], stock_minimo, stock_critico)
+    productos_stock_bajo = productos_criticos + productos_bajos
     
     # Análisis por categoría
-    stock_por_categoria = defaultdict(int)
-    valor_por_categoria = defaultdict(float)
-    
-    for producto in datos["productos"]:
-        categoria = producto["categoria"]
-        stock_por_categoria[categoria] += producto["cantidad_en_stock"]
-        valor_por_categoria[categoria] += producto["cantidad_en_stock"] * producto["precio_venta"]
+    por_categoria = tabla_productos.resumen_por_categoria(datos["productos"])
     
     # Tabla de resumen
     tabla_resumen = Table(title="📦 Análisis de Inventario")
@@ -103,6 +139,7 @@ def analizar_inventario(datos):
     tabla_resumen.add_row("Total en Stock", str(total_stock))
     tabla_resumen.add_row("Valor del Inventario", f"${valor_inventario:.2f}")
     tabla_resumen.add_row("Productos con Stock Bajo", str(len(productos_stock_bajo)))
+    tabla_resumen.add_row("Productos con Stock Crítico", str(len(productos_criticos)))
     
     console.print(tabla_resumen)
     
@@ -112,11 +149,11 @@ def analizar_inventario(datos):
     tabla_categorias.add_column("Cantidad", style="green", justify="center")
     tabla_categorias.add_column("Valor", style="yellow", justify="center")
     
-    for categoria in stock_por_categoria:
+    for categoria, resumen in por_categoria.items():
         tabla_categorias.add_row(
             categoria.title(),
-            str(stock_por_categoria[categoria]),
-            f"${valor_por_categoria[categoria]:.2f}"
+            str(resumen["stock"]),
+            f"${resumen['valor']:.2f}"
         )
     
     console.print(tabla_categorias)
@@ -127,44 +164,29 @@ def analizar_inventario(datos):
         tabla_alertas.add_column("Código", style="red", justify="center")
         tabla_alertas.add_column("Nombre", style="red", justify="center")
         tabla_alertas.add_column("Stock Actual", style="red", justify="center")
+        tabla_alertas.add_column("Nivel", style="red", justify="center")
         
         for producto in productos_stock_bajo:
             tabla_alertas.add_row(
                 producto["codigo_producto"],
                 producto["nombre"],
-                str(producto["cantidad_en_stock"])
+                str(producto["cantidad_en_stock"]),
+                "CRÍTICO" if producto["cantidad_en_stock"] <= stock_critico else "Bajo"
             )
         
         console.print(tabla_alertas)
 
 def productos_mas_vendidos(datos_productos):
     """Analiza los productos más vendidos"""
-    from modulos.gestion_archivos import cargar_detalles_pedidos
+    from modulos.gestion_archivos import cargar_ventas_agregadas
     
-    datos_detalles = cargar_detalles_pedidos()
+    # Unidades e ingresos por producto mantenidos al guardar cada pedido
+    por_producto = cargar_ventas_agregadas()["por_producto"]
     
-    if not datos_detalles["detalles_pedidos"]:
+    if not por_producto:
         console.print("\n[bold yellow]⚠ No hay ventas para analizar[/bold yellow]")
         return
     
-    # Contar ventas por producto
-    ventas_por_producto = defaultdict(int)
-    ingresos_por_producto = defaultdict(float)
-    
-    for detalle_pedido in datos_detalles["detalles_pedidos"]:
-        for detalle in detalle_pedido["detalles"]:
-            codigo = detalle["codigo_producto"]
-            cantidad = detalle["cantidad"]
-            subtotal = detalle["subtotal"]
-            
-            ventas_por_producto[codigo] += cantidad
-            ingresos_por_producto[codigo] += subtotal
-    
-    # Obtener nombres de productos
-    nombres_productos = {}
-    for producto in datos_productos["productos"]:
-        nombres_productos[producto["codigo_producto"]] = producto["nombre"]
-    
     # Crear tabla de productos más vendidos
     tabla_ventas = Table(title="🏆 Productos Más Vendidos")
     tabla_ventas.add_column("Posición", style="cyan", justify="center")
@@ -173,59 +195,49 @@ def productos_mas_vendidos(datos_productos):
     tabla_ventas.add_column("Cantidad Vendida", style="yellow", justify="center")
     tabla_ventas.add_column("Ingresos", style="magenta", justify="center")
     
-    # Ordenar por cantidad vendida
-    productos_ordenados = sorted(ventas_por_producto.items(), key=lambda x: x[1], reverse=True)
-    
-    for i, (codigo, cantidad) in enumerate(productos_ordenados[:10], 1):
-        nombre = nombres_productos.get(codigo, "Producto Desconocido")
-        ingresos = ingresos_por_producto[codigo]
+    # Los 10 con más unidades vendidas (a igual cantidad, el de más ingresos)
+    mas_vendidos = heapq.nlargest(10, por_producto.items(),
+                                  key=lambda item: (item[1]["unidades"], item[1]["ingresos"]))
+    for i, (codigo, venta) in enumerate(mas_vendidos, 1):
+        producto = indice_productos.buscar(datos_productos["productos"], codigo)
+        nombre = producto["nombre"] if producto else "Producto Desconocido"
         
         tabla_ventas.add_row(
             str(i),
             codigo,
             nombre,
-            str(cantidad),
-            f"${ingresos:.2f}"
+            str(venta["unidades"]),
+            f"${venta['ingresos']:.2f}"
         )
     
     console.print(tabla_ventas)
 
 def analisis_financiero(datos_productos):
     """Realiza un análisis financiero del negocio"""
-    from modulos.gestion_archivos import cargar_pedidos
+    from modulos.gestion_archivos import cargar_ventas_agregadas
     
-    datos_pedidos = cargar_pedidos()
+    # Ventas de los totales agregados; el costo, de las unidades vendidas de cada producto
+    ventas = cargar_ventas_agregadas()
+    total_ventas = ventas["total_ventas"]
+    total_pedidos = ventas["total_pedidos"]
+    costo_ventas = 0
+    for codigo, venta in ventas["por_producto"].items():
+        # Buscar precio de proveedor
+        producto = indice_productos.buscar(datos_productos["productos"], codigo)
+        if producto is not None:
+            costo_ventas += venta["unidades"] * producto["precio_proveedor"]
     
-    if not datos_pedidos["pedidos"]:
+    if not total_pedidos:
         console.print("\n[bold yellow]⚠ No hay datos financieros para analizar[/bold yellow]")
         return
     
-    # Cálculos financieros
-    total_ventas = sum(pedido["total"] for pedido in datos_pedidos["pedidos"])
-    
-    # Calcular costo de productos vendidos
-    costo_ventas = 0
-    from modulos.gestion_archivos import cargar_detalles_pedidos
-    datos_detalles = cargar_detalles_pedidos()
-    
-    for detalle_pedido in datos_detalles["detalles_pedidos"]:
-        for detalle in detalle_pedido["detalles"]:
-            codigo = detalle["codigo_producto"]
-            cantidad = detalle["cantidad"]
-            
-            # Buscar precio de proveedor
-            for producto in datos_productos["productos"]:
-                if producto["codigo_producto"] == codigo:
-                    costo_ventas += cantidad * producto["precio_proveedor"]
-                    break
-    
     # Calcular márgenes
     ganancia_bruta = total_ventas - costo_ventas
     margen_bruto = (ganancia_bruta / total_ventas * 100) if total_ventas > 0 else 0
     
     # Valor del inventario actual
-    valor_inventario = sum(p["cantidad_en_stock"] * p["precio_venta"] for p in datos_productos["productos"])
-    costo_inventario = sum(p["cantidad_en_stock"] * p["precio_proveedor"] for p in datos_productos["productos"])
+    valor_inventario = tabla_productos.valor_inventario(datos_productos["productos"])
+    costo_inventario = tabla_productos.costo_inventario(datos_productos["productos"])
     
     # Tabla de análisis financiero
     tabla_financiera = Table(title="💰 Análisis Financiero")
@@ -243,11 +255,9 @@ def analisis_financiero(datos_productos):
 
 def reporte_por_periodo(datos_productos):
     """Genera reporte de ventas por período específico"""
-    from modulos.gestion_archivos import cargar_pedidos, cargar_detalles_pedidos
-    
-    datos_pedidos = cargar_pedidos()
+    from modulos.gestion_archivos import iterar_pedidos, iterar_pedidos_periodo
     
-    if not datos_pedidos["pedidos"]:
+    if next(iterar_pedidos(), None) is None:
         console.print("\n[bold yellow]⚠ No hay pedidos para generar reporte[/bold yellow]")
         return
     
@@ -279,12 +289,8 @@ def reporte_por_periodo(datos_productos):
         console.print("\n[bold red]❌ Opción no válida[/bold red]")
         return
     
-    # Filtrar pedidos por período
-    pedidos_periodo = []
-    for pedido in datos_pedidos["pedidos"]:
-        fecha_pedido = datetime.strptime(pedido["fecha_pedido"], "%Y-%m-%d %H:%M:%S")
-        if fecha_inicio <= fecha_pedido <= fecha_fin:
-            pedidos_periodo.append(pedido)
+    # Filtrar pedidos por período (solo se leen los meses que se solapan con el rango)
+    pedidos_periodo = list(iterar_pedidos_periodo(fecha_inicio, fecha_fin))
     
     if not pedidos_periodo:
         console.print("\n[bold yellow]⚠ No hay pedidos en el período seleccionado[/bold yellow]")
@@ -335,7 +341,7 @@ def exportar_reportes(datos_productos):
         }
         
         with open(os.path.join(reportes_dir, f"productos_{timestamp}.json"), "w", encoding="utf-8") as f:
-            json.dump(reporte_productos, f, indent=4, ensure_ascii=False)
+            json.dump(reporte_productos, f, indent=4, ensure_ascii=False, default=modelos.a_json)
         
         # Reporte de ventas
         progress.update(task, advance=20)
@@ -351,7 +357,7 @@ def exportar_reportes(datos_productos):
         }
         
         with open(os.path.join(reportes_dir, f"ventas_{timestamp}.json"), "w", encoding="utf-8") as f:
-            json.dump(reporte_ventas, f, indent=4, ensure_ascii=False)
+            json.dump(reporte_ventas, f, indent=4, ensure_ascii=False, default=modelos.a_json)
         
         # Reporte consolidado
         progress.update(task, advance=20)
@@ -361,7 +367,7 @@ def exportar_reportes(datos_productos):
                 "total_productos": len(datos_productos["productos"]),
                 "total_pedidos": len(datos_pedidos["pedidos"]),
                 "total_ventas": sum(pedido["total"] for pedido in datos_pedidos["pedidos"]),
-                "valor_inventario": sum(p["cantidad_en_stock"] * p["precio_venta"] for p in datos_productos["productos"])
+                "valor_inventario": tabla_productos.valor_inventario(datos_productos["productos"])
             }
         }
         
@@ -372,6 +378,26 @@ def exportar_reportes(datos_productos):
     
     console.print(f"\n[bold green]✅ Reportes exportados exitosamente a: {reportes_dir}[/bold green]")
 
+def verificar_totales_ventas():
+    """Compara los totales de ventas guardados con los pedidos y ofrece recalcularlos"""
+    from modulos.gestion_archivos import verificar_ventas_agregadas, reconstruir_ventas_agregadas
+    
+    console.print("\n[bold cyan]Verificando totales de ventas contra los pedidos...[/bold cyan]")
+    diferencias = verificar_ventas_agregadas()
+    if not diferencias:
+        console.print("\n[bold green]✅ Los totales de ventas coinciden con los pedidos[/bold green]")
+        return
+    
+    console.print(f"\n[bold yellow]⚠ {len(diferencias)} diferencias encontradas:[/bold yellow]")
+    for diferencia in diferencias[:10]:
+        console.print(f"   • {diferencia}")
+    if len(diferencias) > 10:
+        console.print(f"   • ... y {len(diferencias) - 10} más")
+    
+    if input("\n¿Desea recalcular los totales desde los pedidos? (s/n): ").lower() == 's':
+        ventas = reconstruir_ventas_agregadas()
+        console.print(f"\n[bold green]✅ Totales recalculados ({ventas['total_pedidos']} pedidos)[/bold green]")
+
 def gestionar_reportes(datos_productos):
     """Función principal para gestionar reportes"""
     while True:
@@ -390,9 +416,11 @@ def gestionar_reportes(datos_productos):
         elif opcion == "6":
             exportar_reportes(datos_productos)
         elif opcion == "7":
+            verificar_totales_ventas()
+        elif opcion == "8":
             break
         else:
             console.print("\n[bold yellow]⚠ Opción no válida[/bold yellow]")
         
-        if opcion != "7":
+        if opcion != "8":
             input("\n⏸️ Presione Enter para continuar...") 
\ No newline at end of file
@@ -0,0 +1,373 @@
+"""
+Módulo de respaldos incrementales
+Guarda los archivos de datos en un almacén direccionado por contenido: cada
+archivo se divide en fragmentos identificados por su hash y cada respaldo es
+un pequeño manifiesto que los enumera, así los fragmentos repetidos se guardan una vez.
+El manifiesto anota la fecha de modificación y el tamaño de cada archivo; los
+que no cambiaron desde el respaldo anterior reutilizan su lista de fragmentos sin leerse.
+Los fragmentos se guardan comprimidos y los respaldos automáticos se hacen en
+un hilo aparte para no demorar los guardados. Cada respaldo y cada poda toman
+el bloqueo exclusivo del directorio de respaldos y releen el catálogo, así
+varias terminales no pisan los cambios de las otras
+"""
+import atexit
+import gzip
+import hashlib
+import json
+import lzma
+import os
+import queue
+import shutil
+import threading
+import time
+import zlib
+from datetime import datetime
+import logging
+
+from modulos import bloqueo
+from modulos import escritor
+
+logger = logging.getLogger(__name__)
+
+# Los cortes de fragmento dependen del contenido de las líneas, de modo que
+# insertar un producto solo altera el fragmento donde cae la inserción
+TAMANO_MINIMO_FRAGMENTO = 4 * 1024
+TAMANO_MAXIMO_FRAGMENTO = 64 * 1024
+MASCARA_CORTE = 0xFF
+
+# Resolución de fecha más gruesa esperable (FAT guarda de a 2 segundos); un archivo
+# modificado tan cerca del respaldo anterior se vuelve a leer aunque su firma coincida
+MARGEN_FIRMA_NS = 2 * 10**9
+
+# Un respaldo manual y uno en segundo plano no deben modificar el catálogo a la vez
+_candado = threading.RLock()
+
+# Compresión de los fragmentos nuevos: "gzip", "lzma" o "ninguna"
+_compresion = "gzip"
+_nivel = 6
+
+# Cabeceras con las que se reconoce un fragmento comprimido al leerlo
+MAGIA_GZIP = b"\x1f\x8b"
+MAGIA_LZMA = b"\xfd7zXZ\x00"
+
+# Respaldos automáticos en espera; cada uno copia el estado de los datos al ejecutarse
+MAX_RESPALDOS_PENDIENTES = 2
+_cola = queue.Queue(maxsize=MAX_RESPALDOS_PENDIENTES)
+_hilo = None
+_candado_hilo = threading.Lock()
+
+def _dir_objetos(backup_dir):
+    """Directorio de los fragmentos direccionados por contenido"""
+    return os.path.join(backup_dir, "objetos")
+
+def _dir_instantaneas(backup_dir):
+    """Directorio de los manifiestos de cada respaldo"""
+    return os.path.join(backup_dir, "instantaneas")
+
+def _ruta_catalogo(backup_dir):
+    """Ruta del catálogo de respaldos ordenado por fecha"""
+    return os.path.join(backup_dir, "catalogo.json")
+
+def _ruta_bloqueo(backup_dir):
+    """Archivo de bloqueo que coordina a los procesos que usan el directorio de respaldos"""
+    return os.path.join(backup_dir, ".bloqueo")
+
+def _ruta_objeto(backup_dir, resumen):
+    """Ruta de un fragmento, repartida en subdirectorios por prefijo del hash"""
+    return os.path.join(_dir_objetos(backup_dir), resumen[:2], resumen)
+
+def dividir_en_fragmentos(contenido):
+    """Divide el contenido en fragmentos con cortes definidos por las líneas"""
+    fragmentos = []
+    inicio = 0
+    posicion = 0
+    for linea in contenido.splitlines(keepends=True):
+        posicion += len(linea)
+        tamano = posicion - inicio
+        if tamano >= TAMANO_MAXIMO_FRAGMENTO or (
+                tamano >= TAMANO_MINIMO_FRAGMENTO and zlib.crc32(linea) & MASCARA_CORTE == 0):
+            fragmentos.append(contenido[inicio:posicion])
+            inicio = posicion
+    if inicio < len(contenido):
+        fragmentos.append(contenido[inicio:])
+    return fragmentos
+
+def configurar_compresion(algoritmo, nivel):
+    """Elige el algoritmo y el nivel de compresión de los fragmentos nuevos"""
+    global _compresion, _nivel
+    if algoritmo not in ("gzip", "lzma", "ninguna"):
+        logger.warning(f"Compresión de respaldos desconocida: {algoritmo}, se usará gzip")
+        algoritmo = "gzip"
+    _compresion = algoritmo
+    _nivel = nivel
+
+def _comprimir(fragmento):
+    """Comprime un fragmento con el algoritmo configurado"""
+    if _compresion == "gzip":
+        # mtime fijo: el mismo fragmento produce siempre los mismos bytes
+        return gzip.compress(fragmento, compresslevel=_nivel, mtime=0)
+    if _compresion == "lzma":
+        return lzma.compress(fragmento, preset=_nivel)
+    return fragmento
+
+def _descomprimir(contenido):
+    """Devuelve el contenido original de un fragmento (comprimido o no)"""
+    if contenido.startswith(MAGIA_GZIP):
+        return gzip.decompress(contenido)
+    if contenido.startswith(MAGIA_LZMA):
+        return lzma.decompress(contenido)
+    # Fragmentos sin comprimir de respaldos anteriores
+    return contenido
+
+def _guardar_objeto(backup_dir, fragmento):
+    """Guarda un fragmento si no existe y devuelve su hash y los bytes escritos"""
+    # El hash es del contenido original, así la deduplicación no depende de la compresión
+    resumen = hashlib.sha256(fragmento).hexdigest()
+    ruta = _ruta_objeto(backup_dir, resumen)
+    if os.path.exists(ruta):
+        return resumen, 0
+
+    comprimido = _comprimir(fragmento)
+    # Temporal con nombre único: otro proceso puede estar guardando el mismo fragmento
+    escritor.escribir_atomico(ruta, comprimido)
+    return resumen, len(comprimido)
+
+def _archivos_a_respaldar(datos_dir):
+    """Enumera los archivos de datos con su ruta relativa"""
+    for raiz, _, archivos in os.walk(datos_dir):
+        for nombre in sorted(archivos):
+            # Los temporales del escritor atómico y el archivo de bloqueo no forman parte de los datos
+            if nombre.startswith(".tmp_") or nombre == ".bloqueo":
+                continue
+            # Los archivos auxiliares de SQLite se vuelcan antes del respaldo
+            if nombre.endswith(("-wal", "-shm", "-journal")):
+                continue
+            # Las instantáneas binarias se derivan de los JSON y se regeneran al guardar
+            if nombre.endswith(".bin"):
+                continue
+            ruta = os.path.join(raiz, nombre)
+            yield os.path.relpath(ruta, datos_dir).replace(os.sep, "/"), ruta
+
+def _manifiesto_anterior(backup_dir, catalogo):
+    """Manifiesto de la instantánea más reciente del catálogo, o None si no hay"""
+    for entrada in reversed(catalogo["respaldos"]):
+        if entrada["tipo"] == "incremental":
+            try:
+                return cargar_manifiesto(backup_dir, entrada["id"])
+            except (FileNotFoundError, json.JSONDecodeError):
+                return None
+    return None
+
+def crear_instantanea(datos_dir, backup_dir):
+    """Respalda los archivos de datos y devuelve el manifiesto creado"""
+    # El bloqueo cubre también los fragmentos: una poda de otro proceso no puede
+    # borrar un fragmento existente antes de que el manifiesto nuevo lo registre
+    with _candado, bloqueo.exclusivo(_ruta_bloqueo(backup_dir)):
+        return _crear_instantanea(datos_dir, backup_dir)
+
+def _crear_instantanea(datos_dir, backup_dir):
+    """Crea la instantánea; se llama con el candado y el bloqueo tomados"""
+    # El catálogo se lee antes de escribir el manifiesto nuevo para no contarlo dos veces
+    catalogo = cargar_catalogo(backup_dir)
+    os.makedirs(_dir_instantaneas(backup_dir), exist_ok=True)
+    ahora = datetime.now()
+    manifiesto = {
+        "id": ahora.strftime("%Y%m%d_%H%M%S_%f"),
+        "fecha": ahora.isoformat(),
+        "inicio_ns": time.time_ns(),
+        "archivos": {},
+        "firmas": {}
+    }
+
+    # Sus fragmentos siguen referenciados mientras la instantánea esté en el catálogo
+    anterior = _manifiesto_anterior(backup_dir, catalogo) or {}
+    firmas_anteriores = anterior.get("firmas", {})
+    limite_ns = anterior.get("inicio_ns", 0) - MARGEN_FIRMA_NS
+
+    bytes_nuevos = 0
+    reutilizados = 0
+    for relativa, ruta in _archivos_a_respaldar(datos_dir):
+        estado = os.stat(ruta)
+        firma = [estado.st_mtime_ns, estado.st_size]
+        if (firmas_anteriores.get(relativa) == firma and estado.st_mtime_ns < limite_ns
+                and relativa in anterior["archivos"]):
+            manifiesto["archivos"][relativa] = anterior["archivos"][relativa]
+            manifiesto["firmas"][relativa] = firma
+            reutilizados += 1
+            continue
+
+        with open(ruta, "rb") as archivo:
+            contenido = archivo.read()
+            # La firma se toma del archivo abierto: si se reemplaza mientras tanto, la próxima vez no coincide
+            estado = os.fstat(archivo.fileno())
+        resumenes = []
+        for fragmento in dividir_en_fragmentos(contenido):
+            resumen, escritos = _guardar_objeto(backup_dir, fragmento)
+            resumenes.append(resumen)
+            bytes_nuevos += escritos
+        manifiesto["archivos"][relativa] = resumenes
+        if estado.st_size == len(contenido):
+            manifiesto["firmas"][relativa] = [estado.st_mtime_ns, estado.st_size]
+
+    ruta_manifiesto = os.path.join(_dir_instantaneas(backup_dir), f"{manifiesto['id']}.json")
+    escritor.escribir_atomico(ruta_manifiesto, json.dumps(manifiesto, ensure_ascii=False).encode("utf-8"))
+
+    # Registrar la instantánea al final del catálogo (los ids crecen con el tiempo)
+    catalogo["respaldos"].append({"id": manifiesto["id"], "marca": ahora.timestamp(), "tipo": "incremental"})
+    _sumar_referencias(catalogo, manifiesto, 1)
+    _guardar_catalogo(backup_dir, catalogo)
+
+    logger.info(f"Instantánea {manifiesto['id']} creada ({bytes_nuevos} bytes nuevos, "
+                f"{reutilizados} archivos sin cambios)")
+    return manifiesto
+
+def _sumar_referencias(catalogo, manifiesto, incremento):
+    """Ajusta el conteo de referencias de los fragmentos de un manifiesto"""
+    referencias = catalogo["referencias"]
+    sin_uso = []
+    for resumen in {r for resumenes in manifiesto["archivos"].values() for r in resumenes}:
+        referencias[resumen] = referencias.get(resumen, 0) + incremento
+        if referencias[resumen] <= 0:
+            del referencias[resumen]
+            sin_uso.append(resumen)
+    return sin_uso
+
+def cargar_catalogo(backup_dir):
+    """Lee el catálogo de respaldos del disco, reconstruyéndolo si no existe o está dañado"""
+    # Siempre se relee: otra terminal puede haberlo cambiado desde la última vez
+    try:
+        with open(_ruta_catalogo(backup_dir), "r", encoding="utf-8") as archivo:
+            return json.load(archivo)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return reconstruir_catalogo(backup_dir)
+
+def _guardar_catalogo(backup_dir, catalogo):
+    """Escribe el catálogo en disco; se llama con el bloqueo exclusivo tomado"""
+    escritor.escribir_atomico(_ruta_catalogo(backup_dir),
+                              json.dumps(catalogo, ensure_ascii=False).encode("utf-8"))
+
+def reconstruir_catalogo(backup_dir):
+    """Reconstruye el catálogo recorriendo el directorio de respaldos (una sola vez)"""
+    catalogo = {"respaldos": [], "referencias": {}}
+    if not os.path.exists(backup_dir):
+        return catalogo
+
+    # Copias completas del formato anterior
+    for nombre in os.listdir(backup_dir):
+        if nombre in ("objetos", "instantaneas", ".bloqueo") or nombre.startswith(("catalogo.json", ".tmp_")):
+            continue
+        ruta = os.path.join(backup_dir, nombre)
+        catalogo["respaldos"].append({"id": nombre, "marca": os.path.getctime(ruta), "tipo": "legado"})
+
+    # Instantáneas del almacén incremental
+    directorio = _dir_instantaneas(backup_dir)
+    if os.path.exists(directorio):
+        for nombre in os.listdir(directorio):
+            if not nombre.endswith(".json") or nombre.startswith(".tmp_"):
+                continue
+            manifiesto = cargar_manifiesto(backup_dir, nombre[:-5])
+            marca = datetime.fromisoformat(manifiesto["fecha"]).timestamp()
+            catalogo["respaldos"].append({"id": manifiesto["id"], "marca": marca, "tipo": "incremental"})
+            _sumar_referencias(catalogo, manifiesto, 1)
+
+    catalogo["respaldos"].sort(key=lambda r: r["marca"])
+    logger.info(f"Catálogo de respaldos reconstruido: {len(catalogo['respaldos'])} entradas")
+    return catalogo
+
+def listar_instantaneas(backup_dir):
+    """Devuelve los identificadores de las instantáneas, de la más antigua a la más reciente"""
+    with bloqueo.compartido(_ruta_bloqueo(backup_dir)):
+        catalogo = cargar_catalogo(backup_dir)
+    return [r["id"] for r in catalogo["respaldos"] if r["tipo"] == "incremental"]
+
+def cargar_manifiesto(backup_dir, id_instantanea):
+    """Lee el manifiesto de una instantánea"""
+    ruta = os.path.join(_dir_instantaneas(backup_dir), f"{id_instantanea}.json")
+    with open(ruta, "r", encoding="utf-8") as archivo:
+        return json.load(archivo)
+
+def leer_archivo(backup_dir, manifiesto, relativa):
+    """Reconstruye el contenido de un archivo de una instantánea"""
+    partes = []
+    for resumen in manifiesto["archivos"][relativa]:
+        with open(_ruta_objeto(backup_dir, resumen), "rb") as archivo:
+            partes.append(_descomprimir(archivo.read()))
+    return b"".join(partes)
+
+def restaurar_instantanea(backup_dir, id_instantanea, destino_dir):
+    """Restaura todos los archivos de una instantánea en el directorio destino"""
+    manifiesto = cargar_manifiesto(backup_dir, id_instantanea)
+    for relativa in manifiesto["archivos"]:
+        ruta = os.path.join(destino_dir, *relativa.split("/"))
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, "wb") as archivo:
+            archivo.write(leer_archivo(backup_dir, manifiesto, relativa))
+    logger.info(f"Instantánea {id_instantanea} restaurada en {destino_dir}")
+
+def podar(backup_dir, fecha_limite):
+    """Elimina los respaldos anteriores a la fecha límite y los fragmentos que quedan sin uso"""
+    with _candado, bloqueo.exclusivo(_ruta_bloqueo(backup_dir)):
+        return _podar(backup_dir, fecha_limite)
+
+def _podar(backup_dir, fecha_limite):
+    """Poda el catálogo; se llama con el candado y el bloqueo tomados"""
+    catalogo = cargar_catalogo(backup_dir)
+    entradas = catalogo["respaldos"]
+
+    # El catálogo está ordenado: solo se recorren las entradas vencidas
+    eliminados = 0
+    while entradas and entradas[0]["marca"] < fecha_limite:
+        entrada = entradas.pop(0)
+        try:
+            if entrada["tipo"] == "legado":
+                ruta = os.path.join(backup_dir, entrada["id"])
+                if os.path.isdir(ruta):
+                    shutil.rmtree(ruta)
+                elif os.path.exists(ruta):
+                    os.remove(ruta)
+            else:
+                manifiesto = cargar_manifiesto(backup_dir, entrada["id"])
+                for resumen in _sumar_referencias(catalogo, manifiesto, -1):
+                    ruta_objeto = _ruta_objeto(backup_dir, resumen)
+                    if os.path.exists(ruta_objeto):
+                        os.remove(ruta_objeto)
+                os.remove(os.path.join(_dir_instantaneas(backup_dir), f"{entrada['id']}.json"))
+        except FileNotFoundError:
+            logger.warning(f"Respaldo {entrada['id']} ya no existía en disco")
+        eliminados += 1
+        logger.info(f"Respaldo eliminado: {entrada['id']}")
+
+    if eliminados:
+        _guardar_catalogo(backup_dir, catalogo)
+    return eliminados
+
+def programar_respaldo(tarea):
+    """Encola un respaldo para el hilo en segundo plano sin esperar a que termine"""
+    global _hilo
+    with _candado_hilo:
+        if _hilo is None or not _hilo.is_alive():
+            _hilo = threading.Thread(target=_bucle_respaldos, name="respaldos", daemon=True)
+            _hilo.start()
+    try:
+        _cola.put_nowait(tarea)
+    except queue.Full:
+        # Los respaldos en espera copiarán el estado más reciente al ejecutarse
+        logger.info("Cola de respaldos llena; el próximo respaldo incluirá estos cambios")
+
+def _bucle_respaldos():
+    """Ejecuta los respaldos encolados uno tras otro"""
+    while True:
+        tarea = _cola.get()
+        try:
+            tarea()
+        except Exception as e:
+            logger.error(f"Error en el respaldo en segundo plano: {e}")
+        finally:
+            _cola.task_done()
+
+def esperar_respaldos():
+    """Espera a que terminen los respaldos encolados"""
+    if _hilo is not None and _hilo.is_alive():
+        _cola.join()
+
+atexit.register(esperar_respaldos)
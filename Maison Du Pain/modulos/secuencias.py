@@ -0,0 +1,52 @@
+"""
+Módulo de secuencias de códigos
+Guarda en un archivo el último número entregado para cada prefijo (PED, PAN, PT,
+PS...). Cada número se reserva bajo el bloqueo exclusivo entre terminales, así
+generar un código no recorre los datos y dos terminales nunca reciben el mismo.
+La primera vez el contador continúa desde el mayor número usado con el prefijo o
+con sus prefijos anteriores (PN, PASTEL, POSTRE...)
+"""
+import json
+import logging
+
+from modulos import bloqueo
+from modulos import escritor
+
+logger = logging.getLogger(__name__)
+
+def ultimo_numero(prefijo, codigos, anteriores=()):
+    """Mayor número usado por los códigos "<prefijo>-<número>", o con alguno de los prefijos
+    anteriores (0 si no hay ninguno)"""
+    prefijos = {p.lower() for p in (prefijo, *anteriores)}
+    ultimo = 0
+    for codigo in codigos:
+        inicio, separador, numero = codigo.rpartition("-")
+        if separador and inicio.lower() in prefijos:
+            try:
+                ultimo = max(ultimo, int(numero))
+            except ValueError:
+                pass
+    return ultimo
+
+def _leer(ruta_secuencias):
+    """Lee los contadores; un archivo ausente o dañado se trata como vacío"""
+    try:
+        with open(ruta_secuencias, "r", encoding="utf-8") as archivo:
+            return json.load(archivo)
+    except FileNotFoundError:
+        return {}
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        logger.warning("Archivo de secuencias dañado, los contadores se recalculan desde los datos")
+        return {}
+
+def reservar(ruta_secuencias, ruta_bloqueo, prefijo, codigos_existentes, anteriores=()):
+    """Reserva el siguiente número del prefijo y lo devuelve"""
+    with bloqueo.exclusivo(ruta_bloqueo):
+        contadores = _leer(ruta_secuencias)
+        ultimo = contadores.get(prefijo)
+        if ultimo is None:
+            # Solo la primera vez se recorren los códigos ya usados, para continuar desde ellos
+            ultimo = ultimo_numero(prefijo, codigos_existentes(), anteriores)
+        contadores[prefijo] = ultimo + 1
+        escritor.escribir_json_atomico(ruta_secuencias, contadores)
+    return ultimo + 1
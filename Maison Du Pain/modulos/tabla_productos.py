@@ -0,0 +1,99 @@
+"""
+Módulo de la tabla de productos por columnas
+Mantiene junto a la lista de diccionarios de productos unas columnas paralelas
+(stock, precio de venta, precio del proveedor y código de categoría) sobre las
+que los totales de inventario se calculan sin recorrer los diccionarios, y las
+filas ordenadas por stock para obtener las alertas sin revisar todo el catálogo.
+Los códigos de categoría son los del diccionario compartido de modulos.categoricos
+"""
+from array import array
+import bisect
+from operator import mul
+
+from modulos import categoricos
+
+class _Tabla:
+    """Columnas paralelas a una lista de productos"""
+
+    def __init__(self, productos):
+        self.productos = productos
+        self.stock = array("q", (p["cantidad_en_stock"] for p in productos))
+        self.precio_venta = array("d", (p["precio_venta"] for p in productos))
+        self.precio_proveedor = array("d", (p["precio_proveedor"] for p in productos))
+        self.categoria = array("I", categoricos.codificar("categoria", (p["categoria"] for p in productos)))
+        self.posiciones = {p["codigo_producto"]: fila for fila, p in enumerate(productos)}
+        # Pares (stock, fila) de menor a mayor stock: los productos con alerta están al principio
+        self.por_stock = sorted(zip(self.stock, range(len(productos))))
+
+    def vigente(self, productos):
+        """Indica si la tabla sigue correspondiendo a la lista de productos"""
+        return self.productos is productos and len(self.stock) == len(productos)
+
+# Tabla del catálogo en uso (la aplicación trabaja con un solo catálogo)
+_tabla = None
+
+def obtener(productos):
+    """Devuelve la tabla de la lista de productos, reconstruyéndola si la lista cambió"""
+    global _tabla
+    if _tabla is None or not _tabla.vigente(productos):
+        _tabla = _Tabla(productos)
+    return _tabla
+
+def actualizar(productos, producto):
+    """Refleja en las columnas el stock y los precios modificados de un producto"""
+    if _tabla is None or not _tabla.vigente(productos):
+        return
+    fila = _tabla.posiciones.get(producto["codigo_producto"])
+    if fila is None or _tabla.productos[fila] is not producto or \
+            categoricos.diccionario("categoria").valor(_tabla.categoria[fila]) != producto["categoria"]:
+        invalidar()
+        return
+    if _tabla.stock[fila] != producto["cantidad_en_stock"]:
+        del _tabla.por_stock[bisect.bisect_left(_tabla.por_stock, (_tabla.stock[fila], fila))]
+        bisect.insort(_tabla.por_stock, (producto["cantidad_en_stock"], fila))
+    _tabla.stock[fila] = producto["cantidad_en_stock"]
+    _tabla.precio_venta[fila] = producto["precio_venta"]
+    _tabla.precio_proveedor[fila] = producto["precio_proveedor"]
+
+def invalidar():
+    """Descarta la tabla tras altas o bajas de productos"""
+    global _tabla
+    _tabla = None
+
+def total_stock(productos):
+    """Suma de las unidades en stock"""
+    return sum(obtener(productos).stock)
+
+def valor_inventario(productos):
+    """Valor del inventario a precio de venta"""
+    tabla = obtener(productos)
+    return sum(map(mul, tabla.stock, tabla.precio_venta))
+
+def costo_inventario(productos):
+    """Valor del inventario a precio del proveedor"""
+    tabla = obtener(productos)
+    return sum(map(mul, tabla.stock, tabla.precio_proveedor))
+
+def productos_stock_bajo(productos, umbral):
+    """Productos cuyo stock es menor que el umbral, del menor stock al mayor"""
+    tabla = obtener(productos)
+    fin = bisect.bisect_left(tabla.por_stock, (umbral,))
+    return [productos[fila] for _, fila in tabla.por_stock[:fin]]
+
+def alertas_stock(productos, stock_minimo, stock_critico):
+    """Productos en stock crítico (hasta stock_critico) y bajo (menos que stock_minimo, sin los críticos)"""
+    # Ambas listas son prefijos del orden por stock: los críticos son el comienzo de los bajos
+    criticos = productos_stock_bajo(productos, stock_critico + 1)
+    return criticos, productos_stock_bajo(productos, stock_minimo)[len(criticos):]
+
+def resumen_por_categoria(productos):
+    """Cantidad de productos, stock y valor de inventario de cada categoría"""
+    tabla = obtener(productos)
+    categorias = categoricos.diccionario("categoria")
+    tamano = len(categorias)
+    # Tres conteos sobre los códigos de categoría, indexados por código
+    cantidades = categoricos.contar(tabla.categoria, tamano)
+    stock = categoricos.contar(tabla.categoria, tamano, tabla.stock)
+    valor = categoricos.contar(tabla.categoria, tamano, map(mul, tabla.stock, tabla.precio_venta))
+    return {categorias.valor(codigo): {"productos": cantidades[codigo], "stock": stock[codigo], "valor": valor[codigo]}
+            for codigo in range(tamano) if cantidades[codigo]}
@@ -10,6 +10,8 @@ from rich.console import Console
 from rich.table import Table
 from rich.progress import Progress, SpinnerColumn, TextColumn
 
+from modulos import tabla_productos
+
 console = Console()
 
 def validar_entrada_numerica(mensaje, valor_minimo=None, valor_maximo=None):
@@ -171,28 +173,29 @@ def redondear_moneda(valor, decimales=2):
 
 def obtener_estadisticas_rapidas(datos_productos):
     """Obtiene estadísticas rápidas de los productos"""
+    from modulos.gestion_archivos import umbrales_stock
+    
     if not datos_productos["productos"]:
         return {}
     
     total_productos = len(datos_productos["productos"])
-    total_stock = sum(p["cantidad_en_stock"] for p in datos_productos["productos"])
-    valor_inventario = sum(p["cantidad_en_stock"] * p["precio_venta"] for p in datos_productos["productos"])
-    productos_stock_bajo = len([p for p in datos_productos["productos"] if p["cantidad_en_stock"] < 5])
+    total_stock = tabla_productos.total_stock(datos_productos["productos"])
+    valor_inventario = tabla_productos.valor_inventario(datos_productos["productos"])
+    stock_minimo, stock_critico = umbrales_stock()
+    criticos, bajos = tabla_productos.alertas_stock(datos_productos["productos"], stock_minimo, stock_critico)
+    productos_stock_bajo = len(criticos) + len(bajos)
     
     # Categorías
     categorias = {}
-    for producto in datos_productos["productos"]:
-        cat = producto["categoria"]
-        if cat not in categorias:
-            categorias[cat] = {"cantidad": 0, "valor": 0}
-        categorias[cat]["cantidad"] += 1
-        categorias[cat]["valor"] += producto["cantidad_en_stock"] * producto["precio_venta"]
+    for cat, resumen in tabla_productos.resumen_por_categoria(datos_productos["productos"]).items():
+        categorias[cat] = {"cantidad": resumen["productos"], "valor": resumen["valor"]}
     
     return {
         "total_productos": total_productos,
         "total_stock": total_stock,
         "valor_inventario": valor_inventario,
         "productos_stock_bajo": productos_stock_bajo,
+        "productos_stock_critico": len(criticos),
         "categorias": categorias
     }
 
@@ -206,6 +209,7 @@ def mostrar_tabla_estadisticas(stats):
     tabla.add_row("Total en Stock", str(stats["total_stock"]))
     tabla.add_row("Valor Inventario", formatear_moneda(stats["valor_inventario"]))
     tabla.add_row("Productos Stock Bajo", str(stats["productos_stock_bajo"]))
+    tabla.add_row("Productos Stock Crítico", str(stats.get("productos_stock_critico", 0)))
     
     console.print(tabla)
     
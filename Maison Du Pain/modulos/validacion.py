@@ -0,0 +1,81 @@
+"""
+Módulo de validación de datos
+Revisa los productos por tramos (en varios procesos cuando el catálogo es
+grande) y devuelve todos los errores encontrados en un único resultado.
+No importa otros módulos del sistema para que los procesos auxiliares arranquen rápido
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+
+# Se incrementa cuando cambian los campos requeridos o sus tipos
+VERSION_ESQUEMA = 1
+
+CAMPOS_REQUERIDOS = ["codigo_producto", "nombre", "categoria", "descripcion",
+                     "proveedor", "cantidad_en_stock", "precio_venta", "precio_proveedor"]
+
+TAMANO_TRAMO = 50000
+
+# Por debajo de este tamaño repartir el trabajo cuesta más que validarlo
+MINIMO_PARALELO = 200000
+
+def validar_tramo(productos, inicio):
+    """Valida un tramo de productos; 'inicio' es la posición del primero en el catálogo"""
+    errores = []
+    for i, producto in enumerate(productos, start=inicio + 1):
+        for campo in CAMPOS_REQUERIDOS:
+            if campo not in producto:
+                errores.append({"producto": i, "campo": campo, "problema": f"Falta el campo '{campo}'"})
+
+        # Validar tipos de datos
+        if "cantidad_en_stock" in producto and not isinstance(producto["cantidad_en_stock"], int):
+            errores.append({"producto": i, "campo": "cantidad_en_stock",
+                            "problema": "cantidad_en_stock debe ser un número entero"})
+
+        if "precio_venta" in producto and not isinstance(producto["precio_venta"], (int, float)):
+            errores.append({"producto": i, "campo": "precio_venta",
+                            "problema": "precio_venta debe ser un número"})
+    return errores
+
+def validar(datos):
+    """Valida los datos y devuelve {"esquema", "productos", "errores"} con todos los errores"""
+    resultado = {"esquema": VERSION_ESQUEMA, "productos": 0, "errores": []}
+
+    if not isinstance(datos, dict):
+        resultado["errores"].append({"producto": None, "campo": None,
+                                     "problema": "Los datos deben ser un diccionario"})
+        return resultado
+
+    if "productos" not in datos:
+        resultado["errores"].append({"producto": None, "campo": "productos",
+                                     "problema": "Falta la clave 'productos' en los datos"})
+        return resultado
+
+    productos = datos["productos"]
+    resultado["productos"] = len(productos)
+    inicios = range(0, len(productos), TAMANO_TRAMO)
+    tramos = [productos[inicio:inicio + TAMANO_TRAMO] for inicio in inicios]
+
+    por_tramo = None
+    procesos = min(os.cpu_count() or 1, len(tramos))
+    if procesos > 1 and len(productos) >= MINIMO_PARALELO:
+        # "spawn" evita duplicar el hilo del escritor en segundo plano al bifurcar
+        contexto = multiprocessing.get_context("spawn")
+        try:
+            with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto) as ejecutor:
+                por_tramo = list(ejecutor.map(validar_tramo, tramos, inicios))
+        except (OSError, BrokenProcessPool):
+            # Sin procesos auxiliares disponibles se valida en este mismo proceso
+            por_tramo = None
+    if por_tramo is None:
+        por_tramo = [validar_tramo(tramo, inicio) for tramo, inicio in zip(tramos, inicios)]
+
+    for errores in por_tramo:
+        resultado["errores"].extend(errores)
+    return resultado
+
+def mensajes(resultado):
+    """Convierte los errores estructurados en mensajes legibles"""
+    return [f"Producto {e['producto']}: {e['problema']}" if e["producto"] else e["problema"]
+            for e in resultado["errores"]]
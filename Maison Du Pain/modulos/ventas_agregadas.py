@@ -0,0 +1,135 @@
+"""
+Módulo de ventas agregadas
+Guarda junto a los datos los totales de ventas ya calculados: total general,
+cantidad de pedidos, ventas por día y unidades e ingresos por producto. Crear,
+editar o eliminar un pedido aplica solo la diferencia de ese pedido, así los
+reportes leen una entrada por día o por producto en vez de recorrer los pedidos.
+La diferencia se aplica en la misma sección exclusiva que escribe los pedidos:
+antes de escribirlos los agregados quedan marcados como pendientes y la marca se
+quita al aplicarla, así una escritura interrumpida obliga a recalcularlos
+"""
+import json
+import logging
+
+from modulos import bloqueo
+from modulos import escritor
+
+logger = logging.getLogger(__name__)
+
+VERSION = 1
+
+# Decimales conservados en los importes: sumar y restar el mismo pedido no deja residuos
+DECIMALES = 6
+
+def vacios():
+    """Agregados sin ventas"""
+    return {"version": VERSION, "total_ventas": 0.0, "total_pedidos": 0, "por_fecha": {}, "por_producto": {}}
+
+def aporte(pedido):
+    """Lo que un pedido suma a los agregados: (fecha, total, {producto: (unidades, ingresos, líneas)})"""
+    productos = {}
+    for detalle in pedido.get("detalles", []):
+        unidades, ingresos, lineas = productos.get(detalle["codigo_producto"], (0, 0.0, 0))
+        productos[detalle["codigo_producto"]] = (unidades + detalle["cantidad"],
+                                                 ingresos + detalle["subtotal"], lineas + 1)
+    return pedido["fecha_pedido"].split()[0], pedido["total"], productos
+
+def aplicar(agregados, aporte_pedido, signo):
+    """Suma (signo 1) o resta (signo -1) el aporte de un pedido"""
+    fecha, total, productos = aporte_pedido
+    agregados["total_ventas"] = round(agregados["total_ventas"] + signo * total, DECIMALES)
+    agregados["total_pedidos"] += signo
+
+    dia = agregados["por_fecha"].setdefault(fecha, {"ventas": 0.0, "pedidos": 0})
+    dia["ventas"] = round(dia["ventas"] + signo * total, DECIMALES)
+    dia["pedidos"] += signo
+    if dia["pedidos"] == 0:
+        del agregados["por_fecha"][fecha]
+
+    for codigo, (unidades, ingresos, lineas) in productos.items():
+        producto = agregados["por_producto"].setdefault(codigo, {"unidades": 0, "ingresos": 0.0, "lineas": 0})
+        producto["unidades"] += signo * unidades
+        producto["ingresos"] = round(producto["ingresos"] + signo * ingresos, DECIMALES)
+        producto["lineas"] += signo * lineas
+        if producto["lineas"] == 0:
+            del agregados["por_producto"][codigo]
+
+def calcular(pedidos):
+    """Agregados calculados desde cero recorriendo los pedidos"""
+    agregados = vacios()
+    for pedido in pedidos:
+        aplicar(agregados, aporte(pedido), 1)
+    return agregados
+
+def leer(ruta_agregados):
+    """Lee los agregados guardados; None si no existen, están dañados, son de otra versión o quedaron
+    pendientes de una escritura interrumpida"""
+    try:
+        with open(ruta_agregados, "r", encoding="utf-8") as archivo:
+            agregados = json.load(archivo)
+    except FileNotFoundError:
+        return None
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        logger.warning("Archivo de ventas agregadas dañado, se recalcula desde los pedidos")
+        return None
+    if agregados.get("pendiente"):
+        logger.warning("Ventas agregadas de una escritura de pedidos interrumpida, se recalculan")
+        return None
+    return agregados if agregados.get("version") == VERSION else None
+
+def iniciar_cambio(ruta_agregados):
+    """Marca los agregados como pendientes antes de escribir los pedidos (bajo el bloqueo exclusivo del
+    llamador); devuelve los agregados sin la marca, o None si no hay agregados que mantener"""
+    agregados = leer(ruta_agregados)
+    if agregados is not None:
+        escritor.escribir_json_atomico(ruta_agregados, dict(agregados, pendiente=True))
+    return agregados
+
+def completar_cambio(ruta_agregados, agregados, cambios):
+    """Aplica los cambios (aporte anterior, aporte nuevo; None si el pedido no existía o ya no existe)
+    de los pedidos recién escritos y quita la marca pendiente"""
+    for anterior, nuevo in cambios:
+        if anterior is not None:
+            aplicar(agregados, anterior, -1)
+        if nuevo is not None:
+            aplicar(agregados, nuevo, 1)
+    escritor.escribir_json_atomico(ruta_agregados, agregados)
+    return agregados
+
+def obtener(ruta_agregados, ruta_bloqueo, pedidos):
+    """Agregados guardados, calculándolos (y guardándolos) desde los pedidos si faltan o quedaron pendientes"""
+    with bloqueo.compartido(ruta_bloqueo):
+        agregados = leer(ruta_agregados)
+    if agregados is None:
+        with bloqueo.exclusivo(ruta_bloqueo):
+            # Otra terminal pudo recalcularlos mientras se esperaba el bloqueo
+            agregados = leer(ruta_agregados)
+            if agregados is None:
+                agregados = reconstruir(ruta_agregados, ruta_bloqueo, pedidos)
+    return agregados
+
+def reconstruir(ruta_agregados, ruta_bloqueo, pedidos):
+    """Recalcula los agregados desde los pedidos y los guarda"""
+    # Los pedidos se recorren bajo el mismo bloqueo: ninguna escritura puede quedar fuera del cálculo
+    with bloqueo.exclusivo(ruta_bloqueo):
+        agregados = calcular(pedidos())
+        escritor.escribir_json_atomico(ruta_agregados, agregados)
+    logger.info(f"Ventas agregadas recalculadas ({agregados['total_pedidos']} pedidos)")
+    return agregados
+
+def diferencias(guardados, calculados):
+    """Descripción de cada valor guardado que no coincide con el calculado desde los pedidos"""
+    if guardados is None:
+        return ["No hay ventas agregadas guardadas"]
+    encontradas = []
+    for campo in ("total_ventas", "total_pedidos"):
+        if abs(guardados[campo] - calculados[campo]) > 0.005:
+            encontradas.append(f"{campo}: guardado {guardados[campo]}, calculado {calculados[campo]}")
+    for seccion in ("por_fecha", "por_producto"):
+        for clave in sorted(guardados[seccion].keys() | calculados[seccion].keys()):
+            guardado = guardados[seccion].get(clave)
+            calculado = calculados[seccion].get(clave)
+            if guardado is None or calculado is None or guardado.keys() != calculado.keys() or \
+                    any(abs(guardado[c] - calculado[c]) > 0.005 for c in calculado):
+                encontradas.append(f"{seccion} {clave}: guardado {guardado}, calculado {calculado}")
+    return encontradas